@@ -13,4 +13,18 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django is set up so the app registry is ready
+from characters.disconnect import track_disconnects  # noqa: E402
+from characters.websocket import chat_websocket  # noqa: E402
+
+django_application = track_disconnects(django_application)
+
+
+async def application(scope, receive, send):
+    """Route WebSocket connections to the chat channel and everything else to Django"""
+    if scope['type'] == 'websocket':
+        await chat_websocket(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
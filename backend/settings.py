@@ -11,6 +11,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
+import importlib.util
+import json
 import os
 from dotenv import load_dotenv
 load_dotenv()
@@ -46,10 +48,13 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'characters.compression.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'characters.profiling.RequestProfilingMiddleware',
+    'characters.resilience.DeadlineMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -121,10 +126,102 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
+STATIC_ROOT = BASE_DIR / 'staticfiles'  # collectstatic output, served by characters.staticfiles.serve_static
+
+# collectstatic fingerprints every file (name.<hash>.ext) and writes .gz/.br copies of text assets
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'characters.staticfiles.PrecompressedManifestStaticFilesStorage'},
+}
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Chat history retention: rows older than this are moved to gzip JSONL archives
+CHAT_RETENTION_DAYS = int(os.getenv('CHAT_RETENTION_DAYS', '90'))
+CHAT_ARCHIVE_DIR = BASE_DIR / 'archive'
+
+# Fold new chats into the analytics rollups on every write instead of only via update_chat_rollups
+CHAT_ROLLUPS_ON_WRITE = os.getenv('CHAT_ROLLUPS_ON_WRITE', '').lower() in ('1', 'true', 'yes')
+# Chat ids that commit out of order (concurrent writers) are still counted if they appear within this many seconds
+CHAT_ROLLUP_PENDING_SECONDS = 600
+
+# WebSocket chat channel (/ws/chat/, served by backend.asgi)
+CHAT_WS_MAX_CONNECTIONS = int(os.getenv('CHAT_WS_MAX_CONNECTIONS', '500'))  # Per process
+CHAT_WS_HEARTBEAT_SECONDS = 20
+CHAT_WS_SEND_QUEUE_SIZE = 256  # Outgoing messages buffered per connection
+CHAT_WS_SEND_TIMEOUT = 10  # Seconds a slow client may stay backed up before it is dropped
+
+# Cold-start budget (Django setup + URLconf import) checked by profile_startup --check and by the
+# test suite's import-only probe
+STARTUP_BUDGET_MS = int(os.getenv('STARTUP_BUDGET_MS', '1500'))
+
+# Per-request profiling for staff (?profile=1 or X-Profile: 1), browsable at /admin/profiles/
+REQUEST_PROFILING_ENABLED = os.getenv('REQUEST_PROFILING_ENABLED', '').lower() in ('1', 'true', 'yes')
+REQUEST_PROFILE_DIR = BASE_DIR / 'profiles'
+REQUEST_PROFILE_LIMIT = 50  # Ring buffer size; older profiles are deleted
+
+# Idempotency-Key support on /api/chat/
+IDEMPOTENCY_TTL_SECONDS = 24 * 60 * 60  # How long a completed response is replayed
+IDEMPOTENCY_LOCK_SECONDS = 120  # After this an unfinished request is presumed dead and its key reclaimed
+IDEMPOTENCY_WAIT_SECONDS = 60  # How long a concurrent retry waits for the original to finish
+
+# Wikipedia host for summaries and the batched query API (pointed at a fixture server in tests)
+WIKIPEDIA_BASE_URL = os.getenv('WIKIPEDIA_BASE_URL', 'https://en.wikipedia.org')
+
+# How often refresh_characters re-checks each character's Wikipedia source
+CHARACTER_REFRESH_DAYS = int(os.getenv('CHARACTER_REFRESH_DAYS', '7'))
+
+# Store new bot responses compressed and deduplicated in ResponseBlob
+# ('zstd' needs the optional zstandard package and falls back to zlib without it)
+RESPONSE_BLOB_STORAGE = os.getenv('RESPONSE_BLOB_STORAGE', 'False').lower() == 'true'
+RESPONSE_BLOB_CODEC = os.getenv('RESPONSE_BLOB_CODEC', 'zlib')
+
+# Most LLM calls panel sessions may have in flight at once, shared by every session in the process
+PANEL_MAX_CONCURRENCY = int(os.getenv('PANEL_MAX_CONCURRENCY', '8'))
+
+# API rendering: orjson-backed JSON, plus MessagePack when the msgpack package is installed
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'characters.renderers.FastJSONRenderer',
+        *(['characters.renderers.MsgPackRenderer'] if importlib.util.find_spec('msgpack') else []),
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+}
+
+# API responses at least this large are Brotli (if installed) or gzip compressed
+RESPONSE_COMPRESSION_MIN_BYTES = int(os.getenv('RESPONSE_COMPRESSION_MIN_BYTES', '1024'))
+
+# Admin changelists estimate the size of unfiltered tables above this many rows instead of COUNT(*)
+ADMIN_ESTIMATED_COUNT_THRESHOLD = int(os.getenv('ADMIN_ESTIMATED_COUNT_THRESHOLD', '100000'))
+
+# Related characters stored per character by build_related_characters (and kept current on save)
+RELATED_CHARACTERS_TOP_K = int(os.getenv('RELATED_CHARACTERS_TOP_K', '8'))
+
+# LLM token accounting: usage rows are buffered and inserted in batches of this size (or this often)
+LLM_USAGE_FLUSH_SIZE = int(os.getenv('LLM_USAGE_FLUSH_SIZE', '50'))
+LLM_USAGE_FLUSH_SECONDS = 10
+# Daily token budget per client ("user:<pk>" or "ip:<address>"), 0 for unlimited;
+# TOKEN_BUDGET_OVERRIDES is a JSON object of per-client budgets, e.g. {"user:1": 0}.
+# Spend is counted in the default cache (per-process LocMem here), so with several
+# worker processes each enforces the budget on its own unless CACHES is shared.
+TOKEN_BUDGET_PER_DAY = int(os.getenv('TOKEN_BUDGET_PER_DAY', '0'))
+TOKEN_BUDGET_OVERRIDES = json.loads(os.getenv('TOKEN_BUDGET_OVERRIDES', '{}'))
+
+# Resilience for external calls: total time an /api/ request may spend upstream, per-call
+# timeouts (shrunk to the time left), and circuit breakers that open after this many
+# consecutive failures and let a probe through after the reset period
+REQUEST_DEADLINE_SECONDS = int(os.getenv('REQUEST_DEADLINE_SECONDS', '30'))
+LLM_TIMEOUT_SECONDS = int(os.getenv('LLM_TIMEOUT_SECONDS', '30'))
+WIKIPEDIA_TIMEOUT_SECONDS = int(os.getenv('WIKIPEDIA_TIMEOUT_SECONDS', '10'))
+CIRCUIT_BREAKER_FAILURES = int(os.getenv('CIRCUIT_BREAKER_FAILURES', '5'))
+CIRCUIT_BREAKER_RESET_SECONDS = int(os.getenv('CIRCUIT_BREAKER_RESET_SECONDS', '30'))
+
+# Cap chat replies by question type (quick fact / explanation / story); requests may still
+# pass "length" or "max_tokens" when this is off
+CHAT_LENGTH_POLICY = os.getenv('CHAT_LENGTH_POLICY', 'True').lower() == 'true'
+
 CSRF_COOKIE_SECURE = False  # Allow CSRF in non-HTTPS for local testing
 SESSION_COOKIE_SECURE = False
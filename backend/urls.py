@@ -1,15 +1,31 @@
 # backend/urls.py
 from django.contrib import admin
-from django.urls import path
-from characters.views import ChatWithCharacterView, ChatHistoryView, CharactersListView, index
-
-print("Loading backend/urls.py")  # Debug print
+from django.urls import path, re_path
+from django.conf import settings
+from characters.staticfiles import serve_static
+from characters.views import (
+    ChatWithCharacterView, BatchChatView, PanelChatView, ChatHistoryView, ChatHistoryExportView, AnalyticsView, MetricsView, UsageView,
+    SuggestedQuestionsView, CharacterSearchView, CharactersListView, RelatedCharactersView, index, request_profiles, request_profile_detail, request_profile_download,
+)
 
 urlpatterns = [
+    path('admin/profiles/', request_profiles, name='request-profiles'),  # Captured request profiles
+    path('admin/profiles/<str:profile_id>/', request_profile_detail, name='request-profile-detail'),
+    path('admin/profiles/<str:profile_id>/<str:kind>/', request_profile_download, name='request-profile-download'),
     path('admin/', admin.site.urls),
     path('api/chat/', ChatWithCharacterView.as_view(), name='chat'),  # Direct mapping
+    path('api/chat/batch/', BatchChatView.as_view(), name='chat-batch'),  # Batch evaluation endpoint (NDJSON)
+    path('api/chat/panel/', PanelChatView.as_view(), name='chat-panel'),  # Multi-character panel/debate (NDJSON)
     path('api/chat-history/', ChatHistoryView.as_view(), name='chat-history'),  # Chat history endpoint
+    path('api/chat-history/export/', ChatHistoryExportView.as_view(), name='chat-history-export'),  # Streaming CSV/JSONL export
+    path('api/analytics/', AnalyticsView.as_view(), name='analytics'),  # Usage rollups
+    path('api/metrics/', MetricsView.as_view(), name='metrics'),  # In-process counters
+    path('api/usage/', UsageView.as_view(), name='usage'),  # Today's token usage per client/character
+    path('api/suggested-questions/', SuggestedQuestionsView.as_view(), name='suggested-questions'),  # Warm-cache questions
     path('api/characters/', CharactersListView.as_view(), name='characters-list'),  # Characters list endpoint
+    path('api/characters/search/', CharacterSearchView.as_view(), name='characters-search'),  # Fuzzy autocomplete
+    path('api/characters/<int:character_id>/related/', RelatedCharactersView.as_view(), name='characters-related'),  # Similar characters
+    re_path(rf'^{settings.STATIC_URL.lstrip("/")}(?P<path>.*)$', serve_static, name='static'),  # Collected assets with cache headers
     path('', index, name='home'),
     path('', index, name='index'),# Direct mapping for root
 ]
@@ -2,34 +2,49 @@
 
 # Register your models here.
 from django.contrib import admin
-from .models import Character, ChatHistory
+from .models import Character, ChatHistory, ChatRollup, LLMUsage, PanelSession, QuestionRollup, WarmAnswer
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils.safestring import mark_safe
 from django.contrib import messages
+from django.db.models.functions import Substr
+from .archive import delete_in_batches
+from .changelists import CachedAllValuesFieldListFilter, CenturyFilter, CharacterNameFilter, FastChangeListMixin
 
-# Try to import the service, but handle gracefully if dependencies are missing
-try:
-    from .services import CharacterInfoService
-    SERVICES_AVAILABLE = True
-except ImportError as e:
-    print(f"Warning: CharacterInfoService not available: {e}")
-    SERVICES_AVAILABLE = False
-    CharacterInfoService = None
+# The service imports its dependencies lazily; only check they are installed
+from .services import CharacterInfoService, services_available
+SERVICES_AVAILABLE = services_available()
+
+
+PREVIEW_LENGTH = 50
+
+
+def preview(text):
+    if len(text) > PREVIEW_LENGTH:
+        return text[:PREVIEW_LENGTH] + "..."
+    return text
 
 
 @admin.register(Character)
-class CharacterAdmin(admin.ModelAdmin):
+class CharacterAdmin(FastChangeListMixin, admin.ModelAdmin):
     list_display = ('name', 'era', 'nationality', 'occupation', 'auto_generated_status', 'created_at')
-    list_filter = ('era', 'nationality', 'auto_generated', 'created_at')
-    search_fields = ('name', 'era', 'description', 'nationality', 'occupation')
+    list_filter = (
+        CenturyFilter,
+        ('nationality', CachedAllValuesFieldListFilter),
+        'auto_generated',
+        'created_at',
+    )
+    # Long text the list columns never show
+    list_defer = ('description', 'persona', 'major_achievements', 'historical_context', 'famous_quotes', 'system_prefix')
+    search_fields = ('name', 'aliases', 'era', 'description', 'nationality', 'occupation')
     ordering = ('name',)
-    readonly_fields = ('created_at', 'updated_at', 'auto_generated')
+    readonly_fields = ('created_at', 'updated_at', 'auto_generated', 'prompt_version',
+                       'source_revision', 'source_checked_at', 'enriched_at')
 
     # Organize fields into sections
     fieldsets = (
         ('Basic Information', {
-            'fields': ('name', 'era', 'birth_date', 'death_date')
+            'fields': ('name', 'aliases', 'era', 'birth_date', 'death_date')
         }),
         ('Background', {
             'fields': ('nationality', 'occupation', 'description')
@@ -39,7 +54,8 @@ class CharacterAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
         ('System Information', {
-            'fields': ('auto_generated', 'created_at', 'updated_at'),
+            'fields': ('auto_generated', 'prompt_version', 'source_revision', 'source_checked_at', 'enriched_at',
+                       'created_at', 'updated_at'),
             'classes': ('collapse',)
         }),
     )
@@ -73,9 +89,13 @@ class CharacterAdmin(admin.ModelAdmin):
         success_count = 0
         error_count = 0
 
-        for character in queryset:
+        characters = list(queryset)
+        # One batched Wikipedia request per 50 characters instead of one per character
+        pages = CharacterInfoService.fetch_wikipedia_pages([character.name for character in characters])
+
+        for character in characters:
             try:
-                if CharacterInfoService.auto_populate_character(character):
+                if CharacterInfoService.auto_populate_character(character, summary=pages.get(character.name, {})):
                     character.save()
                     success_count += 1
                 else:
@@ -154,25 +174,36 @@ class CharacterAdmin(admin.ModelAdmin):
 
 
 @admin.register(ChatHistory)
-class ChatHistoryAdmin(admin.ModelAdmin):
+class ChatHistoryAdmin(FastChangeListMixin, admin.ModelAdmin):
     list_display = ('character_name', 'user_question_preview', 'bot_response_preview', 'timestamp')
-    list_filter = ('character_name', 'timestamp')
-    search_fields = ('character_name', 'user_question', 'bot_response')
+    list_filter = (CharacterNameFilter,)
+    date_hierarchy = 'timestamp'
+    # Exact character match and a single text column; responses may live compressed in blobs anyway
+    search_fields = ('=character_name', 'user_question')
+    list_select_related = ('response_blob',)
+    list_defer = ('user_question', 'bot_response')
     ordering = ('-timestamp',)
     readonly_fields = ('timestamp',)
+    # A <select> would list (and load the compressed data of) every blob and panel session
+    raw_id_fields = ('response_blob', 'panel')
+
+    def optimize_changelist_queryset(self, queryset):
+        # Only the first characters of each text column are needed for the previews
+        return super().optimize_changelist_queryset(queryset).annotate(
+            question_head=Substr('user_question', 1, PREVIEW_LENGTH + 1),
+            response_head=Substr('bot_response', 1, PREVIEW_LENGTH + 1),
+        )
 
     def user_question_preview(self, obj):
         """Show a preview of the user question"""
-        if len(obj.user_question) > 50:
-            return obj.user_question[:50] + "..."
-        return obj.user_question
+        return preview(obj.question_head)
     user_question_preview.short_description = "User Question"
 
     def bot_response_preview(self, obj):
         """Show a preview of the bot response"""
-        if len(obj.bot_response) > 50:
-            return obj.bot_response[:50] + "..."
-        return obj.bot_response
+        if obj.response_blob_id is not None:
+            return preview(obj.response_blob.text)
+        return preview(obj.response_head)
     bot_response_preview.short_description = "Bot Response"
 
     # Custom actions
@@ -180,12 +211,79 @@ class ChatHistoryAdmin(admin.ModelAdmin):
 
     def delete_selected_chats(self, request, queryset):
         """Action to delete selected chat history"""
-        count = queryset.count()
-        queryset.delete()
+        count = delete_in_batches(queryset)
         self.message_user(request, f"Successfully deleted {count} chat history record(s).")
     delete_selected_chats.short_description = "Delete selected chat history"
 
 
+@admin.register(ChatRollup)
+class ChatRollupAdmin(admin.ModelAdmin):
+    list_display = ('character_name', 'granularity', 'bucket_start', 'message_count', 'average_response_length')
+    list_filter = ('granularity',)
+    search_fields = ('character_name',)
+    date_hierarchy = 'bucket_start'
+    ordering = ('-bucket_start', 'character_name')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(QuestionRollup)
+class QuestionRollupAdmin(admin.ModelAdmin):
+    list_display = ('character_name', 'question', 'ask_count', 'day')
+    search_fields = ('character_name', 'question')
+    date_hierarchy = 'day'
+    ordering = ('-day', '-ask_count')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(WarmAnswer)
+class WarmAnswerAdmin(admin.ModelAdmin):
+    list_display = ('character', 'question', 'ask_count', 'prompt_version', 'generated_at')
+    list_select_related = ('character',)
+    search_fields = ('question',)
+    ordering = ('character__name', '-ask_count')
+    readonly_fields = ('question_hash', 'prompt_version', 'generated_at')
+
+
+@admin.register(PanelSession)
+class PanelSessionAdmin(admin.ModelAdmin):
+    list_display = ('prompt_preview', 'character_names', 'rounds', 'created_at')
+    date_hierarchy = 'created_at'
+    ordering = ('-created_at',)
+    readonly_fields = ('prompt', 'character_names', 'rounds', 'created_at')
+
+    def prompt_preview(self, obj):
+        return preview(obj.prompt)
+    prompt_preview.short_description = "Prompt"
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(LLMUsage)
+class LLMUsageAdmin(FastChangeListMixin, admin.ModelAdmin):
+    list_display = ('timestamp', 'client', 'character_name', 'purpose', 'prompt_tokens', 'completion_tokens', 'latency_ms', 'estimated')
+    list_filter = ('purpose', 'estimated')
+    search_fields = ('=client', '=character_name')
+    date_hierarchy = 'timestamp'
+    ordering = ('-timestamp',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 # Customize admin site headers
 admin.site.site_header = "Historical Characters Admin"
 admin.site.site_title = "Historical Characters Admin Portal"
@@ -0,0 +1,172 @@
+"""
+Incremental chat analytics rollups
+"""
+import hashlib
+import re
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum
+
+from .models import ChatHistory, ChatRollup, QuestionRollup, RollupState
+
+ROLLUP_STATE_NAME = 'chat_rollups'
+DEFAULT_BATCH_SIZE = 5000
+# Skipped ids remembered at most; the newest are kept, since a late commit is close to the head
+MAX_PENDING_IDS = 1000
+
+
+def normalize_question(question):
+    """Lowercase, collapse whitespace and drop trailing punctuation so repeats group together"""
+    question = re.sub(r'\s+', ' ', (question or '').strip().lower())
+    return question.rstrip(' ?!.')
+
+
+def question_hash(normalized):
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
+
+def _bump_chat_rollups(totals):
+    for (granularity, character_name, bucket_start), (count, question_chars, response_chars) in totals.items():
+        updated = ChatRollup.objects.filter(
+            granularity=granularity, character_name=character_name, bucket_start=bucket_start
+        ).update(
+            message_count=F('message_count') + count,
+            total_question_chars=F('total_question_chars') + question_chars,
+            total_response_chars=F('total_response_chars') + response_chars,
+        )
+        if not updated:
+            ChatRollup.objects.create(
+                granularity=granularity, character_name=character_name, bucket_start=bucket_start,
+                message_count=count, total_question_chars=question_chars, total_response_chars=response_chars,
+            )
+
+
+def _bump_question_rollups(question_counts):
+    for (character_name, day, digest), (question, count) in question_counts.items():
+        updated = QuestionRollup.objects.filter(
+            character_name=character_name, day=day, question_hash=digest
+        ).update(ask_count=F('ask_count') + count)
+        if not updated:
+            QuestionRollup.objects.create(
+                character_name=character_name, day=day, question_hash=digest, question=question, ask_count=count,
+            )
+
+
+def get_pending_window():
+    """Seconds a skipped chat id is waited for before it is taken to be rolled back"""
+    return getattr(settings, 'CHAT_ROLLUP_PENDING_SECONDS', 600)
+
+
+def update_rollups(batch_size=DEFAULT_BATCH_SIZE, max_batches=None):
+    """Fold chats newer than the high-water mark into the rollup tables.
+
+    Each batch is aggregated in memory and applied together with the new
+    high-water mark in one transaction, so rows are counted exactly once even
+    if the command is interrupted. With concurrent writers a lower id can
+    commit after a higher one, so ids the mark skips over are remembered in
+    pending_ids and folded in if they show up within get_pending_window()
+    seconds. Returns the number of chats processed.
+    """
+    fields = ('pk', 'character_name', 'user_question', 'bot_response', 'timestamp', 'response_blob__size')
+    processed = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        with transaction.atomic():
+            state, _ = RollupState.objects.select_for_update().get_or_create(name=ROLLUP_STATE_NAME)
+            now = time.time()
+            pending = {pk: seen for pk, seen in state.pending_ids if now - seen < get_pending_window()}
+            late = list(ChatHistory.objects.filter(pk__in=list(pending)).values_list(*fields)) if pending else []
+            rows = list(ChatHistory.objects.filter(pk__gt=state.last_chat_id).order_by('pk').values_list(*fields)[:batch_size])
+            if not rows and not late:
+                if len(pending) != len(state.pending_ids):
+                    state.pending_ids = sorted([pk, seen] for pk, seen in pending.items())
+                    state.save(update_fields=['pending_ids', 'updated_at'])
+                return processed
+
+            for row in late:
+                del pending[row[0]]
+            expected = state.last_chat_id + 1
+            if not state.last_chat_id and rows:
+                expected = rows[0][0]  # A fresh mark has nothing in flight below its first row
+            for row in rows:
+                pending.update((pk, now) for pk in range(max(expected, row[0] - MAX_PENDING_IDS), row[0]))
+                expected = row[0] + 1
+
+            totals = defaultdict(lambda: [0, 0, 0])
+            question_counts = {}
+            for _, character_name, user_question, bot_response, timestamp, blob_size in late + rows:
+                response_length = blob_size if blob_size is not None else len(bot_response)
+                hour = timestamp.replace(minute=0, second=0, microsecond=0)
+                day = hour.replace(hour=0)
+                for key in ((ChatRollup.HOUR, character_name, hour), (ChatRollup.DAY, character_name, day)):
+                    bucket = totals[key]
+                    bucket[0] += 1
+                    bucket[1] += len(user_question)
+                    bucket[2] += response_length
+
+                normalized = normalize_question(user_question)
+                if normalized:
+                    key = (character_name, day.date(), question_hash(normalized))
+                    _, count = question_counts.get(key, (normalized, 0))
+                    question_counts[key] = (normalized, count + 1)
+
+            _bump_chat_rollups(totals)
+            _bump_question_rollups(question_counts)
+            if rows:
+                state.last_chat_id = rows[-1][0]
+            state.pending_ids = sorted([pk, seen] for pk, seen in pending.items())[-MAX_PENDING_IDS:]
+            state.save(update_fields=['last_chat_id', 'pending_ids', 'updated_at'])
+
+        processed += len(late) + len(rows)
+        batches += 1
+    return processed
+
+
+def get_usage_series(character=None, granularity=ChatRollup.HOUR, since=None, until=None):
+    """Per-bucket message counts and average response lengths from the rollups"""
+    rollups = ChatRollup.objects.filter(granularity=granularity)
+    if character:
+        rollups = rollups.filter(character_name__iexact=character)
+    if since:
+        rollups = rollups.filter(bucket_start__date__gte=since)
+    if until:
+        rollups = rollups.filter(bucket_start__date__lte=until)
+
+    series = []
+    for row in rollups.order_by('bucket_start', 'character_name').values(
+            'character_name', 'bucket_start', 'message_count', 'total_response_chars'):
+        count = row['message_count']
+        series.append({
+            'character_name': row['character_name'],
+            'bucket_start': row['bucket_start'].isoformat(),
+            'messages': count,
+            'average_response_length': round(row['total_response_chars'] / count) if count else 0,
+        })
+    return series
+
+
+def get_top_questions(character=None, since=None, until=None, limit=10):
+    """Most frequently asked normalized questions, summed over the selected days"""
+    rollups = QuestionRollup.objects.all()
+    if character:
+        rollups = rollups.filter(character_name__iexact=character)
+    if since:
+        rollups = rollups.filter(day__gte=since)
+    if until:
+        rollups = rollups.filter(day__lte=until)
+
+    top = (
+        rollups.values('character_name', 'question')
+        .annotate(count=Sum('ask_count'))
+        .order_by('-count', 'question')[:limit]
+    )
+    return list(top)
+
+
+def rollup_on_write(sender, instance, created, **kwargs):
+    """post_save hook that keeps rollups current when CHAT_ROLLUPS_ON_WRITE is enabled"""
+    if created and getattr(settings, 'CHAT_ROLLUPS_ON_WRITE', False):
+        transaction.on_commit(lambda: update_rollups(max_batches=1))
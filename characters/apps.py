@@ -4,3 +4,30 @@ from django.apps import AppConfig
 class CharactersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'characters'
+
+    def ready(self):
+        from django.core.signals import request_finished
+        from django.db.models.signals import post_delete, post_save
+        from .analytics import rollup_on_write
+        from .catalog import invalidate_catalog
+        from .changelists import invalidate_character_facets
+        from .related import related_on_delete, related_on_save
+        from .resilience import get_breaker
+        from .search import index_character_deleted, index_character_saved
+        from .usage import flush_on_request_finished
+        from .models import Character, ChatHistory
+
+        post_save.connect(rollup_on_write, sender=ChatHistory, dispatch_uid='chat_rollup_on_write')
+        post_save.connect(invalidate_character_facets, sender=Character, dispatch_uid='character_facets_on_save')
+        post_delete.connect(invalidate_character_facets, sender=Character, dispatch_uid='character_facets_on_delete')
+        post_save.connect(invalidate_catalog, sender=Character, dispatch_uid='character_catalog_on_save')
+        post_delete.connect(invalidate_catalog, sender=Character, dispatch_uid='character_catalog_on_delete')
+        post_save.connect(index_character_saved, sender=Character, dispatch_uid='character_search_on_save')
+        post_delete.connect(index_character_deleted, sender=Character, dispatch_uid='character_search_on_delete')
+        post_save.connect(related_on_save, sender=Character, dispatch_uid='character_related_on_save')
+        post_delete.connect(related_on_delete, sender=Character, dispatch_uid='character_related_on_delete')
+        request_finished.connect(flush_on_request_finished, dispatch_uid='llm_usage_flush_on_request_finished')
+
+        # Create the breakers up front so their state gauges appear in /api/metrics/ before the first call
+        for dependency in ('groq', 'wikipedia'):
+            get_breaker(dependency)
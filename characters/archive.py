@@ -0,0 +1,122 @@
+"""
+Archival of old chat history into compressed, date-partitioned files
+"""
+import gzip
+import json
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .analytics import ROLLUP_STATE_NAME, update_rollups
+from .blobs import BLOB_VALUE_FIELDS, resolve_text
+from .models import ChatHistory, RollupState
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def get_archive_dir():
+    return Path(getattr(settings, 'CHAT_ARCHIVE_DIR', settings.BASE_DIR / 'archive'))
+
+
+def partition_path(archive_dir, day):
+    """Archive file for a single day, e.g. archive/2025/07/2025-07-25.jsonl.gz"""
+    return Path(archive_dir) / f"{day:%Y}" / f"{day:%m}" / f"{day:%Y-%m-%d}.jsonl.gz"
+
+
+def _serialize(chat):
+    return {
+        'id': chat['id'],
+        'character_name': chat['character_name'],
+        'user_question': chat['user_question'],
+        'bot_response': resolve_text(chat['bot_response'], chat['response_blob__codec'], chat['response_blob__data']),
+        'timestamp': chat['timestamp'].isoformat(),
+    }
+
+
+def delete_in_batches(queryset, batch_size=DEFAULT_BATCH_SIZE):
+    """Delete rows a chunk of primary keys at a time so no single statement holds a long lock"""
+    deleted = 0
+    while True:
+        ids = list(queryset.order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        count, _ = ChatHistory.objects.filter(pk__in=ids).delete()
+        deleted += count
+
+
+def archive_chats(older_than_days, archive_dir=None, batch_size=DEFAULT_BATCH_SIZE, dry_run=False):
+    """Move chats older than the cutoff into gzip JSONL partitions and purge them.
+
+    Each batch is appended to its day partitions (gzip files may hold several
+    members, so appends are safe) before the same rows are deleted, so an
+    interrupted run at worst re-archives one batch. Pending chats are folded
+    into the analytics rollups first, and only chats at or below the rollup
+    high-water mark are archived, so purged rows are never missing from the
+    analytics. Returns the number of rows archived.
+    """
+    archive_dir = Path(archive_dir or get_archive_dir())
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    stale = ChatHistory.objects.filter(timestamp__lt=cutoff)
+    if dry_run:
+        return stale.count()
+
+    update_rollups()
+    state = RollupState.objects.filter(name=ROLLUP_STATE_NAME).first()
+    stale = stale.filter(pk__lte=state.last_chat_id if state else 0)
+    if state and state.pending_ids:
+        stale = stale.exclude(pk__in=[pk for pk, _ in state.pending_ids])  # Committed since update_rollups ran
+
+    archived = 0
+    last_id = 0
+    while True:
+        rows = list(
+            stale.filter(pk__gt=last_id)
+            .order_by('pk')
+            .values('id', 'character_name', 'user_question', 'bot_response', 'timestamp', *BLOB_VALUE_FIELDS)[:batch_size]
+        )
+        if not rows:
+            return archived
+
+        by_day = {}
+        for row in rows:
+            by_day.setdefault(row['timestamp'].date(), []).append(row)
+
+        for day, day_rows in by_day.items():
+            path = partition_path(archive_dir, day)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with gzip.open(path, 'at', encoding='utf-8') as handle:
+                for row in day_rows:
+                    handle.write(json.dumps(_serialize(row), ensure_ascii=False) + '\n')
+
+        ids = [row['id'] for row in rows]
+        with transaction.atomic():
+            ChatHistory.objects.filter(pk__in=ids).delete()
+        archived += len(ids)
+        last_id = ids[-1]
+
+
+def _parse_day(value):
+    if value is None or isinstance(value, date):
+        return value
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def iter_archived_chats(start=None, end=None, character=None, archive_dir=None):
+    """Stream archived chats as dicts, reading only the day partitions in [start, end]"""
+    archive_dir = Path(archive_dir or get_archive_dir())
+    start, end = _parse_day(start), _parse_day(end)
+    character = character.lower() if character else None
+
+    for path in sorted(archive_dir.glob('*/*/*.jsonl.gz')):
+        day = datetime.strptime(path.name[:10], '%Y-%m-%d').date()
+        if (start and day < start) or (end and day > end):
+            continue
+        with gzip.open(path, 'rt', encoding='utf-8') as handle:
+            for line in handle:
+                record = json.loads(line)
+                if character and character not in record['character_name'].lower():
+                    continue
+                yield record
@@ -0,0 +1,167 @@
+"""
+Batch evaluation of many (character, question) pairs against the LLM
+"""
+import hashlib
+import json
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .models import Character, ChatHistory
+from . import usage
+from .services import ChatService
+
+DEFAULT_CONCURRENCY = 4
+MAX_CONCURRENCY = 16
+
+
+def pair_key(character_name, question):
+    """Stable identifier for a (character, question) pair, used to resume runs"""
+    raw = f"{character_name.strip().lower()}\n{question.strip()}"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:16]
+
+
+def _check_strings(values, name):
+    """Raise ValueError unless values is None or a list of non-empty strings"""
+    if values is None:
+        return
+    if not isinstance(values, list) or not all(isinstance(value, str) and value.strip() for value in values):
+        raise ValueError(f"'{name}' must be a list of non-empty strings.")
+
+
+def build_pairs(characters=None, questions=None, pairs=None):
+    """Expand a character x question matrix and/or explicit pairs into a list of pairs.
+
+    Raises ValueError if characters or questions is not a list of non-empty
+    strings, if pairs is not a list, or naming the first explicit pair without
+    a non-empty ``character`` and ``question``.
+    """
+    _check_strings(characters, 'characters')
+    _check_strings(questions, 'questions')
+    if pairs is not None and not isinstance(pairs, list):
+        raise ValueError("'pairs' must be a list.")
+    result = []
+    for index, pair in enumerate(pairs or []):
+        character_name = pair.get('character') if isinstance(pair, dict) else None
+        question = pair.get('question') if isinstance(pair, dict) else None
+        if not isinstance(character_name, str) or not character_name.strip() \
+                or not isinstance(question, str) or not question.strip():
+            raise ValueError(f"Pair {index} needs a non-empty 'character' and 'question'.")
+        result.append((character_name, question))
+    for question in questions or []:
+        for character_name in characters or []:
+            result.append((character_name, question))
+    return result
+
+
+def parse_flag(value):
+    """Strict boolean for JSON/form input: true/false, 1/0, yes/no; raises ValueError otherwise"""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str) and value.strip().lower() in ('1', 'true', 'yes', '0', 'false', 'no'):
+        return value.strip().lower() in ('1', 'true', 'yes')
+    raise ValueError(value)
+
+
+def parse_completed_keys(value):
+    """Set of pair keys from request input; raises ValueError unless it is a list of strings"""
+    if value is None:
+        return set()
+    if not isinstance(value, list) or not all(isinstance(key, str) for key in value):
+        raise ValueError("'completed_keys' must be a list of strings.")
+    return set(value)
+
+
+def load_completed_keys(path):
+    """Read the keys of already finished pairs from a previous NDJSON output file"""
+    completed = set()
+    try:
+        with open(path, encoding='utf-8') as handle:
+            for line in handle:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # A partially written last line from an interrupted run
+                if 'reply' in record:
+                    completed.add(record['key'])
+    except FileNotFoundError:
+        pass
+    return completed
+
+
+def run_batch(pairs, concurrency=DEFAULT_CONCURRENCY, persist=False, completed_keys=None):
+    """Run pairs through the LLM and yield one result dict per pair as it finishes.
+
+    At most ``concurrency`` requests are in flight at once and only that many
+    pairs are held in memory, so very large matrices stream through. Pairs
+    whose key is in ``completed_keys`` are skipped. Database access stays on
+    the calling thread; worker threads only talk to the LLM.
+    """
+    concurrency = max(1, min(int(concurrency), MAX_CONCURRENCY))
+    completed_keys = completed_keys or set()
+
+    names = {name for name, _ in pairs}
+    characters = {c.name.lower(): c for c in Character.objects.filter(name__in=names)}
+    for name in names:
+        if name.lower() not in characters:
+            character = Character.objects.filter(name__iexact=name).first()
+            if character:
+                characters[name.lower()] = character
+
+    def generate(character, question):
+        with usage.attribute(character=character.name, purpose='batch'):
+            return ChatService.generate_reply(character.get_system_prefix(), question)
+
+    pending = iter(pairs)
+    in_flight = {}
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        def submit_next():
+            for character_name, question in pending:
+                key = pair_key(character_name, question)
+                if key in completed_keys:
+                    continue
+                character = characters.get(character_name.lower())
+                if character is None:
+                    return {'key': key, 'character': character_name, 'question': question,
+                            'error': f"Character '{character_name}' not found."}
+                future = executor.submit(generate, character, question)
+                in_flight[future] = (key, character, question)
+                return None
+            return None
+
+        def fill():
+            while len(in_flight) < concurrency:
+                before = len(in_flight)
+                missing = submit_next()
+                if missing:
+                    yield missing
+                elif len(in_flight) == before:
+                    return  # Input exhausted
+
+        yield from fill()
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                key, character, question = in_flight.pop(future)
+                record = {'key': key, 'character': character.name, 'question': question}
+                try:
+                    record['reply'] = future.result()
+                    if persist:
+                        ChatHistory.objects.create(
+                            character_name=character.name,
+                            user_question=question,
+                            bot_response=record['reply']
+                        )
+                except Exception as e:
+                    record['error'] = str(e)
+                record['prompt_version'] = character.prompt_version
+                yield record
+            usage.flush_if_due()
+            yield from fill()
+
+
+def iter_ndjson(records):
+    """Encode result dicts as newline-delimited JSON"""
+    for record in records:
+        yield json.dumps(record, ensure_ascii=False) + '\n'
@@ -0,0 +1,458 @@
+"""
+Offline benchmark suite for the hot paths, with a fake LLM and Wikipedia fixtures
+"""
+import gc
+import itertools
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from unittest import mock
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, connections
+from django.test import Client, override_settings
+from django.utils import timezone
+
+from . import metrics, usage
+from .models import Character, ChatHistory
+from .resilience import reset_breakers
+from .search import reset_index
+from .services import CharacterInfoService
+from .testing import FakeGroqClient, WikipediaFixtureServer
+from .views import get_character_by_name
+
+RESULTS_VERSION = 1
+DEFAULT_REPEAT = 20
+DEFAULT_CONCURRENCY = 8
+DEFAULT_LLM_LATENCY = 0.02
+DEFAULT_CHARACTERS = 200
+DEFAULT_CHATS = 5000
+# Micro benchmarks repeat the operation until one sample takes at least this long
+MIN_SAMPLE_SECONDS = 0.005
+# Requests each worker sends per burst in the concurrent chat benchmark
+REQUESTS_PER_WORKER = 4
+DEFAULT_THRESHOLD = 0.10
+# Compared by compare_results; True when a lower value is better
+COMPARED_METRICS = {'median_ms': True, 'throughput_rps': False}
+
+CHAT_REPLY = (
+    "Ah, that is a question I pondered often in my own time. The answer, as best I can give it, "
+    "lies in patient work and in the company of curious minds, for nothing worth knowing was ever "
+    "learned alone. Ask me more and I shall tell you of the years that shaped me."
+)
+DETAILS_REPLY = """MAJOR_ACHIEVEMENTS:
+1. Wrote the first published algorithm intended for a machine
+2. Described the Analytical Engine as more than a calculator
+3. Translated and annotated Menabrea's memoir on the engine
+
+HISTORICAL_CONTEXT: Victorian England, at the height of the industrial revolution, when
+mathematics and engineering were reshaping commerce and science.
+
+FAMOUS_QUOTES:
+- "That brain of mine is something more than merely mortal."
+- "The Analytical Engine weaves algebraical patterns just as the Jacquard loom weaves flowers and leaves."
+"""
+WIKIPEDIA_PAGES = {
+    'Ada Lovelace': {
+        'revision': 1001,
+        'extract': (
+            "Augusta Ada King, Countess of Lovelace (10 December 1815 – 27 November 1852) was an English "
+            "mathematician and writer, chiefly known for her work on Charles Babbage's proposed mechanical "
+            "general-purpose computer, the Analytical Engine."
+        ),
+    },
+    'Mahatma Gandhi': {
+        'revision': 1002,
+        'extract': (
+            "Mohandas Karamchand Gandhi (2 October 1869 – 30 January 1948) was an Indian lawyer, "
+            "anti-colonial nationalist and political ethicist who employed nonviolent resistance to lead "
+            "the successful campaign for India's independence from British rule."
+        ),
+    },
+    'Aristotle': {
+        'revision': 1003,
+        'extract': (
+            "Aristotle (384–322 BC) was an Ancient Greek philosopher and polymath. His writings cover a broad "
+            "range of subjects spanning the natural sciences, philosophy, linguistics, economics, politics, "
+            "psychology and the arts."
+        ),
+    },
+    'Marie Curie': {
+        'revision': 1004,
+        'extract': (
+            "Marie Salomea Skłodowska-Curie (7 November 1867 – 4 July 1934) was a Polish and naturalised-French "
+            "physicist and chemist who conducted pioneering research on radioactivity."
+        ),
+    },
+}
+ERAS = ((-400, -320), (1500, 1570), (1815, 1852), (1869, 1948), (1900, 1980))
+
+BENCHMARKS = {}
+
+
+class BenchmarkError(Exception):
+    """A benchmarked operation failed, so its timings would be meaningless"""
+
+
+def benchmark(name, kind='micro'):
+    """Register setup(env, stack) as a benchmark; it returns the operation to time.
+
+    kind is "micro" for in-process functions, "macro" for full requests through
+    the Django test client, and "load" for an operation that sends a burst of
+    concurrent requests and returns ``(latencies_ms, wall_seconds)``. Patches
+    and servers entered on stack are undone when the benchmark finishes.
+    """
+    def register(setup):
+        BENCHMARKS[name] = {'kind': kind, 'setup': setup, 'description': (setup.__doc__ or '').strip()}
+        return setup
+    return register
+
+
+class BenchmarkEnv:
+    """Synthetic catalog and chat history shared by every benchmark of one run"""
+
+    def __init__(self, characters=DEFAULT_CHARACTERS, chats=DEFAULT_CHATS,
+                 concurrency=DEFAULT_CONCURRENCY, llm_latency=DEFAULT_LLM_LATENCY):
+        self.characters = characters
+        self.chats = chats
+        self.concurrency = concurrency
+        self.llm_latency = llm_latency
+        self.names = []
+        self.aliases = []
+
+    def seed(self):
+        """Bulk insert the catalog and history; bulk_create skips the per-save signal work"""
+        names = [*WIKIPEDIA_PAGES, *(f'Benchmark Figure {i}' for i in range(self.characters))][:self.characters]
+        characters = []
+        for i, name in enumerate(names):
+            born, died = ERAS[i % len(ERAS)]
+            character = Character(
+                name=name, aliases=f'Figure Alias {i}', era=f'{born}–{died}',
+                birth_date=str(born), death_date=str(died), nationality='English',
+                occupation='mathematician and writer', description=WIKIPEDIA_PAGES.get(name, {}).get('extract', name),
+                persona=f'You are {name}. Speak in the manner of your time.',
+            )
+            character.compile_prompt()
+            character.parse_years()
+            characters.append(character)
+        Character.objects.bulk_create(characters)
+        self.names = [character.name for character in characters]
+        self.aliases = [character.aliases for character in characters]
+
+        ChatHistory.objects.bulk_create(
+            (
+                ChatHistory(character_name=self.names[i % len(self.names)], user_question=f'Question {i}?', bot_response=CHAT_REPLY)
+                for i in range(self.chats)
+            ),
+            batch_size=500,
+        )
+
+    @staticmethod
+    def fake_reply(messages):
+        return DETAILS_REPLY if 'MAJOR_ACHIEVEMENTS' in messages[-1]['content'] else CHAT_REPLY
+
+
+def _get(client, path):
+    response = client.get(path)
+    if response.status_code != 200:
+        raise BenchmarkError(f'GET {path} returned {response.status_code}')
+    return response
+
+
+@benchmark('get_character_by_name')
+def bench_get_character_by_name(env, stack):
+    """Character lookup by exact and differently cased name"""
+    names = itertools.cycle([variant for name in env.names[:50] for variant in (name, name.lower())])
+    return lambda: get_character_by_name(next(names))
+
+
+@benchmark('get_character_by_name_alias')
+def bench_get_character_by_name_alias(env, stack):
+    """Character lookup that misses on name and falls back to the alias index"""
+    aliases = itertools.cycle(env.aliases[:50])
+    return lambda: get_character_by_name(next(aliases))
+
+
+@benchmark('extract_wikipedia_info')
+def bench_extract_wikipedia_info(env, stack):
+    """Field extraction (lifespan, nationality, occupation) from a page summary"""
+    summaries = itertools.cycle([
+        {'type': 'standard', 'title': title, 'extract': page['extract']} for title, page in WIKIPEDIA_PAGES.items()
+    ])
+    return lambda: CharacterInfoService.extract_wikipedia_info(next(summaries))
+
+
+@benchmark('fetch_wikipedia_info', kind='macro')
+def bench_fetch_wikipedia_info(env, stack):
+    """Summary fetch over HTTP from the local fixture server plus extraction"""
+    wiki = stack.enter_context(WikipediaFixtureServer(WIKIPEDIA_PAGES))
+    stack.enter_context(override_settings(WIKIPEDIA_BASE_URL=wiki.url))
+    titles = itertools.cycle(WIKIPEDIA_PAGES)
+
+    def fetch():
+        if not CharacterInfoService.fetch_wikipedia_info(next(titles)):
+            raise BenchmarkError('fetch_wikipedia_info returned nothing')
+    return fetch
+
+
+@benchmark('generate_additional_details')
+def bench_generate_additional_details(env, stack):
+    """Prompt building, usage accounting and response parsing around one (instant) LLM call"""
+    stack.enter_context(mock.patch('characters.services.get_groq_client', return_value=FakeGroqClient(env.fake_reply)))
+    info = {'name': 'Ada Lovelace', 'era': '1815–1852', 'description': WIKIPEDIA_PAGES['Ada Lovelace']['extract']}
+
+    def generate():
+        if 'major_achievements' not in CharacterInfoService.generate_additional_details(info):
+            raise BenchmarkError('generate_additional_details parsed nothing')
+    return generate
+
+
+@benchmark('chat_history_view', kind='macro')
+def bench_chat_history_view(env, stack):
+    """GET /api/chat-history/ with the largest page"""
+    client = Client()
+    return lambda: _get(client, '/api/chat-history/?limit=100')
+
+
+@benchmark('chat_history_view_filtered', kind='macro')
+def bench_chat_history_view_filtered(env, stack):
+    """GET /api/chat-history/ filtered by character"""
+    client = Client()
+    return lambda: _get(client, f'/api/chat-history/?character={env.names[0]}')
+
+
+@benchmark('characters_list_view', kind='macro')
+def bench_characters_list_view(env, stack):
+    """GET /api/characters/ served from the cached catalog"""
+    client = Client()
+    return lambda: _get(client, '/api/characters/')
+
+
+@benchmark('characters_list_view_alive_in', kind='macro')
+def bench_characters_list_view_alive_in(env, stack):
+    """GET /api/characters/?alive_in=, which queries the database every time"""
+    client = Client()
+    return lambda: _get(client, '/api/characters/?alive_in=1900')
+
+
+@benchmark('chat_endpoint_concurrent', kind='load')
+def bench_chat_endpoint_concurrent(env, stack):
+    """POST /api/chat/ from concurrent clients against a fake LLM with fixed latency"""
+    stack.enter_context(mock.patch(
+        'characters.services.get_groq_client',
+        return_value=FakeGroqClient(env.fake_reply, latency=env.llm_latency),
+    ))
+    counter = itertools.count()
+
+    def worker():
+        client = Client()
+        latencies = []
+        try:
+            for _ in range(REQUESTS_PER_WORKER):
+                i = next(counter)
+                payload = {'character': env.names[i % len(env.names)], 'message': f'What did you work on in year {i}?'}
+                started = time.perf_counter()
+                response = client.post('/api/chat/', payload, content_type='application/json')
+                if response.status_code != 200:
+                    raise BenchmarkError(f'POST /api/chat/ returned {response.status_code}: {response.content[:200]!r}')
+                latencies.append((time.perf_counter() - started) * 1000)
+        finally:
+            connections.close_all()  # Only this thread's connections
+        return latencies
+
+    def burst():
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=env.concurrency) as executor:
+            futures = [executor.submit(worker) for _ in range(env.concurrency)]
+            latencies = [latency for future in futures for latency in future.result()]
+        return latencies, time.perf_counter() - started
+    return burst
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+    return {
+        'timings_ms': [round(sample, 4) for sample in samples],
+        'median_ms': round(statistics.median(ordered), 4),
+        'mean_ms': round(statistics.mean(ordered), 4),
+        'p95_ms': round(ordered[max(0, round(len(ordered) * 0.95) - 1)], 4),
+        'min_ms': round(ordered[0], 4),
+        'max_ms': round(ordered[-1], 4),
+        'stdev_ms': round(statistics.stdev(ordered), 4) if len(ordered) > 1 else 0.0,
+        'samples': len(ordered),
+    }
+
+
+def measure(operation, repeat, min_sample_seconds=MIN_SAMPLE_SECONDS):
+    """Per-call timings of operation: repeat samples, each averaging enough calls to last min_sample_seconds.
+
+    As with timeit, garbage collection is paused while sampling so a
+    collection triggered by earlier benchmarks doesn't land in one sample.
+    """
+    operation()  # Warm caches, indexes and connections
+    started = time.perf_counter()
+    operation()
+    single = time.perf_counter() - started
+    number = max(1, int(min_sample_seconds / single)) if single else 1000
+
+    samples = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            for _ in range(number):
+                operation()
+            samples.append((time.perf_counter() - started) * 1000 / number)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return {**summarize(samples), 'iterations': number}
+
+
+def measure_load(burst, repeat):
+    """Per-request latencies and overall throughput over repeat bursts, after one warm-up burst"""
+    burst()
+    latencies, wall = [], 0.0
+    for _ in range(repeat):
+        burst_latencies, burst_wall = burst()
+        latencies.extend(burst_latencies)
+        wall += burst_wall
+    return {**summarize(latencies), 'requests': len(latencies), 'wall_seconds': round(wall, 4),
+            'throughput_rps': round(len(latencies) / wall, 2)}
+
+
+def _reset_state():
+    cache.clear()
+    reset_index()
+    reset_breakers()
+    usage.reset()
+    metrics.reset()
+
+
+def git_revision():
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                                capture_output=True, text=True, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return ''
+    return result.stdout.strip() if result.returncode == 0 else ''
+
+
+def environment():
+    """What the timings depend on besides the code; compare_benchmarks warns when it differs"""
+    return {
+        'python': platform.python_version(),
+        'implementation': sys.implementation.name,
+        'django': django.get_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'database': connection.vendor,
+        'git_revision': git_revision(),
+    }
+
+
+def run_benchmarks(names=None, repeat=DEFAULT_REPEAT, env=None, progress=None):
+    """Seed env's data and run the named benchmarks (default all) in registration order.
+
+    Expects an empty, migrated database; the management command creates a
+    throwaway one. progress(name, result) is called after each benchmark.
+    """
+    names = list(names or BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        raise BenchmarkError(f"Unknown benchmark(s): {', '.join(unknown)}")
+    env = env or BenchmarkEnv()
+    _reset_state()
+    env.seed()
+
+    results = {}
+    for name in names:
+        case = BENCHMARKS[name]
+        _reset_state()
+        gc.collect()
+        with ExitStack() as stack:
+            operation = case['setup'](env, stack)
+            result = measure_load(operation, repeat) if case['kind'] == 'load' else measure(operation, repeat)
+        usage.flush()
+        results[name] = {'kind': case['kind'], 'description': case['description'], **result}
+        if progress:
+            progress(name, results[name])
+
+    return {
+        'version': RESULTS_VERSION,
+        'created_at': timezone.now().isoformat(),
+        'environment': environment(),
+        'parameters': {
+            'repeat': repeat, 'processes': 1, 'characters': env.characters, 'chats': env.chats,
+            'concurrency': env.concurrency, 'llm_latency_ms': round(env.llm_latency * 1000, 3),
+        },
+        'results': results,
+    }
+
+
+def merge_reports(reports):
+    """Pool the samples of runs in separate processes into one report.
+
+    A process keeps whatever CPU frequency, memory layout and cache luck it
+    started with, so runs differ more between processes than within one;
+    pooling several processes averages that out (as pyperf does).
+    """
+    merged = {**reports[0], 'results': {}, 'parameters': {**reports[0]['parameters'], 'processes': len(reports)}}
+    for name, first in reports[0]['results'].items():
+        runs = [report['results'][name] for report in reports]
+        result = {'kind': first['kind'], 'description': first['description'],
+                  **summarize([timing for run in runs for timing in run['timings_ms']])}
+        if 'iterations' in first:
+            result['iterations'] = first['iterations']
+        if 'throughput_rps' in first:
+            wall = sum(run['wall_seconds'] for run in runs)
+            requests = sum(run['requests'] for run in runs)
+            result.update(requests=requests, wall_seconds=round(wall, 4), throughput_rps=round(requests / wall, 2))
+        merged['results'][name] = result
+    return merged
+
+
+def compare_results(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """One row per benchmark metric in either run, with its relative change and status.
+
+    status is "regression" or "improvement" when the change is beyond
+    threshold (0.10 = 10%) in the bad or good direction, otherwise "ok";
+    "added" and "removed" mark benchmarks present in only one run.
+    """
+    rows = []
+    old_results, new_results = baseline.get('results', {}), current.get('results', {})
+    for name in [*new_results, *(name for name in old_results if name not in new_results)]:
+        old, new = old_results.get(name), new_results.get(name)
+        if old is None or new is None:
+            rows.append({'name': name, 'metric': '', 'baseline': None, 'current': None, 'change': None,
+                         'status': 'added' if old is None else 'removed'})
+            continue
+        for metric, lower_is_better in COMPARED_METRICS.items():
+            if metric not in old or metric not in new:
+                continue
+            change = (new[metric] - old[metric]) / old[metric] if old[metric] else 0.0
+            worse = change if lower_is_better else -change
+            status = 'regression' if worse > threshold else 'improvement' if worse < -threshold else 'ok'
+            rows.append({'name': name, 'metric': metric, 'baseline': old[metric], 'current': new[metric],
+                         'change': round(change, 4), 'status': status})
+    return rows
+
+
+def environment_differences(baseline, current):
+    """Keys of environment and parameters whose values differ between two runs"""
+    differences = {}
+    for section in ('environment', 'parameters'):
+        old, new = baseline.get(section, {}), current.get(section, {})
+        for key in sorted(set(old) | set(new)):
+            if key != 'git_revision' and old.get(key) != new.get(key):
+                differences[f'{section}.{key}'] = (old.get(key), new.get(key))
+    return differences
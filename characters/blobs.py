@@ -0,0 +1,115 @@
+"""
+Content-addressed, compressed storage for chat response bodies
+"""
+import hashlib
+import zlib
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+try:
+    import zstandard
+except ImportError:  # Optional; zlib is always available
+    zstandard = None
+
+CODEC_ZLIB = 'zlib'
+CODEC_ZSTD = 'zstd'
+DEFAULT_BATCH_SIZE = 500
+
+
+def blob_storage_enabled():
+    return getattr(settings, 'RESPONSE_BLOB_STORAGE', False)
+
+
+def preferred_codec():
+    codec = getattr(settings, 'RESPONSE_BLOB_CODEC', CODEC_ZLIB)
+    return codec if codec != CODEC_ZSTD or zstandard is not None else CODEC_ZLIB
+
+
+def compress(text, codec):
+    data = text.encode('utf-8')
+    if codec == CODEC_ZSTD:
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return zlib.compress(data, 9)
+
+
+def decompress(data, codec):
+    data = bytes(data)
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("This response was stored with zstd; install the 'zstandard' package to read it.")
+        return zstandard.ZstdDecompressor().decompress(data).decode('utf-8')
+    return zlib.decompress(data).decode('utf-8')
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def store_text(text):
+    """Return the ResponseBlob holding text, creating it if this content is new"""
+    from .models import ResponseBlob
+
+    digest = content_hash(text)
+    blob = ResponseBlob.objects.filter(hash=digest).first()
+    if blob is not None:
+        return blob
+    codec = preferred_codec()
+    try:
+        with transaction.atomic():
+            return ResponseBlob.objects.create(hash=digest, codec=codec, data=compress(text, codec), size=len(text))
+    except IntegrityError:
+        return ResponseBlob.objects.get(hash=digest)  # Stored concurrently by another writer
+
+
+def compact_responses(batch_size=DEFAULT_BATCH_SIZE):
+    """Move inline bot responses into blobs a batch at a time.
+
+    Returns ``(rows, text_bytes, stored_bytes)``: rows converted, their UTF-8
+    size before, and the compressed size of the blobs created for them (text
+    already stored by another row costs nothing).
+    """
+    from .models import ChatHistory, ResponseBlob
+
+    rows = text_bytes = stored_bytes = 0
+    last_id = 0
+    while True:
+        chats = list(
+            ChatHistory.objects.filter(pk__gt=last_id, response_blob__isnull=True)
+            .exclude(bot_response='')
+            .order_by('pk')
+            .only('pk', 'bot_response')[:batch_size]
+        )
+        if not chats:
+            return rows, text_bytes, stored_bytes
+
+        with transaction.atomic():
+            for chat in chats:
+                text_bytes += len(chat.bot_response.encode('utf-8'))
+                created = not ResponseBlob.objects.filter(hash=content_hash(chat.bot_response)).exists()
+                chat.response_blob = store_text(chat.bot_response)
+                if created:
+                    stored_bytes += len(chat.response_blob.data)
+                chat.bot_response = ''
+            ChatHistory.objects.bulk_update(chats, ['response_blob', 'bot_response'])
+        rows += len(chats)
+        last_id = chats[-1].pk
+
+
+def delete_orphans():
+    """Remove blobs no chat references any more (e.g. after archiving); returns the count"""
+    from .models import ResponseBlob
+
+    deleted, _ = ResponseBlob.objects.filter(chathistory__isnull=True).delete()
+    return deleted
+
+
+def resolve_text(bot_response, codec, data):
+    """Response text from a values() row that selected bot_response and the blob's codec/data"""
+    if data is None:
+        return bot_response
+    return decompress(data, codec)
+
+
+# Extra lookups a values()/values_list() query needs so resolve_text can rebuild the response
+BLOB_VALUE_FIELDS = ('response_blob__codec', 'response_blob__data')
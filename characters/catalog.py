@@ -0,0 +1,23 @@
+"""
+Cached character catalog shared by the index page and the characters API
+"""
+from django.core.cache import cache
+
+from .models import Character
+
+CATALOG_CACHE_KEY = 'characters:catalog'
+CATALOG_CACHE_TIMEOUT = 60 * 60
+CATALOG_FIELDS = ('id', 'name', 'era', 'birth_year', 'death_year', 'description', 'prompt_version')
+
+
+def get_catalog():
+    """All characters as plain dicts ordered by name; cleared whenever a character changes"""
+    return cache.get_or_set(
+        CATALOG_CACHE_KEY,
+        lambda: list(Character.objects.order_by('name').values(*CATALOG_FIELDS)),
+        CATALOG_CACHE_TIMEOUT,
+    )
+
+
+def invalidate_catalog(sender, **kwargs):
+    cache.delete(CATALOG_CACHE_KEY)
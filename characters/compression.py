@@ -0,0 +1,71 @@
+"""
+Brotli/gzip compression for API responses above a size threshold
+"""
+import gzip
+import re
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # Optional; gzip is always available
+    brotli = None
+
+# Only API payloads are compressed; HTML pages carry the CSRF token (BREACH)
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-msgpack', 'text/csv')
+
+re_accepts_br = re.compile(r'\bbr\b')
+re_accepts_gzip = re.compile(r'\bgzip\b')
+
+
+def choose_encoding(accept_encoding):
+    if brotli is not None and re_accepts_br.search(accept_encoding):
+        return 'br'
+    if re_accepts_gzip.search(accept_encoding):
+        return 'gzip'
+    return None
+
+
+def compress(content, encoding):
+    if encoding == 'br':
+        return brotli.compress(content, quality=getattr(settings, 'RESPONSE_BROTLI_QUALITY', 5))
+    return gzip.compress(content, compresslevel=getattr(settings, 'RESPONSE_GZIP_LEVEL', 6), mtime=0)
+
+
+class CompressionMiddleware:
+    """Compress JSON/msgpack/CSV responses of at least RESPONSE_COMPRESSION_MIN_BYTES.
+
+    Prefers Brotli when the ``brotli`` package is installed and the client
+    accepts it, otherwise gzip. Streaming responses are left alone so NDJSON
+    events are not held back by the compressor (the export endpoint gzips
+    its own stream).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        if response.get('Content-Type', '').split(';')[0].strip() not in COMPRESSIBLE_TYPES:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if len(response.content) < getattr(settings, 'RESPONSE_COMPRESSION_MIN_BYTES', 1024):
+            return response
+        encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        compressed = compress(response.content, encoding)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response.headers['Content-Length'] = str(len(compressed))
+        response.headers['Content-Encoding'] = encoding
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        return response
@@ -0,0 +1,70 @@
+"""
+Client disconnect detection and incremental streaming for long-running HTTP requests
+"""
+import threading
+
+from asgiref.sync import sync_to_async
+
+DISCONNECT_SCOPE_KEY = 'characters.disconnected'
+
+
+def track_disconnects(app):
+    """Wrap an ASGI app so every HTTP request carries an Event set when the client goes away.
+
+    Django listens for ``http.disconnect`` while a view runs but cannot
+    interrupt a synchronous view's worker thread; the Event lets the view
+    notice and abort its own upstream work.
+    """
+    async def wrapper(scope, receive, send):
+        if scope['type'] != 'http':
+            return await app(scope, receive, send)
+
+        disconnected = threading.Event()
+        scope[DISCONNECT_SCOPE_KEY] = disconnected
+
+        async def tracking_receive():
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                disconnected.set()
+            return message
+
+        return await app(scope, tracking_receive, send)
+
+    return wrapper
+
+
+def get_disconnect_event(request):
+    """Event set when the client of request disconnects (never set under WSGI)"""
+    scope = getattr(request, 'scope', None) or {}
+    return scope.get(DISCONNECT_SCOPE_KEY) or threading.Event()
+
+
+_END = object()
+
+
+def stream_content(request, iterator):
+    """Content for a StreamingHttpResponse that reaches the client chunk by chunk.
+
+    Django's ASGI handler drains a synchronous iterator into a list before
+    sending anything, so under ASGI the iterator is advanced one chunk at a
+    time in the sync thread instead. Under WSGI it is returned unchanged.
+    """
+    if getattr(request, 'scope', None) is None:
+        return iterator
+    return _iterate_in_thread(iter(iterator))
+
+
+async def _iterate_in_thread(iterator):
+    # thread_sensitive keeps every step (and the ORM connection it uses) on one thread
+    advance = sync_to_async(next, thread_sensitive=True)
+    try:
+        while True:
+            chunk = await advance(iterator, _END)
+            if chunk is _END:
+                return
+            yield chunk
+    finally:
+        # Runs the generator's own cleanup (GeneratorExit) when the client disconnects mid-stream
+        close = getattr(iterator, 'close', None)
+        if close is not None:
+            await sync_to_async(close, thread_sensitive=True)()
@@ -0,0 +1,96 @@
+"""
+Streaming export of chat history as CSV or JSONL
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import date
+
+from .blobs import BLOB_VALUE_FIELDS, resolve_text
+from .models import ChatHistory
+
+EXPORT_FORMATS = ('csv', 'jsonl')
+EXPORT_FIELDS = ('id', 'character_name', 'user_question', 'bot_response', 'timestamp')
+DEFAULT_CHUNK_SIZE = 2000
+
+
+def parse_day(value, name):
+    """date from a YYYY-MM-DD string (None if empty); raises ValueError naming the parameter"""
+    if not value or isinstance(value, date):
+        return value or None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"'{name}' must be a date (YYYY-MM-DD).")
+
+
+def filter_chat_history(character=None, since=None, until=None):
+    """Chat history filtered the same way as ChatHistoryView, oldest first.
+
+    since and until are dates or YYYY-MM-DD strings; a malformed string raises ValueError.
+    """
+    since, until = parse_day(since, 'from'), parse_day(until, 'to')
+    queryset = ChatHistory.objects.all()
+    if character:
+        queryset = queryset.filter(character_name__icontains=character)
+    if since:
+        queryset = queryset.filter(timestamp__date__gte=since)
+    if until:
+        queryset = queryset.filter(timestamp__date__lte=until)
+    return queryset.order_by('pk')
+
+
+def iter_rows(queryset, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Iterate over plain tuples using a server-side cursor so memory stays flat"""
+    rows = queryset.values_list(*EXPORT_FIELDS, *BLOB_VALUE_FIELDS).iterator(chunk_size=chunk_size)
+    for chat_id, character_name, user_question, bot_response, timestamp, codec, data in rows:
+        yield chat_id, character_name, user_question, resolve_text(bot_response, codec, data), timestamp
+
+
+def iter_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        writer.writerow(row[:-1] + (row[-1].isoformat(),))
+        if buffer.tell() > 64 * 1024:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_jsonl(rows):
+    lines = []
+    size = 0
+    for row in rows:
+        record = dict(zip(EXPORT_FIELDS, row[:-1] + (row[-1].isoformat(),)))
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        lines.append(line)
+        size += len(line)
+        if size > 64 * 1024:
+            yield ''.join(lines)
+            lines, size = [], 0
+    yield ''.join(lines)
+
+
+def iter_gzip(chunks):
+    """Gzip a stream of text chunks on the fly"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 writes a gzip header
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def iter_export(queryset, export_format='csv', compress=False, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Encode a chat history queryset as a stream of CSV or JSONL chunks"""
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format '{export_format}'. Use one of: {', '.join(EXPORT_FORMATS)}")
+    encoder = iter_csv if export_format == 'csv' else iter_jsonl
+    chunks = encoder(iter_rows(queryset, chunk_size))
+    if compress:
+        return iter_gzip(chunks)
+    return (chunk.encode('utf-8') for chunk in chunks)
@@ -0,0 +1,85 @@
+"""
+Idempotency-Key support for chat requests
+"""
+import hashlib
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import IdempotencyRecord
+
+# Longest accepted header value; the stored key also carries the client id (IdempotencyRecord.key is 255 chars)
+MAX_KEY_LENGTH = 200
+POLL_INTERVAL = 0.25
+
+
+def scoped_key(client, key):
+    """Stored form of a client's key, so one client can never replay another client's response"""
+    return f"{client}:{key}"
+
+
+def request_fingerprint(payload):
+    """Hash of the request payload, so a key reused for a different request can be rejected"""
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def _lock_expiry():
+    return timezone.now() + timedelta(seconds=getattr(settings, 'IDEMPOTENCY_LOCK_SECONDS', 120))
+
+
+def begin(key, fingerprint):
+    """Claim key for a new request.
+
+    Returns ``(record, created)``. When created is False another request owns
+    (or already completed) the key. An in-progress record whose lock expired,
+    e.g. because its worker died, is taken over.
+    """
+    for _ in range(2):
+        try:
+            with transaction.atomic():
+                return IdempotencyRecord.objects.create(key=key, fingerprint=fingerprint, expires_at=_lock_expiry()), True
+        except IntegrityError:
+            record = IdempotencyRecord.objects.filter(key=key).first()
+            if record is None:
+                continue  # Deleted between our insert and read; try again
+            if record.expires_at <= timezone.now():
+                IdempotencyRecord.objects.filter(pk=record.pk, expires_at=record.expires_at).delete()
+                continue
+            return record, False
+    return IdempotencyRecord.objects.get(key=key), False
+
+
+def complete(record, status_code, body):
+    """Store the final response so later retries replay it"""
+    record.status_code = status_code
+    record.response_body = body
+    record.expires_at = timezone.now() + timedelta(seconds=getattr(settings, 'IDEMPOTENCY_TTL_SECONDS', 86400))
+    record.save(update_fields=['status_code', 'response_body', 'expires_at'])
+
+
+def abandon(record):
+    """Release the key without storing a result, so a retry generates again"""
+    IdempotencyRecord.objects.filter(pk=record.pk, status_code__isnull=True).delete()
+
+
+def wait_for_completion(key, timeout=None):
+    """Poll until the request owning key finishes; returns the record, or None on timeout/abandon"""
+    timeout = getattr(settings, 'IDEMPOTENCY_WAIT_SECONDS', 60) if timeout is None else timeout
+    deadline = time.monotonic() + timeout
+    while True:
+        record = IdempotencyRecord.objects.filter(key=key).first()
+        if record is None or record.is_complete:
+            return record
+        if time.monotonic() >= deadline:
+            return None
+        time.sleep(POLL_INTERVAL)
+
+
+def purge_expired():
+    """Delete records past their TTL; returns the number removed"""
+    count, _ = IdempotencyRecord.objects.filter(expires_at__lte=timezone.now()).delete()
+    return count
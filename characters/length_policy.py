@@ -0,0 +1,153 @@
+"""
+Reply length policy: pick max_tokens and a style instruction from the kind of question asked
+"""
+import json
+import re
+from pathlib import Path
+
+from django.conf import settings
+
+from .usage import estimate_tokens
+
+FACT = 'fact'
+EXPLANATION = 'explanation'
+STORY = 'story'
+AUTO = 'auto'
+
+POLICIES = {
+    FACT: {
+        'max_tokens': 150,
+        'instruction': "Answer briefly, in one to three sentences, staying in character.",
+    },
+    EXPLANATION: {
+        'max_tokens': 400,
+        'instruction': "Answer in a short paragraph or two, staying in character.",
+    },
+    STORY: {
+        'max_tokens': 800,
+        'instruction': "Answer as a vivid first-person story from your life; several paragraphs are fine.",
+    },
+}
+MAX_TOKENS_LIMIT = 1024
+# Questions at most this many words long that match no other cue are treated as quick facts
+QUICK_FACT_WORDS = 8
+
+_STORY_RE = re.compile(
+    r"\b(?:tell (?:me|us) (?:a |the )?(?:story|about (?:a|the) (?:time|day))|stor(?:y|ies)|describe|"
+    r"what was it like|recount|narrate|remember (?:when|the day)|imagine|walk (?:me|us) through)\b",
+    re.IGNORECASE,
+)
+_EXPLANATION_RE = re.compile(
+    r"\b(?:why|how (?:does|do|did|can|could|would|should|is|are|was|were)|explain|what do you think|"
+    r"your (?:views?|opinions?|thoughts)|compare|difference|advice|should (?:i|we))\b",
+    re.IGNORECASE,
+)
+_FACT_RE = re.compile(
+    r"^\W*(?:who|when|where|which|what year|how (?:old|many|much|long|tall|far)|"
+    r"did you|were you|are you|is it|was it|do you|have you|had you)\b",
+    re.IGNORECASE,
+)
+
+
+def classify(question):
+    """Cheap local guess at the kind of answer a question wants: fact, explanation or story"""
+    question = question or ''
+    if _STORY_RE.search(question):
+        return STORY
+    if _EXPLANATION_RE.search(question):
+        return EXPLANATION
+    if _FACT_RE.search(question) or len(question.split()) <= QUICK_FACT_WORDS:
+        return FACT
+    return EXPLANATION
+
+
+def parse_overrides(length=None, max_tokens=None):
+    """Validate the per-request ``length`` and ``max_tokens`` fields; raises ValueError with a client message"""
+    if length not in (None, '', AUTO, *POLICIES):
+        raise ValueError(f"'length' must be one of: {', '.join([AUTO, *POLICIES])}.")
+    if max_tokens not in (None, ''):
+        try:
+            max_tokens = int(max_tokens)
+        except (TypeError, ValueError):
+            raise ValueError("'max_tokens' must be an integer.")
+        if not 1 <= max_tokens <= MAX_TOKENS_LIMIT:
+            raise ValueError(f"'max_tokens' must be between 1 and {MAX_TOKENS_LIMIT}.")
+    return (length or None), (max_tokens or None)
+
+
+def has_overrides(length=None, max_tokens=None):
+    """Whether the client asked for a specific length or cap instead of the classified policy"""
+    return length not in (None, AUTO) or max_tokens is not None
+
+
+def choose(question, length=None, max_tokens=None):
+    """``(category, max_tokens, instruction)`` for a question.
+
+    ``length`` forces a category (None or "auto" classifies the question) and
+    ``max_tokens`` replaces the category's cap. With CHAT_LENGTH_POLICY off
+    and no overrides, returns ``(None, None, '')`` and replies are unbounded.
+    """
+    if not getattr(settings, 'CHAT_LENGTH_POLICY', True) and length in (None, AUTO) and max_tokens is None:
+        return None, None, ''
+    category = length if length in POLICIES else classify(question)
+    policy = POLICIES[category]
+    return category, max_tokens or policy['max_tokens'], policy['instruction']
+
+
+def apply_instruction(system_prefix, instruction):
+    """Append the style instruction after the cached prefix, so the prefix stays byte-identical"""
+    return f"{system_prefix}\n\n{instruction}" if instruction else system_prefix
+
+
+EVAL_SET_PATH = Path(__file__).resolve().parent / 'data' / 'length_eval.jsonl'
+
+
+def load_eval_set(path=None):
+    """Labelled questions (``{"question", "expected"}`` per line) for offline evaluation"""
+    with open(path or EVAL_SET_PATH, encoding='utf-8') as handle:
+        return [json.loads(line) for line in handle if line.strip()]
+
+
+def evaluate_classifier(examples):
+    """Accuracy, per-category confusion counts and the misclassified examples"""
+    confusion = {expected: dict.fromkeys(POLICIES, 0) for expected in POLICIES}
+    mistakes = []
+    for example in examples:
+        predicted = classify(example['question'])
+        confusion[example['expected']][predicted] += 1
+        if predicted != example['expected']:
+            mistakes.append({**example, 'predicted': predicted})
+    correct = len(examples) - len(mistakes)
+    return {
+        'accuracy': correct / len(examples) if examples else 0.0,
+        'confusion': confusion,
+        'mistakes': mistakes,
+    }
+
+
+def estimate_savings(replies, tokens_per_second):
+    """Tokens and generation time the caps would have saved on past (question, reply) pairs.
+
+    Only counts truncation at the cap, so it understates the effect of the
+    style instructions, which also make replies shorter below the cap.
+    """
+    by_category = {category: {'replies': 0, 'baseline_tokens': 0, 'capped_tokens': 0} for category in POLICIES}
+    for question, reply in replies:
+        category = classify(question)
+        baseline = estimate_tokens(reply)
+        totals = by_category[category]
+        totals['replies'] += 1
+        totals['baseline_tokens'] += baseline
+        totals['capped_tokens'] += min(baseline, POLICIES[category]['max_tokens'])
+
+    baseline = sum(totals['baseline_tokens'] for totals in by_category.values())
+    capped = sum(totals['capped_tokens'] for totals in by_category.values())
+    count = sum(totals['replies'] for totals in by_category.values())
+    return {
+        'replies': count,
+        'baseline_tokens': baseline,
+        'capped_tokens': capped,
+        'tokens_saved_pct': round(100 * (baseline - capped) / baseline, 1) if baseline else 0.0,
+        'seconds_saved_per_reply': round((baseline - capped) / tokens_per_second / count, 3) if count else 0.0,
+        'by_category': by_category,
+    }
@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from characters.archive import DEFAULT_BATCH_SIZE, archive_chats, get_archive_dir
+from characters.blobs import delete_orphans
+
+
+class Command(BaseCommand):
+    help = 'Move chat history older than the retention period into compressed archive files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=getattr(settings, 'CHAT_RETENTION_DAYS', 90),
+                            help='Archive chats older than this many days')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='Rows moved per batch')
+        parser.add_argument('--archive-dir', help='Archive root directory (default: settings.CHAT_ARCHIVE_DIR)')
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many rows would be archived')
+
+    def handle(self, *args, **options):
+        archive_dir = options['archive_dir'] or get_archive_dir()
+        count = archive_chats(
+            options['days'],
+            archive_dir=archive_dir,
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+        )
+        if options['dry_run']:
+            self.stdout.write(f'{count} chat(s) older than {options["days"]} days would be archived to {archive_dir}')
+        else:
+            self.stdout.write(self.style.SUCCESS(f'✅ Archived {count} chat(s) to {archive_dir}'))
+            orphans = delete_orphans()
+            if orphans:
+                self.stdout.write(f'🧹 Removed {orphans} response blob(s) no longer referenced')
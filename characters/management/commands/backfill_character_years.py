@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from characters.models import Character
+from characters.years import backfill_years
+
+
+class Command(BaseCommand):
+    help = 'Re-parse birth/death years from the free-text date and era fields of every character'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Characters updated per bulk update')
+
+    def handle(self, *args, **options):
+        changed = backfill_years(Character, batch_size=options['batch_size'])
+        missing = Character.objects.filter(birth_year__isnull=True).count()
+        self.stdout.write(self.style.SUCCESS(f'✅ Updated years for {changed} character(s)'))
+        if missing:
+            self.stdout.write(f'⚠️  {missing} character(s) have no parseable birth year')
@@ -0,0 +1,65 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from characters import usage
+from characters.batch import DEFAULT_CONCURRENCY, build_pairs, load_completed_keys, run_batch
+from characters.models import Character
+
+
+class Command(BaseCommand):
+    help = 'Run a matrix of questions against characters and write the replies as NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--questions', help='File with one question per line')
+        parser.add_argument('--characters', help='Comma-separated character names (default: all characters)')
+        parser.add_argument('--pairs', help='NDJSON file of {"character": ..., "question": ...} objects')
+        parser.add_argument('--output', help='NDJSON output file; an existing file is resumed (default: stdout)')
+        parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help='Maximum parallel LLM calls')
+        parser.add_argument('--persist', action='store_true', help='Save each reply to chat history')
+
+    def handle(self, *args, **options):
+        questions = []
+        if options['questions']:
+            with open(options['questions'], encoding='utf-8') as handle:
+                questions = [line.strip() for line in handle if line.strip()]
+
+        if options['characters']:
+            characters = [name.strip() for name in options['characters'].split(',') if name.strip()]
+        else:
+            characters = list(Character.objects.order_by('name').values_list('name', flat=True))
+
+        explicit_pairs = []
+        if options['pairs']:
+            with open(options['pairs'], encoding='utf-8') as handle:
+                explicit_pairs = [json.loads(line) for line in handle if line.strip()]
+
+        try:
+            pairs = build_pairs(characters=characters, questions=questions, pairs=explicit_pairs)
+        except ValueError as e:
+            raise CommandError(f'{options["pairs"]}: {e}')
+        if not pairs:
+            raise CommandError('Nothing to run. Provide --questions and/or --pairs.')
+
+        completed = load_completed_keys(options['output']) if options['output'] else set()
+        if completed:
+            self.stderr.write(f'Resuming: {len(completed)} pair(s) already completed')
+
+        output = open(options['output'], 'a', encoding='utf-8') if options['output'] else sys.stdout
+        ok_count = 0
+        error_count = 0
+        try:
+            for record in run_batch(pairs, concurrency=options['concurrency'],
+                                    persist=options['persist'], completed_keys=completed):
+                output.write(json.dumps(record, ensure_ascii=False) + '\n')
+                output.flush()  # Keep progress on disk so an interrupted run can resume
+                if 'reply' in record:
+                    ok_count += 1
+                else:
+                    error_count += 1
+        finally:
+            if output is not sys.stdout:
+                output.close()
+            usage.flush()
+
+        self.stderr.write(self.style.SUCCESS(f'✅ {ok_count} succeeded, {error_count} failed, {len(completed)} skipped'))
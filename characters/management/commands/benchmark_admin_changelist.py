@@ -0,0 +1,83 @@
+import statistics
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from characters.models import Character, ChatHistory
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Measure query count and latency of the ChatHistory admin changelist on a large synthetic table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000, help='Synthetic chats to insert (e.g. 10000000)')
+        parser.add_argument('--batch-size', type=int, default=20_000, help='Rows per bulk insert')
+        parser.add_argument('--repeat', type=int, default=5, help='Requests per changelist URL')
+        parser.add_argument('--keep', action='store_true', help='Keep the synthetic rows instead of rolling back')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                if not options['keep']:
+                    raise Rollback
+        except Rollback:
+            self.stdout.write('🧹 Rolled back synthetic data')
+
+    def run(self, options):
+        names = list(Character.objects.order_by('name').values_list('name', flat=True)[:20]) or ['Benchmark Character']
+        for name in names:
+            Character.objects.get_or_create(name=name)
+
+        start = time.perf_counter()
+        now = timezone.now()
+        batches = max(1, -(-options['rows'] // options['batch_size']))
+        last_id = ChatHistory.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+        for batch, offset in enumerate(range(0, options['rows'], options['batch_size'])):
+            ChatHistory.objects.bulk_create([
+                ChatHistory(character_name=names[i % len(names)], user_question=f'Question {i} ' * 8,
+                            bot_response=f'Answer {i} ' * 40)
+                for i in range(offset, min(offset + options['batch_size'], options['rows']))
+            ])
+            # auto_now_add stamps rows with the insert time; spread batches over a year for the date hierarchy
+            ChatHistory.objects.filter(pk__gt=last_id).update(timestamp=now - timedelta(days=365) * (batch + 1) / batches)
+            last_id = ChatHistory.objects.order_by('-pk').values_list('pk', flat=True).first()
+        self.stdout.write(f'Inserted {options["rows"]} chats in {time.perf_counter() - start:.1f}s')
+
+        admin_user = User.objects.create_superuser('changelist-benchmark', password='unused')
+        client = Client(HTTP_HOST='localhost')
+        client.force_login(admin_user)
+        day = now - timedelta(days=365)
+        urls = {
+            'unfiltered': '/admin/characters/chathistory/',
+            'page 100': '/admin/characters/chathistory/?p=100',
+            'by character': f'/admin/characters/chathistory/?character_name={names[0]}',
+            'by day': f'/admin/characters/chathistory/?timestamp__year={day.year}&timestamp__month={day.month}&timestamp__day={day.day}',
+            'search': '/admin/characters/chathistory/?q=Question+42',
+            'characters': '/admin/characters/character/',
+        }
+
+        self.stdout.write(self.style.SUCCESS(f'📊 Admin changelists over {options["rows"]} chats'))
+        for label, url in urls.items():
+            samples = []
+            for _ in range(options['repeat']):
+                with CaptureQueriesContext(connection) as queries:
+                    request_start = time.perf_counter()
+                    response = client.get(url)
+                    samples.append((time.perf_counter() - request_start) * 1000)
+                if response.status_code != 200:
+                    self.stdout.write(self.style.ERROR(f'{label}: HTTP {response.status_code}'))
+                    break
+            else:
+                self.stdout.write(
+                    f'{label:>12}: {len(queries)} queries, p50 {statistics.median(samples):.1f} ms, max {max(samples):.1f} ms'
+                )
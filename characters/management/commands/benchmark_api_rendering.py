@@ -0,0 +1,55 @@
+import gzip
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from characters import compression
+from characters.renderers import FastJSONRenderer, MsgPackRenderer, msgpack, orjson
+
+
+def build_payload(rows):
+    """Chat history payload shaped like ChatHistoryView's response"""
+    now = timezone.now()
+    history = [
+        {
+            'id': i,
+            'character_name': 'Albert Einstein',
+            'user_question': f'What did you think about question number {i}?',
+            'bot_response': f'Ah, question {i}! Imagination is more important than knowledge. ' * 6,
+            'timestamp': now.isoformat(),
+        }
+        for i in range(rows)
+    ]
+    return {'chat_history': history, 'total_count': rows}
+
+
+class Command(BaseCommand):
+    help = 'Compare serialization time and bytes on the wire for API renderers and compression'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000], help='Payload sizes in rows')
+        parser.add_argument('--repeat', type=int, default=20, help='Renders per measurement')
+
+    def handle(self, *args, **options):
+        renderers = [('DRF json', JSONRenderer())]
+        renderers.append(('orjson', FastJSONRenderer()) if orjson else ('orjson (not installed)', None))
+        renderers.append(('msgpack', MsgPackRenderer()) if msgpack else ('msgpack (not installed)', None))
+
+        for rows in options['rows']:
+            payload = build_payload(rows)
+            self.stdout.write(self.style.SUCCESS(f'📊 {rows} rows'))
+            for label, renderer in renderers:
+                if renderer is None:
+                    self.stdout.write(f'{label:>24}')
+                    continue
+                samples = []
+                for _ in range(options['repeat']):
+                    start = time.perf_counter()
+                    body = renderer.render(payload, renderer.media_type, {})
+                    samples.append((time.perf_counter() - start) * 1000)
+                sizes = [f'raw {len(body):>9,} B', f'gzip {len(gzip.compress(body, 6)):>8,} B']
+                if compression.brotli is not None:
+                    sizes.append(f'br {len(compression.compress(body, "br")):>8,} B')
+                self.stdout.write(f'{label:>24}: {statistics.median(samples):7.2f} ms  ' + '  '.join(sizes))
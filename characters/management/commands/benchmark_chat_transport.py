@@ -0,0 +1,100 @@
+import asyncio
+import json
+import statistics
+import time
+from unittest import mock
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from characters.models import Character, ChatHistory
+from characters.services import ChatService
+from characters.websocket import WEBSOCKET_PATH
+
+FAKE_TOKENS = ['I ', 'am ', 'here ', 'to ', 'help.']
+
+
+def fake_generate_reply(system_prompt, user_message, *args, **kwargs):
+    return ''.join(FAKE_TOKENS)
+
+
+def fake_stream_reply(system_prompt, user_message, *args, **kwargs):
+    yield from FAKE_TOKENS
+
+
+class Command(BaseCommand):
+    help = 'Compare per-message overhead of the REST chat endpoint and the WebSocket channel (fake LLM)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=200, help='Messages sent over each transport')
+        parser.add_argument('--character', help='Character to chat with (default: first character)')
+
+    def handle(self, *args, **options):
+        character = (
+            Character.objects.filter(name__iexact=options['character']).first()
+            if options['character'] else Character.objects.order_by('name').first()
+        )
+        if character is None:
+            raise CommandError('No character found. Run populate_characters first.')
+
+        last_id = ChatHistory.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+        try:
+            with mock.patch.object(ChatService, 'generate_reply', staticmethod(fake_generate_reply)), \
+                    mock.patch.object(ChatService, 'stream_reply', staticmethod(fake_stream_reply)):
+                rest = self.bench_rest(character.name, options['messages'])
+                ws = asyncio.run(self.bench_websocket(character.name, options['messages']))
+        finally:
+            ChatHistory.objects.filter(pk__gt=last_id).delete()  # Drop the benchmark's chat rows
+
+        self.stdout.write(self.style.SUCCESS(f'📊 Per-message overhead for {character.name} ({options["messages"]} messages, fake LLM)'))
+        for label, samples in (('REST  /api/chat/', rest), ('WS    /ws/chat/', ws)):
+            self.stdout.write(
+                f'{label}: mean {statistics.mean(samples):.2f} ms, '
+                f'p50 {statistics.median(samples):.2f} ms, '
+                f'p95 {sorted(samples)[int(len(samples) * 0.95) - 1]:.2f} ms'
+            )
+
+    def bench_rest(self, character_name, count):
+        client = Client(HTTP_HOST='localhost')
+        samples = []
+        for i in range(count):
+            start = time.perf_counter()
+            response = client.post('/api/chat/', {'character': character_name, 'message': f'Question {i}'},
+                                   content_type='application/json')
+            samples.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                raise CommandError(f'REST chat failed: {response.status_code} {response.content[:200]!r}')
+        return samples
+
+    async def bench_websocket(self, character_name, count):
+        from backend.asgi import application
+
+        incoming = asyncio.Queue()
+        outgoing = asyncio.Queue()
+        scope = {'type': 'websocket', 'path': WEBSOCKET_PATH, 'query_string': f'character={character_name}'.encode()}
+        session = asyncio.create_task(application(scope, incoming.get, outgoing.put))
+
+        async def next_message():
+            event = await outgoing.get()
+            if event['type'] == 'websocket.close':
+                raise CommandError(f'WebSocket closed with code {event.get("code")}')
+            return json.loads(event['text']) if event['type'] == 'websocket.send' else event
+
+        await incoming.put({'type': 'websocket.connect'})
+        await next_message()  # accept
+        await next_message()  # ready
+
+        samples = []
+        for i in range(count):
+            start = time.perf_counter()
+            await incoming.put({'type': 'websocket.receive', 'text': json.dumps({'message': f'Question {i}'})})
+            while True:
+                message = await next_message()
+                if message.get('type') == 'done':
+                    break
+                if message.get('type') == 'error':
+                    raise CommandError(f'WebSocket chat failed: {message["error"]}')
+            samples.append((time.perf_counter() - start) * 1000)
+
+        await incoming.put({'type': 'websocket.disconnect', 'code': 1000})
+        await session
+        return samples
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+from characters import related
+
+
+class Command(BaseCommand):
+    help = 'Vectorize characters and precompute the related-characters table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=None, help='Related characters stored per character')
+        parser.add_argument('--batch-size', type=int, default=related.DEFAULT_BATCH_SIZE,
+                            help='Rows scored per matrix product')
+        parser.add_argument('--force', action='store_true', help='Re-vectorize characters even if unchanged')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        built = related.build_vectors(batch_size=options['batch_size'], force=options['force'])
+        written = related.rebuild_neighbors(top_k=options['top_k'], batch_size=options['batch_size'])
+        backend = 'NumPy' if related.load_numpy() is not None else 'pure Python (install numpy for large catalogs)'
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Vectorized {built} character(s), stored related characters for {written} '
+            f'in {time.perf_counter() - started:.2f}s using {backend}'
+        ))
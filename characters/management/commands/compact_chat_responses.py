@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from characters.blobs import DEFAULT_BATCH_SIZE, compact_responses
+
+
+class Command(BaseCommand):
+    help = 'Move existing inline bot responses into compressed, deduplicated blob storage'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='Chats converted per transaction')
+
+    def handle(self, *args, **options):
+        rows, text_bytes, stored_bytes = compact_responses(batch_size=options['batch_size'])
+        if not rows:
+            self.stdout.write('Nothing to compact')
+            return
+        saved = text_bytes - stored_bytes
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Compacted {rows} response(s): {text_bytes} bytes → {stored_bytes} bytes ({saved} bytes saved)'
+        ))
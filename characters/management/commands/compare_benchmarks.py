@@ -0,0 +1,44 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from characters import benchmarks
+
+
+class Command(BaseCommand):
+    help = 'Compare two run_benchmarks result files and fail if any benchmark regressed beyond the threshold'
+
+    def add_arguments(self, parser):
+        parser.add_argument('baseline', help='Results file to compare against')
+        parser.add_argument('current', help='Results file of the run being checked')
+        parser.add_argument('--threshold', type=float, default=benchmarks.DEFAULT_THRESHOLD * 100,
+                            help='Allowed slowdown in percent before a change counts as a regression')
+
+    def handle(self, *args, **options):
+        baseline, current = self.load(options['baseline']), self.load(options['current'])
+
+        for key, (old, new) in benchmarks.environment_differences(baseline, current).items():
+            self.stdout.write(f'⚠️  {key} differs: {old} -> {new}; timings may not be comparable')
+
+        rows = benchmarks.compare_results(baseline, current, options['threshold'] / 100)
+        for row in rows:
+            if row['status'] in ('added', 'removed'):
+                self.stdout.write(f'   {row["name"]:<32} {row["status"]}')
+                continue
+            marker = {'regression': '🔺', 'improvement': '🟢'}.get(row['status'], '  ')
+            self.stdout.write(
+                f'{marker} {row["name"]:<32} {row["metric"]:<15} '
+                f'{row["baseline"]:>10.3f} -> {row["current"]:>10.3f}  {row["change"]:+.1%}'
+            )
+
+        regressions = [row for row in rows if row['status'] == 'regression']
+        if regressions:
+            raise CommandError(f'{len(regressions)} regression(s) beyond {options["threshold"]:g}%')
+        self.stdout.write(self.style.SUCCESS(f'✅ No regressions beyond {options["threshold"]:g}%'))
+
+    @staticmethod
+    def load(path):
+        try:
+            with open(path, encoding='utf-8') as handle:
+                return json.load(handle)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Cannot read {path}: {e}')
@@ -0,0 +1,96 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Sum
+from characters import length_policy, metrics, usage
+from characters.blobs import BLOB_VALUE_FIELDS, resolve_text
+from characters.models import Character, ChatHistory, LLMUsage
+from characters.services import ChatService
+
+DEFAULT_TOKENS_PER_SECOND = 250
+
+
+class Command(BaseCommand):
+    help = 'Evaluate the reply length policy: classifier accuracy, and token/latency savings offline or live'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--eval-set', help='JSONL of {"question", "expected"} (default: the bundled set)')
+        parser.add_argument('--history', type=int, default=1000, help='Recent chat replies used to estimate savings')
+        parser.add_argument('--tokens-per-second', type=float,
+                            help='Generation speed for latency estimates (default: measured from LLM usage rows)')
+        parser.add_argument('--live', action='store_true',
+                            help='Also ask the LLM every eval question with and without the policy (costs tokens)')
+        parser.add_argument('--character', help='Character for --live (default: first character)')
+
+    def handle(self, *args, **options):
+        examples = length_policy.load_eval_set(options['eval_set'])
+        report = length_policy.evaluate_classifier(examples)
+        self.stdout.write(self.style.SUCCESS(
+            f'🧭 Classifier accuracy: {report["accuracy"]:.0%} on {len(examples)} labelled questions'
+        ))
+        for expected, predicted in report['confusion'].items():
+            self.stdout.write(f'   {expected:<12} -> ' + ', '.join(f'{name} {count}' for name, count in predicted.items()))
+        for mistake in report['mistakes']:
+            self.stdout.write(f'   ✗ {mistake["question"]!r}: expected {mistake["expected"]}, got {mistake["predicted"]}')
+
+        tokens_per_second = options['tokens_per_second'] or self.measured_tokens_per_second()
+        rows = (
+            ChatHistory.objects.filter(panel__isnull=True).order_by('-timestamp')
+            .values('user_question', 'bot_response', *BLOB_VALUE_FIELDS)[:options['history']]
+        )
+        replies = [
+            (row['user_question'], resolve_text(row['bot_response'], row['response_blob__codec'], row['response_blob__data']))
+            for row in rows
+        ]
+        savings = length_policy.estimate_savings(replies, tokens_per_second)
+        if savings['replies']:
+            self.stdout.write(self.style.SUCCESS(
+                f'✂️  Offline, on {savings["replies"]} recent replies: {savings["baseline_tokens"]} -> '
+                f'{savings["capped_tokens"]} tokens ({savings["tokens_saved_pct"]}% saved), '
+                f'~{savings["seconds_saved_per_reply"]:.2f}s less generation per reply at {tokens_per_second:.0f} tokens/s'
+            ))
+            for category, totals in savings['by_category'].items():
+                self.stdout.write(f'   {category:<12} {totals["replies"]} replies, '
+                                  f'{totals["baseline_tokens"]} -> {totals["capped_tokens"]} tokens')
+            self.stdout.write('   (counts truncation at the caps only; the style instructions shorten replies further)')
+        else:
+            self.stdout.write('⚠️  No chat history to estimate savings from')
+
+        if options['live']:
+            self.live(examples, options['character'])
+
+    def measured_tokens_per_second(self):
+        totals = LLMUsage.objects.filter(estimated=False, latency_ms__gt=0).aggregate(
+            tokens=Sum('completion_tokens'), latency=Sum('latency_ms')
+        )
+        if totals['tokens'] and totals['latency']:
+            return totals['tokens'] / (totals['latency'] / 1000)
+        return DEFAULT_TOKENS_PER_SECOND
+
+    def live(self, examples, character_name):
+        character = (
+            Character.objects.filter(name__iexact=character_name).first()
+            if character_name else Character.objects.order_by('name').first()
+        )
+        if character is None:
+            raise CommandError('No character found. Run populate_characters first.')
+
+        results = {'baseline': [0.0, 0], 'policy': [0.0, 0]}
+        prefix = character.get_system_prefix()
+        for example in examples:
+            _, max_tokens, instruction = length_policy.choose(example['question'])
+            for label, system_prompt, limit in (
+                ('baseline', prefix, None),
+                ('policy', length_policy.apply_instruction(prefix, instruction), max_tokens),
+            ):
+                before = metrics.get('llm.completion_tokens')
+                started = time.perf_counter()
+                ChatService.generate_reply(system_prompt, example['question'], max_tokens=limit)
+                results[label][0] += time.perf_counter() - started
+                results[label][1] += metrics.get('llm.completion_tokens') - before
+        usage.flush()
+
+        count = len(examples)
+        self.stdout.write(self.style.SUCCESS(f'⏱️  Live, {count} questions to {character.name}:'))
+        for label, (seconds, tokens) in results.items():
+            self.stdout.write(f'   {label:<9} mean {seconds / count:.2f}s, {tokens / count:.0f} completion tokens per reply')
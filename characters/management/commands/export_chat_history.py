@@ -0,0 +1,32 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from characters.export import DEFAULT_CHUNK_SIZE, EXPORT_FORMATS, filter_chat_history, iter_export
+
+
+class Command(BaseCommand):
+    help = 'Stream chat history to a CSV or JSONL file with constant memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', dest='export_format', choices=EXPORT_FORMATS, default='csv')
+        parser.add_argument('--gzip', action='store_true', help='Gzip the output on the fly')
+        parser.add_argument('--character', help='Only chats whose character name contains this text')
+        parser.add_argument('--from', dest='since', help='First day to include (YYYY-MM-DD)')
+        parser.add_argument('--to', dest='until', help='Last day to include (YYYY-MM-DD)')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Rows fetched per cursor round trip')
+        parser.add_argument('--output', help='Output file (default: stdout)')
+
+    def handle(self, *args, **options):
+        try:
+            queryset = filter_chat_history(options['character'], options['since'], options['until'])
+            chunks = iter_export(queryset, options['export_format'], options['gzip'], options['chunk_size'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        output = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        try:
+            for chunk in chunks:
+                output.write(chunk)
+        finally:
+            if options['output']:
+                output.close()
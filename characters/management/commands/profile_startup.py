@@ -0,0 +1,39 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from characters.startup import measure_startup
+
+
+class Command(BaseCommand):
+    help = 'Measure cold-start import costs and time-to-first-request in a fresh interpreter'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=20, help='Number of slowest imports to list')
+        parser.add_argument('--path', default='/api/characters/', help='URL used for the first request')
+        parser.add_argument('--json', action='store_true', help='Print the full report as JSON')
+        parser.add_argument('--check', action='store_true', help='Fail if the startup budget is exceeded')
+
+    def handle(self, *args, **options):
+        report = measure_startup(options['path'])
+        imports = sorted(report['imports'], key=lambda row: row[2], reverse=True)
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.stdout.write(self.style.SUCCESS('⏱️ Startup profile'))
+            self.stdout.write('=' * 50)
+            self.stdout.write(f'Django setup + URLconf: {report["setup_ms"]:.1f} ms (budget {settings.STARTUP_BUDGET_MS} ms)')
+            self.stdout.write(f'Time to first request:  {report["first_request_ms"]:.1f} ms (GET {options["path"]} -> {report["status"]})')
+            self.stdout.write('')
+            self.stdout.write(f'{"cumulative ms":>14} {"self ms":>9}  module')
+            for module, self_us, cumulative_us in imports[:options['top']]:
+                self.stdout.write(f'{cumulative_us / 1000:>14.1f} {self_us / 1000:>9.1f}  {module}')
+
+        if report['eager_modules']:
+            self.stdout.write(self.style.WARNING(f'⚠️ Imported eagerly at startup: {", ".join(report["eager_modules"])}'))
+        if options['check']:
+            if report['eager_modules']:
+                raise CommandError('Lazy modules were imported during startup.')
+            if report['setup_ms'] > settings.STARTUP_BUDGET_MS:
+                raise CommandError(f'Startup took {report["setup_ms"]:.1f} ms, over the {settings.STARTUP_BUDGET_MS} ms budget.')
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from characters.idempotency import purge_expired
+
+
+class Command(BaseCommand):
+    help = 'Delete expired Idempotency-Key records'
+
+    def handle(self, *args, **options):
+        count = purge_expired()
+        self.stdout.write(self.style.SUCCESS(f'✅ Purged {count} expired idempotency record(s)'))
@@ -0,0 +1,19 @@
+import json
+
+from django.core.management.base import BaseCommand
+from characters.archive import iter_archived_chats
+
+
+class Command(BaseCommand):
+    help = 'Stream archived chat history as NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='start', help='First day to include (YYYY-MM-DD)')
+        parser.add_argument('--to', dest='end', help='Last day to include (YYYY-MM-DD)')
+        parser.add_argument('--character', help='Only chats whose character name contains this text')
+        parser.add_argument('--archive-dir', help='Archive root directory (default: settings.CHAT_ARCHIVE_DIR)')
+
+    def handle(self, *args, **options):
+        for record in iter_archived_chats(start=options['start'], end=options['end'],
+                                          character=options['character'], archive_dir=options['archive_dir']):
+            self.stdout.write(json.dumps(record, ensure_ascii=False))
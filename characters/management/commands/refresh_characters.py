@@ -0,0 +1,70 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+from characters import usage
+from characters.models import Character
+from characters.services import CharacterInfoService
+
+
+class Command(BaseCommand):
+    help = 'Re-enrich only the characters whose Wikipedia article changed since they were generated'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cadence-days', type=int, default=settings.CHARACTER_REFRESH_DAYS,
+                            help='Only check characters not checked within this many days')
+        parser.add_argument('--all', action='store_true', help='Check every character regardless of cadence')
+        parser.add_argument('--force', action='store_true', help='Regenerate even when the inputs hash is unchanged')
+        parser.add_argument('--dry-run', action='store_true', help='Report what changed without regenerating')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        characters = Character.objects.order_by('name')
+        if not options['all']:
+            cutoff = now - timedelta(days=options['cadence_days'])
+            characters = characters.filter(Q(source_checked_at__isnull=True) | Q(source_checked_at__lt=cutoff))
+        characters = list(characters)
+        if not characters:
+            self.stdout.write('No characters are due for a refresh.')
+            return
+
+        self.stdout.write(self.style.SUCCESS(f'🔄 Checking {len(characters)} character(s) against Wikipedia'))
+        revisions = CharacterInfoService.fetch_wikipedia_revisions([c.name for c in characters])
+
+        changed, unchanged, missing = [], [], []
+        for character in characters:
+            revision = revisions.get(character.name)
+            if revision is None:
+                missing.append(character)
+            elif revision != character.source_revision or options['force']:
+                changed.append((character, revision))
+            else:
+                unchanged.append(character)
+
+        for character, revision in changed:
+            self.stdout.write(f'  ✏️ {character.name}: revision {character.source_revision or "(none)"} -> {revision}')
+        for character in missing:
+            self.stdout.write(f'  ❓ {character.name}: no Wikipedia page found')
+        self.stdout.write(f'{len(changed)} changed, {len(unchanged)} unchanged, {len(missing)} without a page')
+
+        if options['dry_run']:
+            return
+
+        # Unchanged and missing sources only need their check time bumped
+        Character.objects.filter(pk__in=[c.pk for c in unchanged + missing]).update(source_checked_at=now)
+
+        regenerated = 0
+        pages = CharacterInfoService.fetch_wikipedia_pages([character.name for character, _ in changed])
+        for character, _ in changed:
+            try:
+                if CharacterInfoService.auto_populate_character(character, force=options['force'],
+                                                                summary=pages.get(character.name, {})):
+                    regenerated += 1
+                character.save()
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f'❌ Error refreshing {character.name}: {e}'))
+        usage.flush()
+
+        self.stdout.write(self.style.SUCCESS(f'✅ Refreshed {regenerated} character(s)'))
@@ -0,0 +1,113 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+from characters import benchmarks
+
+DEFAULT_PROCESSES = 3
+
+
+class Command(BaseCommand):
+    help = 'Run the offline benchmark suite (fake LLM, Wikipedia fixtures, throwaway database) and save JSON results'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='Results file (default: benchmarks/<timestamp>.json)')
+        parser.add_argument('--only', nargs='+', metavar='NAME', help='Run only these benchmarks')
+        parser.add_argument('--list', action='store_true', help='List the benchmarks and exit')
+        parser.add_argument('--repeat', type=int, default=benchmarks.DEFAULT_REPEAT, help='Samples per benchmark and process')
+        parser.add_argument('--processes', type=int, default=DEFAULT_PROCESSES,
+                            help='Fresh processes to run the suite in; their samples are pooled')
+        parser.add_argument('--characters', type=int, default=benchmarks.DEFAULT_CHARACTERS, help='Synthetic characters')
+        parser.add_argument('--chats', type=int, default=benchmarks.DEFAULT_CHATS, help='Synthetic chat history rows')
+        parser.add_argument('--concurrency', type=int, default=benchmarks.DEFAULT_CONCURRENCY,
+                            help='Concurrent clients in the chat endpoint benchmark')
+        parser.add_argument('--llm-latency-ms', type=float, default=benchmarks.DEFAULT_LLM_LATENCY * 1000,
+                            help='Latency of the fake LLM')
+
+    def handle(self, *args, **options):
+        if options['list']:
+            for name, case in benchmarks.BENCHMARKS.items():
+                self.stdout.write(f'{name:<32} {case["kind"]:<6} {case["description"]}')
+            return
+
+        unknown = [name for name in options['only'] or () if name not in benchmarks.BENCHMARKS]
+        if unknown:
+            raise CommandError(f"Unknown benchmark(s): {', '.join(unknown)}. See --list.")
+        output = Path(options['output'] or Path(settings.BASE_DIR) / 'benchmarks' / f'{timezone.now():%Y%m%d-%H%M%S}.json')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'⏱️  Running benchmarks ({options["repeat"]} samples each, {options["processes"]} process(es))'
+        ))
+        if options['processes'] > 1:
+            report = self.run_processes(options)
+            for name, result in report['results'].items():
+                self.progress(name, result)
+        else:
+            report = self.run_here(options)
+
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(report, indent=2) + '\n', encoding='utf-8')
+        self.stdout.write(self.style.SUCCESS(f'💾 Saved results to {output}'))
+
+    def run_here(self, options):
+        env = benchmarks.BenchmarkEnv(
+            characters=options['characters'], chats=options['chats'],
+            concurrency=options['concurrency'], llm_latency=options['llm_latency_ms'] / 1000,
+        )
+        # Same isolation as the test runner: DEBUG off and a fresh, migrated database that is dropped afterwards.
+        # SQLite gets a file rather than its in-memory test database so concurrent requests can share it.
+        old_name = connection.settings_dict['NAME']
+        temp_dir = None
+        if connection.vendor == 'sqlite':
+            temp_dir = tempfile.TemporaryDirectory()
+            connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(temp_dir.name, 'benchmarks.sqlite3')
+        setup_test_environment(debug=False)
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            return benchmarks.run_benchmarks(options['only'], options['repeat'], env, progress=self.progress)
+        except benchmarks.BenchmarkError as e:
+            raise CommandError(str(e))
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            if temp_dir is not None:
+                temp_dir.cleanup()
+
+    def run_processes(self, options):
+        """Run the suite once per process with --processes 1 and pool the results"""
+        arguments = [
+            '--repeat', str(options['repeat']), '--processes', '1',
+            '--characters', str(options['characters']), '--chats', str(options['chats']),
+            '--concurrency', str(options['concurrency']), '--llm-latency-ms', str(options['llm_latency_ms']),
+        ]
+        if options['only']:
+            arguments += ['--only', *options['only']]
+
+        reports = []
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for number in range(1, options['processes'] + 1):
+                path = os.path.join(temp_dir, f'{number}.json')
+                result = subprocess.run(
+                    [sys.executable, '-m', 'django', 'run_benchmarks', *arguments, '--output', path],
+                    cwd=settings.BASE_DIR, capture_output=True, text=True,
+                )
+                if result.returncode != 0:
+                    raise CommandError(f'Benchmark process {number} failed:\n{result.stderr.strip()}')
+                self.stdout.write(f'   process {number}/{options["processes"]} done')
+                with open(path, encoding='utf-8') as handle:
+                    reports.append(json.load(handle))
+        return benchmarks.merge_reports(reports)
+
+    def progress(self, name, result):
+        line = f'   {name:<32} median {result["median_ms"]:>9.3f} ms   p95 {result["p95_ms"]:>9.3f} ms'
+        if 'throughput_rps' in result:
+            line += f'   {result["throughput_rps"]:.1f} req/s'
+        self.stdout.write(line)
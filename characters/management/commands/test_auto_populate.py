@@ -1,4 +1,5 @@
 from django.core.management.base import BaseCommand
+from characters import usage
 from characters.models import Character
 from characters.services import CharacterInfoService
 
@@ -114,3 +115,5 @@ class Command(BaseCommand):
             self.stdout.write(self.style.ERROR(f'❌ Error during testing: {str(e)}'))
             import traceback
             self.stdout.write(traceback.format_exc())
+        finally:
+            usage.flush()
@@ -25,7 +25,7 @@ class Command(BaseCommand):
             for i, chat in enumerate(chat_history[:5], 1):
                 self.stdout.write(f'{i}. Character: {chat.character_name}')
                 self.stdout.write(f'   User: {chat.user_question[:100]}...' if len(chat.user_question) > 100 else f'   User: {chat.user_question}')
-                self.stdout.write(f'   Bot: {chat.bot_response[:100]}...' if len(chat.bot_response) > 100 else f'   Bot: {chat.bot_response}')
+                self.stdout.write(f'   Bot: {chat.response_text[:100]}...' if len(chat.response_text) > 100 else f'   Bot: {chat.response_text}')
                 self.stdout.write(f'   Time: {chat.timestamp}')
                 self.stdout.write('')
         
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from characters.analytics import DEFAULT_BATCH_SIZE, update_rollups
+
+
+class Command(BaseCommand):
+    help = 'Fold new chat history into the hourly/daily analytics rollups'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='Chats aggregated per transaction')
+
+    def handle(self, *args, **options):
+        processed = update_rollups(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'✅ Rolled up {processed} new chat(s)'))
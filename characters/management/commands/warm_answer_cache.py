@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from characters import usage
+from characters.batch import DEFAULT_CONCURRENCY
+from characters.models import Character
+from characters.warm_cache import plan_warmup, warm_answers
+
+
+class Command(BaseCommand):
+    help = "Pre-generate answers to each character's most frequent questions (run off-peak)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=20, help='Questions warmed per character')
+        parser.add_argument('--days', type=int, default=30, help='Look-back window for question popularity')
+        parser.add_argument('--character', help='Only warm this character')
+        parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help='Maximum parallel LLM calls')
+        parser.add_argument('--force', action='store_true', help='Regenerate answers that are still current')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be generated')
+
+    def handle(self, *args, **options):
+        characters = None
+        if options['character']:
+            characters = list(Character.objects.filter(name__iexact=options['character']))
+
+        todo, prune = plan_warmup(options['top'], options['days'], characters, options['force'])
+        total = sum(len(questions) for questions in todo.values())
+        self.stdout.write(self.style.SUCCESS(f'🔥 {total} answer(s) to generate for {len(todo)} character(s), {prune.count()} to prune'))
+        for character, questions in todo.items():
+            self.stdout.write(f'  {character.name}: {len(questions)} question(s)')
+        if options['dry_run']:
+            return
+
+        prune.delete()
+        generated = failed = 0
+        for record in warm_answers(todo, concurrency=options['concurrency']):
+            if 'reply' in record:
+                generated += 1
+            else:
+                failed += 1
+                self.stdout.write(self.style.WARNING(f'⚠️ {record["character"]}: {record["question"]}: {record["error"]}'))
+        usage.flush()
+
+        self.stdout.write(self.style.SUCCESS(f'✅ Warmed {generated} answer(s), {failed} failed'))
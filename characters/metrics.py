@@ -0,0 +1,41 @@
+"""
+In-process metrics counters
+"""
+import threading
+from collections import defaultdict
+
+_lock = threading.Lock()
+_counters = defaultdict(float)
+_gauges = {}
+
+
+def increment(name, value=1):
+    """Add value to a monotonically increasing counter"""
+    with _lock:
+        _counters[name] += value
+
+
+def get(name):
+    with _lock:
+        return _counters.get(name, 0)
+
+
+def register_gauge(name, callback):
+    """Register a callable whose current value is reported on every snapshot"""
+    with _lock:
+        _gauges[name] = callback
+
+
+def snapshot():
+    """Current value of every counter and gauge"""
+    with _lock:
+        data = {name: int(value) if float(value).is_integer() else value for name, value in _counters.items()}
+        gauges = dict(_gauges)
+    for name, callback in gauges.items():
+        data[name] = callback()
+    return data
+
+
+def reset():
+    with _lock:
+        _counters.clear()
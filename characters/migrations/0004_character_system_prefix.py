@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-19 13:36
+
+from django.db import migrations, models
+
+from characters.prompts import compile_system_prefix
+
+
+def compile_existing_prefixes(apps, schema_editor):
+    Character = apps.get_model('characters', 'Character')
+    for character in Character.objects.all():
+        character.system_prefix, character.prompt_version = compile_system_prefix(character)
+        character.save(update_fields=['system_prefix', 'prompt_version'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('characters', '0003_character_auto_generated_character_birth_date_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='character',
+            name='prompt_version',
+            field=models.CharField(blank=True, editable=False, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='character',
+            name='system_prefix',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(compile_existing_prefixes, migrations.RunPython.noop),
+    ]
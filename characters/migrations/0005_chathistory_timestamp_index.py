@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-19 13:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('characters', '0004_character_system_prefix'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='chathistory',
+            name='timestamp',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
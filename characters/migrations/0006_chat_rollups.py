@@ -0,0 +1,53 @@
+# Generated by Django 5.2.4 on 2026-10-19 13:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('characters', '0005_chathistory_timestamp_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_chat_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ChatRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('character_name', models.CharField(max_length=100)),
+                ('granularity', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], max_length=4)),
+                ('bucket_start', models.DateTimeField()),
+                ('message_count', models.PositiveIntegerField(default=0)),
+                ('total_question_chars', models.PositiveBigIntegerField(default=0)),
+                ('total_response_chars', models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['granularity', 'bucket_start'], name='characters__granula_642e4e_idx')],
+                'constraints': [models.UniqueConstraint(fields=('granularity', 'character_name', 'bucket_start'), name='unique_chat_rollup_bucket')],
+            },
+        ),
+        migrations.CreateModel(
+            name='QuestionRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('character_name', models.CharField(max_length=100)),
+                ('day', models.DateField()),
+                ('question_hash', models.CharField(max_length=40)),
+                ('question', models.TextField()),
+                ('ask_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['character_name', 'day'], name='characters__charact_3ef54f_idx')],
+                'constraints': [models.UniqueConstraint(fields=('character_name', 'day', 'question_hash'), name='unique_question_rollup')],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.4 on 2026-10-19 13:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('characters', '0007_idempotency_record'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='character',
+            name='enriched_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='character',
+            name='source_checked_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='character',
+            name='source_etag',
+            field=models.CharField(blank=True, max_length=200),
+        ),
+        migrations.AddField(
+            model_name='character',
+            name='source_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='character',
+            name='source_revision',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+    ]
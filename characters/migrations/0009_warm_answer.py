@@ -0,0 +1,30 @@
+# Generated by Django 5.2.4 on 2026-10-19 13:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('characters', '0008_character_source_tracking'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WarmAnswer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('question_hash', models.CharField(max_length=40)),
+                ('question', models.TextField()),
+                ('answer', models.TextField()),
+                ('prompt_version', models.CharField(max_length=32)),
+                ('ask_count', models.PositiveIntegerField(default=0)),
+                ('generated_at', models.DateTimeField(auto_now=True)),
+                ('character', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='warm_answers', to='characters.character')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('character', 'question_hash'), name='unique_warm_answer')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.4 on 2026-10-19 13:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('characters', '0009_warm_answer'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResponseBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hash', models.CharField(max_length=64, unique=True)),
+                ('codec', models.CharField(max_length=8)),
+                ('data', models.BinaryField()),
+                ('size', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='chathistory',
+            name='bot_response',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='chathistory',
+            name='response_blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='characters.responseblob'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-19 13:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('characters', '0010_response_blob'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chathistory',
+            index=models.Index(fields=['character_name', '-timestamp'], name='characters__charact_da5682_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.4 on 2026-10-19 13:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('characters', '0011_chathistory_character_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PanelSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('prompt', models.TextField()),
+                ('character_names', models.JSONField(default=list)),
+                ('rounds', models.PositiveSmallIntegerField(default=1)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='chathistory',
+            name='panel_round',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='chathistory',
+            name='panel',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='turns', to='characters.panelsession'),
+        ),
+    ]
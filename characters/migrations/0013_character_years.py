@@ -0,0 +1,30 @@
+# Generated by Django 5.2.4 on 2026-10-19 14:00
+
+from django.db import migrations, models
+
+from characters.years import backfill_years
+
+
+def parse_existing_years(apps, schema_editor):
+    backfill_years(apps.get_model('characters', 'Character'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('characters', '0012_panel_session'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='character',
+            name='birth_year',
+            field=models.IntegerField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='character',
+            name='death_year',
+            field=models.IntegerField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.RunPython(parse_existing_years, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-19 14:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('characters', '0013_character_years'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='character',
+            name='aliases',
+            field=models.CharField(blank=True, help_text='Other names, comma separated (e.g. Gandhi, Bapu)', max_length=500),
+        ),
+    ]
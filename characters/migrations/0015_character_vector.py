@@ -0,0 +1,24 @@
+# Generated by Django 5.2.4 on 2026-10-19 14:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('characters', '0014_character_aliases'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CharacterVector',
+            fields=[
+                ('character', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='vector', serialize=False, to='characters.character')),
+                ('source_hash', models.CharField(max_length=64)),
+                ('vector', models.BinaryField()),
+                ('neighbors', models.JSONField(default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.4 on 2026-10-19 14:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('characters', '0015_character_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LLMUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField(db_index=True)),
+                ('client', models.CharField(blank=True, max_length=100)),
+                ('character_name', models.CharField(blank=True, max_length=100)),
+                ('purpose', models.CharField(max_length=20)),
+                ('model', models.CharField(max_length=50)),
+                ('prompt_tokens', models.PositiveIntegerField()),
+                ('completion_tokens', models.PositiveIntegerField()),
+                ('latency_ms', models.PositiveIntegerField()),
+                ('estimated', models.BooleanField(default=False)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['client', 'timestamp'], name='characters__client_d1ce04_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-19 14:28
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('characters', '0016_llm_usage'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='character',
+            name='source_etag',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-19 14:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('characters', '0017_remove_character_source_etag'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rollupstate',
+            name='pending_ids',
+            field=models.JSONField(default=list),
+        ),
+    ]
@@ -1,34 +1,264 @@
 from django.db import models
 from django.core.exceptions import ValidationError
+from . import blobs
+from .prompts import PREFIX_SOURCE_FIELDS, compile_system_prefix
+from .years import lifespan_years
 
 # Create your models here.
 
+# Free-text fields birth_year/death_year are parsed from
+YEAR_SOURCE_FIELDS = ('birth_date', 'death_date', 'era')
+
 class Character(models.Model):
     name = models.CharField(max_length=100, unique=True)
+    aliases = models.CharField(max_length=500, blank=True, help_text="Other names, comma separated (e.g. Gandhi, Bapu)")
     era = models.CharField(max_length=100, blank=True)
     description = models.TextField(blank=True)
     persona = models.TextField(blank=True)  # This defines how the AI should behave
     birth_date = models.CharField(max_length=50, blank=True)
     death_date = models.CharField(max_length=50, blank=True)
+    # Parsed from birth_date/death_date/era on save (BC years are negative) for timeline queries
+    birth_year = models.IntegerField(null=True, blank=True, db_index=True, editable=False)
+    death_year = models.IntegerField(null=True, blank=True, db_index=True, editable=False)
     nationality = models.CharField(max_length=100, blank=True)
     occupation = models.CharField(max_length=200, blank=True)
     major_achievements = models.TextField(blank=True)
     historical_context = models.TextField(blank=True)
     famous_quotes = models.TextField(blank=True)
     auto_generated = models.BooleanField(default=False)  # Track if info was auto-generated
+    system_prefix = models.TextField(blank=True, editable=False)  # Compiled system prompt, rebuilt on save
+    prompt_version = models.CharField(max_length=32, blank=True, editable=False)  # Hash of system_prefix for cache keys
+    source_revision = models.CharField(max_length=32, blank=True)  # Wikipedia revision the details were built from
+    source_hash = models.CharField(max_length=64, blank=True)  # Hash of the Wikipedia page the persona was generated from
+    source_checked_at = models.DateTimeField(null=True, blank=True)
+    enriched_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
 
+    @property
+    def alias_list(self):
+        return [alias.strip() for alias in self.aliases.split(',') if alias.strip()]
+
+    def compile_prompt(self):
+        """Recompile the cached system prefix from the persona fields"""
+        self.system_prefix, self.prompt_version = compile_system_prefix(self)
+
+    def get_system_prefix(self):
+        """Return the stored system prefix, compiling it if it was never saved"""
+        if not self.system_prefix and self.persona:
+            self.compile_prompt()
+        return self.system_prefix
+
+    def parse_years(self):
+        """Refresh birth_year/death_year from the free-text date fields"""
+        self.birth_year, self.death_year = lifespan_years(self.birth_date, self.death_date, self.era)
+
     def save(self, *args, **kwargs):
+        self.compile_prompt()
+        self.parse_years()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            if update_fields & set(PREFIX_SOURCE_FIELDS):
+                update_fields |= {'system_prefix', 'prompt_version'}
+            if update_fields & set(YEAR_SOURCE_FIELDS):
+                update_fields |= {'birth_year', 'death_year'}
+            kwargs['update_fields'] = update_fields
         super().save(*args, **kwargs)
 
 
 
+class CharacterVector(models.Model):
+    """Feature vector of a character and its precomputed most similar characters"""
+    character = models.OneToOneField(Character, on_delete=models.CASCADE, primary_key=True, related_name='vector')
+    source_hash = models.CharField(max_length=64)  # Hash of the fields the vector was built from
+    vector = models.BinaryField()  # L2-normalized float32 values
+    neighbors = models.JSONField(default=list)  # [[character_id, similarity], ...] most similar first
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.character_id}: {len(self.neighbors)} related"
+
+
+class ResponseBlob(models.Model):
+    """Compressed response body shared by every chat with identical text"""
+    hash = models.CharField(max_length=64, unique=True)  # sha256 of the uncompressed text
+    codec = models.CharField(max_length=8)
+    data = models.BinaryField()
+    size = models.PositiveIntegerField()  # Uncompressed length in characters
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.hash[:12]
+
+    @property
+    def text(self):
+        return blobs.decompress(self.data, self.codec)
+
+
+class PanelSession(models.Model):
+    """One prompt put to several characters at once, optionally followed by rebuttal rounds"""
+    prompt = models.TextField()
+    character_names = models.JSONField(default=list)  # In the order they were requested
+    rounds = models.PositiveSmallIntegerField(default=1)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{', '.join(self.character_names)}: {self.prompt[:50]}"
+
+
 class ChatHistory(models.Model):
     character_name = models.CharField(max_length=100)
     user_question = models.TextField()
-    bot_response = models.TextField()
-    timestamp = models.DateTimeField(auto_now_add=True)
+    bot_response = models.TextField(blank=True)  # Empty when the body lives in response_blob
+    response_blob = models.ForeignKey(ResponseBlob, null=True, blank=True, on_delete=models.PROTECT)
+    timestamp = models.DateTimeField(auto_now_add=True, db_index=True)
+    panel = models.ForeignKey(PanelSession, null=True, blank=True, on_delete=models.SET_NULL, related_name='turns')
+    panel_round = models.PositiveSmallIntegerField(null=True, blank=True)
+
+    class Meta:
+        # Backs the admin's per-character filter sorted newest first
+        indexes = [models.Index(fields=['character_name', '-timestamp'])]
+
+    @property
+    def response_text(self):
+        """The bot's reply, wherever it is stored"""
+        if self.response_blob_id is not None:
+            return self.response_blob.text
+        return self.bot_response
+
+    @response_text.setter
+    def response_text(self, value):
+        self.bot_response = value
+        self.response_blob = None
+
+    @property
+    def response_length(self):
+        if self.response_blob_id is not None:
+            return self.response_blob.size
+        return len(self.bot_response)
+
+    def save(self, *args, **kwargs):
+        if blobs.blob_storage_enabled() and self.bot_response and self.response_blob_id is None:
+            self.response_blob = blobs.store_text(self.bot_response)
+            self.bot_response = ''
+        super().save(*args, **kwargs)
+
+
+class LLMUsage(models.Model):
+    """One upstream LLM call; append-only, written in buffered batches by characters.usage"""
+    timestamp = models.DateTimeField(db_index=True)
+    client = models.CharField(max_length=100, blank=True)  # "user:<pk>" or "ip:<address>"; blank for background jobs
+    character_name = models.CharField(max_length=100, blank=True)
+    purpose = models.CharField(max_length=20)  # chat, panel, batch, persona, details
+    model = models.CharField(max_length=50)
+    prompt_tokens = models.PositiveIntegerField()
+    completion_tokens = models.PositiveIntegerField()
+    latency_ms = models.PositiveIntegerField()
+    estimated = models.BooleanField(default=False)  # Counted from text/chunks because the provider reported none
+
+    class Meta:
+        indexes = [models.Index(fields=['client', 'timestamp'])]
+
+    def __str__(self):
+        return f"{self.purpose} {self.character_name or '-'}: {self.prompt_tokens}+{self.completion_tokens} tokens"
+
+
+class ChatRollup(models.Model):
+    """Pre-aggregated chat counts per character and hour/day bucket"""
+    HOUR = 'hour'
+    DAY = 'day'
+    GRANULARITY_CHOICES = [(HOUR, 'Hour'), (DAY, 'Day')]
+
+    character_name = models.CharField(max_length=100)
+    granularity = models.CharField(max_length=4, choices=GRANULARITY_CHOICES)
+    bucket_start = models.DateTimeField()
+    message_count = models.PositiveIntegerField(default=0)
+    total_question_chars = models.PositiveBigIntegerField(default=0)
+    total_response_chars = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['granularity', 'character_name', 'bucket_start'], name='unique_chat_rollup_bucket'),
+        ]
+        indexes = [models.Index(fields=['granularity', 'bucket_start'])]
+
+    def __str__(self):
+        return f"{self.character_name} {self.granularity} {self.bucket_start:%Y-%m-%d %H:%M}"
+
+    @property
+    def average_response_length(self):
+        return round(self.total_response_chars / self.message_count) if self.message_count else 0
+
+
+class QuestionRollup(models.Model):
+    """Daily count of each normalized question asked to a character"""
+    character_name = models.CharField(max_length=100)
+    day = models.DateField()
+    question_hash = models.CharField(max_length=40)
+    question = models.TextField()
+    ask_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['character_name', 'day', 'question_hash'], name='unique_question_rollup'),
+        ]
+        indexes = [models.Index(fields=['character_name', 'day'])]
+
+    def __str__(self):
+        return f"{self.character_name}: {self.question[:50]}"
+
+
+class RollupState(models.Model):
+    """High-water mark of the last ChatHistory row folded into the rollups"""
+    name = models.CharField(max_length=50, unique=True)
+    last_chat_id = models.BigIntegerField(default=0)
+    # [[chat_id, unix_time], ...] ids below the mark that were not visible yet, e.g. still being committed
+    pending_ids = models.JSONField(default=list)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.last_chat_id}"
+
+
+class IdempotencyRecord(models.Model):
+    """Result of a chat request made with an Idempotency-Key header; in progress while status_code is null"""
+    key = models.CharField(max_length=255, unique=True)
+    fingerprint = models.CharField(max_length=64)  # Hash of the request payload the key was first used with
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.key
+
+    @property
+    def is_complete(self):
+        return self.status_code is not None
+
+
+class WarmAnswer(models.Model):
+    """Pre-generated answer to one of a character's most frequently asked questions"""
+    character = models.ForeignKey(Character, on_delete=models.CASCADE, related_name='warm_answers')
+    question_hash = models.CharField(max_length=40)  # sha1 of the normalized question
+    question = models.TextField()  # Normalized question text
+    answer = models.TextField()
+    prompt_version = models.CharField(max_length=32)  # Persona version the answer was generated with
+    ask_count = models.PositiveIntegerField(default=0)  # Popularity when the cache was last warmed
+    generated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['character', 'question_hash'], name='unique_warm_answer'),
+        ]
+
+    def __str__(self):
+        return f"{self.character.name}: {self.question[:50]}"
+
+    @property
+    def display_question(self):
+        return f"{self.question[:1].upper()}{self.question[1:]}?"
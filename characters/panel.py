@@ -0,0 +1,123 @@
+"""
+Panel sessions: several characters answer the same prompt, optionally rebutting each other
+"""
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+
+from .models import ChatHistory, PanelSession
+from . import usage
+from .prompts import compile_debate_turn
+from .services import ChatService, GenerationCancelled, record_cancelled_generation
+from .warm_cache import get_warm_answer
+
+MIN_PANEL_SIZE = 2
+MAX_PANEL_SIZE = 6
+MAX_ROUNDS = 3
+
+_generation_slots = None
+_slots_lock = threading.Lock()
+
+
+def generation_slots():
+    """Process-wide semaphore bounding in-flight panel generations across all sessions"""
+    global _generation_slots
+    with _slots_lock:
+        if _generation_slots is None:
+            _generation_slots = threading.BoundedSemaphore(getattr(settings, 'PANEL_MAX_CONCURRENCY', 8))
+        return _generation_slots
+
+
+def _generate(system_prompt, user_message, cancel_event, client, character_name):
+    with generation_slots(), usage.attribute(client=client, character=character_name, purpose='panel'):
+        if cancel_event.is_set():
+            raise GenerationCancelled(0)
+        return ChatService.generate_reply(system_prompt, user_message, cancel_event)
+
+
+def _elapsed_ms(started):
+    return round((time.perf_counter() - started) * 1000)
+
+
+def run_panel(characters, message, rounds=1, cancel_event=None, client=None):
+    """Put message to every character and yield one event dict per reply as it finishes.
+
+    All characters in a round generate concurrently, so a round takes about
+    as long as its slowest reply. Each later round asks every character to
+    respond to the others' previous replies. Replies are saved to chat
+    history on the calling thread; worker threads only talk to the LLM.
+    Token usage is billed to client. Ends with a ``done`` event.
+    """
+    cancel_event = cancel_event or threading.Event()
+    session = PanelSession.objects.create(
+        prompt=message, character_names=[character.name for character in characters], rounds=rounds
+    )
+    started = time.perf_counter()
+
+    def turn_event(round_number, character, reply=None, error=None, cached=False):
+        event = {'type': 'turn', 'panel_id': session.pk, 'round': round_number, 'character': character.name}
+        if error is not None:
+            event['error'] = error
+            return event
+        ChatHistory.objects.create(
+            character_name=character.name,
+            user_question=message,
+            bot_response=reply,
+            panel=session,
+            panel_round=round_number,
+        )
+        event.update(reply=reply, cached=cached, elapsed_ms=_elapsed_ms(started))
+        return event
+
+    previous = {}
+    with ThreadPoolExecutor(max_workers=len(characters)) as executor:
+        try:
+            for round_number in range(1, rounds + 1):
+                replies = {}
+                in_flight = {}
+                cached = []
+                for character in characters:
+                    if round_number == 1:
+                        # Popular questions are answered from the pre-warmed cache without an LLM call
+                        reply = get_warm_answer(character, message)
+                        if reply is not None:
+                            cached.append((character, reply))
+                            continue
+                        user_message = message
+                    else:
+                        user_message = compile_debate_turn(character.name, message, previous)
+                    future = executor.submit(
+                        _generate, character.get_system_prefix(), user_message, cancel_event, client, character.name
+                    )
+                    in_flight[future] = character
+
+                # Everything is submitted before the first event is sent
+                for character, reply in cached:
+                    replies[character.name] = reply
+                    yield turn_event(round_number, character, reply, cached=True)
+
+                while in_flight:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        character = in_flight.pop(future)
+                        try:
+                            reply = future.result()
+                        except GenerationCancelled as e:
+                            record_cancelled_generation(e.tokens_generated)
+                            continue
+                        except Exception as e:
+                            yield turn_event(round_number, character, error=str(e))
+                            continue
+                        replies[character.name] = reply
+                        yield turn_event(round_number, character, reply)
+
+                if cancel_event.is_set():
+                    return
+                previous = replies
+        except GeneratorExit:
+            cancel_event.set()  # The client went away; stop the remaining generations before the pool joins them
+            raise
+
+    yield {'type': 'done', 'panel_id': session.pk, 'rounds': rounds, 'elapsed_ms': _elapsed_ms(started)}
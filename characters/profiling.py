@@ -0,0 +1,173 @@
+"""
+Opt-in per-request CPU and SQL profiling for staff users
+
+Enable with REQUEST_PROFILING_ENABLED = True, then add ``?profile=1`` or an
+``X-Profile: 1`` header to a request made by a staff user. Each profile is
+written to REQUEST_PROFILE_DIR as:
+
+    <id>.prof       cProfile stats (load with pstats or snakeviz)
+    <id>.collapsed  sampled stacks in collapsed format (flamegraph.pl, speedscope)
+    <id>.json       request metadata and SQL query timings
+
+Only the newest REQUEST_PROFILE_LIMIT profiles are kept.
+"""
+import cProfile
+import io
+import json
+import pstats
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import ExitStack
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+SAMPLE_INTERVAL = 0.001  # Seconds between stack samples for the collapsed output
+
+
+def get_profile_dir():
+    return Path(getattr(settings, 'REQUEST_PROFILE_DIR', settings.BASE_DIR / 'profiles'))
+
+
+def profiling_requested(request):
+    if not getattr(settings, 'REQUEST_PROFILING_ENABLED', False):
+        return False
+    if request.GET.get('profile') != '1' and request.headers.get('X-Profile') != '1':
+        return False
+    user = getattr(request, 'user', None)
+    return bool(user and user.is_staff)
+
+
+class QueryTimer:
+    """Database execute wrapper that records every statement and its duration"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'alias': context['connection'].alias,
+                'sql': sql,
+                'ms': round((time.perf_counter() - start) * 1000, 3),
+            })
+
+
+class StackSampler(threading.Thread):
+    """Periodically samples one thread's stack and counts collapsed stacks"""
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})")
+                frame = frame.f_back
+            if names:
+                self.stacks[';'.join(reversed(names))] += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+    def collapsed(self):
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def save_profile(profiler, sampler, timer, request, response, duration_ms, profile_dir=None):
+    """Write the three profile files and trim the ring buffer; returns the profile id"""
+    profile_dir = Path(profile_dir or get_profile_dir())
+    profile_dir.mkdir(parents=True, exist_ok=True)
+    profile_id = f"{timezone.now():%Y%m%dT%H%M%S%f}-{uuid.uuid4().hex[:6]}"
+
+    profiler.dump_stats(str(profile_dir / f"{profile_id}.prof"))
+    (profile_dir / f"{profile_id}.collapsed").write_text(sampler.collapsed(), encoding='utf-8')
+    metadata = {
+        'id': profile_id,
+        'method': request.method,
+        'path': request.get_full_path(),
+        'status': response.status_code,
+        'duration_ms': round(duration_ms, 3),
+        'user': request.user.get_username(),
+        'created_at': timezone.now().isoformat(),
+        'sql_count': len(timer.queries),
+        'sql_ms': round(sum(q['ms'] for q in timer.queries), 3),
+        'queries': timer.queries,
+    }
+    (profile_dir / f"{profile_id}.json").write_text(json.dumps(metadata, indent=2), encoding='utf-8')
+
+    limit = getattr(settings, 'REQUEST_PROFILE_LIMIT', 50)
+    for old in sorted(profile_dir.glob('*.json'))[:-limit]:
+        for suffix in ('.json', '.prof', '.collapsed'):
+            old.with_suffix(suffix).unlink(missing_ok=True)
+    return profile_id
+
+
+def list_profiles(profile_dir=None):
+    """Metadata of the stored profiles, newest first"""
+    profile_dir = Path(profile_dir or get_profile_dir())
+    profiles = []
+    for path in sorted(profile_dir.glob('*.json'), reverse=True):
+        profiles.append(json.loads(path.read_text(encoding='utf-8')))
+    return profiles
+
+
+def load_profile(profile_id, limit=40, profile_dir=None):
+    """Metadata plus the top functions by cumulative time as text, or None if missing"""
+    profile_dir = Path(profile_dir or get_profile_dir())
+    path = profile_dir / f"{profile_id}.json"
+    if '/' in profile_id or not path.exists():
+        return None
+    metadata = json.loads(path.read_text(encoding='utf-8'))
+    stream = io.StringIO()
+    stats = pstats.Stats(str(profile_dir / f"{profile_id}.prof"), stream=stream)
+    stats.sort_stats('cumulative').print_stats(limit)
+    metadata['stats'] = stream.getvalue()
+    return metadata
+
+
+class RequestProfilingMiddleware:
+    """Profile a single request when a staff user asks for it"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not profiling_requested(request):
+            return self.get_response(request)
+
+        timer = QueryTimer()
+        profiler = cProfile.Profile()
+        sampler = StackSampler(threading.get_ident())
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            sampler.start()
+            start = time.perf_counter()
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+                duration_ms = (time.perf_counter() - start) * 1000
+                sampler.stop()
+
+        profile_id = save_profile(profiler, sampler, timer, request, response, duration_ms)
+        response['X-Profile-Id'] = profile_id
+        return response
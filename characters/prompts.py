@@ -0,0 +1,59 @@
+"""
+Canonical system prompt compilation for characters
+"""
+import hashlib
+
+# Bump whenever the layout produced by compile_system_prefix changes, so that
+# every stored prefix (and any cache keyed on it) is invalidated.
+PROMPT_FORMAT_VERSION = 1
+
+# Character fields that feed the system prefix, in the order they are laid out
+PREFIX_SOURCE_FIELDS = ('persona', 'major_achievements', 'historical_context', 'famous_quotes')
+
+SECTION_TITLES = {
+    'major_achievements': 'Major achievements',
+    'historical_context': 'Historical context',
+    'famous_quotes': 'Famous quotes',
+}
+
+
+def _normalize(text):
+    """Normalize line endings and whitespace so equal content is byte-identical"""
+    text = (text or '').replace('\r\n', '\n').replace('\r', '\n')
+    lines = [line.rstrip() for line in text.strip().split('\n')]
+    return '\n'.join(lines)
+
+
+def compile_system_prefix(character):
+    """Build the canonical system prefix for a character.
+
+    Returns a ``(prefix, version)`` tuple where ``version`` is a hash of the
+    format version and the prefix text. Providers only reuse a cached prompt
+    prefix when it is byte-identical, so the layout must be deterministic.
+    """
+    parts = [_normalize(character.persona)]
+    for field in PREFIX_SOURCE_FIELDS[1:]:
+        value = _normalize(getattr(character, field, ''))
+        if value:
+            parts.append(f"## {SECTION_TITLES[field]}\n{value}")
+
+    prefix = '\n\n'.join(part for part in parts if part)
+    digest = hashlib.sha256(f"v{PROMPT_FORMAT_VERSION}\n{prefix}".encode('utf-8')).hexdigest()
+    return prefix, f"v{PROMPT_FORMAT_VERSION}-{digest[:16]}"
+
+
+def compile_debate_turn(character_name, message, previous_replies):
+    """User message for a rebuttal round of a panel.
+
+    The panel context goes in the user turn rather than the system prompt so
+    each character's system prefix stays byte-identical and cacheable.
+    ``previous_replies`` maps character names to their last-round replies.
+    """
+    others = '\n\n'.join(
+        f"{name}: {reply}" for name, reply in previous_replies.items() if name != character_name
+    )
+    return (
+        f"You are on a panel discussing: {message}\n\n"
+        f"The other panelists just said:\n\n{others}\n\n"
+        "Respond to their points in character. Keep it brief."
+    )
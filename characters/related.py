@@ -0,0 +1,280 @@
+"""
+"You might also talk to..." recommendations from a precomputed nearest-neighbour table
+"""
+import hashlib
+import heapq
+import math
+import re
+from array import array
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Character, CharacterVector
+
+# Bump when the vectorizer changes so build_related_characters recomputes every vector
+VECTOR_VERSION = '1'
+VECTOR_DIMENSIONS = 1024
+DEFAULT_BATCH_SIZE = 256
+# Weight of each word from these fields in a character's vector
+VECTOR_FIELDS = {
+    'occupation': 3.0,
+    'description': 1.0,
+    'major_achievements': 1.0,
+    'historical_context': 0.5,
+}
+VECTOR_SOURCE_FIELDS = (*VECTOR_FIELDS, 'nationality', 'era', 'birth_date', 'death_date')
+NATIONALITY_WEIGHT = 2.0
+CENTURY_WEIGHT = 2.0
+
+_WORD_RE = re.compile(r'[a-z]{3,}')
+STOPWORDS = frozenset('''
+    about after also among and are around been before being between both but by can did during each
+    early for from had has have her his into its known late later life many more most not one only
+    other over she such than that the their them then there these they this those through under
+    until was were when where which while who whose with within work works would year years
+'''.split())
+
+
+def _tokens(character):
+    """Weighted features: content words, nationality and every century the character lived in"""
+    weights = Counter()
+    for field, weight in VECTOR_FIELDS.items():
+        for word in _WORD_RE.findall((getattr(character, field) or '').lower()):
+            if word not in STOPWORDS:
+                weights[word] += weight
+    if character.nationality:
+        weights[f'nationality:{character.nationality.strip().lower()}'] += NATIONALITY_WEIGHT
+    if character.birth_year is not None:
+        last = character.death_year if character.death_year is not None else character.birth_year
+        for century in range(character.birth_year // 100, last // 100 + 1):
+            weights[f'century:{century}'] += CENTURY_WEIGHT
+    return weights
+
+
+def source_hash(character):
+    text = '\x1f'.join([VECTOR_VERSION, *(str(getattr(character, field) or '') for field in VECTOR_SOURCE_FIELDS)])
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def vectorize(character):
+    """Hashed bag-of-words vector as packed float32 bytes.
+
+    Feature hashing keeps every vector independent of the rest of the
+    catalog (no shared vocabulary or IDF), so one character can be re-vectorized
+    without touching the others. Repeated words are damped with 1 + log(weight).
+    """
+    values = array('f', bytes(4 * VECTOR_DIMENSIONS))
+    for token, weight in _tokens(character).items():
+        digest = int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest(), 'big')
+        sign = 1.0 if digest >> 63 else -1.0  # Signed hashing keeps collisions unbiased
+        values[digest % VECTOR_DIMENSIONS] += sign * (1.0 + math.log(weight))
+    norm = math.sqrt(sum(value * value for value in values))
+    if norm:
+        values = array('f', (value / norm for value in values))
+    return values.tobytes()
+
+
+def load_numpy():
+    """NumPy if it is installed, else None; imported on first use since this module loads at startup"""
+    try:
+        import numpy
+    except ImportError:  # Optional; a slower pure-Python path over sparse vectors is used without it
+        return None
+    return numpy
+
+
+class VectorSet:
+    """Every stored vector, scored with NumPy matrix products when available"""
+
+    def __init__(self, ids, vectors):
+        self.ids = list(ids)
+        self.raw = [bytes(vector) for vector in vectors]
+        self.positions = {pk: position for position, pk in enumerate(self.ids)}
+        self.numpy = numpy = load_numpy()
+        if numpy is not None:
+            data = b''.join(self.raw)
+            self.matrix = numpy.frombuffer(data, dtype=numpy.float32).reshape(len(self.ids), VECTOR_DIMENSIONS)
+        else:
+            self.sparse = [_sparse(vector) for vector in self.raw]
+
+    @classmethod
+    def load(cls, exclude=None):
+        rows = CharacterVector.objects.order_by('pk')
+        if exclude is not None:
+            rows = rows.exclude(pk=exclude)
+        rows = list(rows.values_list('pk', 'vector'))
+        return cls([pk for pk, _ in rows], [vector for _, vector in rows])
+
+    def vector(self, pk):
+        return self.raw[self.positions[pk]]
+
+    def scores(self, vector):
+        """Cosine similarity of vector to every row, in the order of self.ids"""
+        numpy = self.numpy
+        if numpy is not None:
+            return (self.matrix @ numpy.frombuffer(bytes(vector), dtype=numpy.float32)).tolist()
+        query = _sparse(vector)
+        return [_dot(query, other) for other in self.sparse]
+
+    def all_neighbors(self, top_k, batch_size=DEFAULT_BATCH_SIZE):
+        """Yield (id, neighbors) for every row, scoring batch_size rows against the rest at a time"""
+        numpy = self.numpy
+        if numpy is None:
+            for position, pk in enumerate(self.ids):
+                scores = [_dot(self.sparse[position], other) for other in self.sparse]
+                yield pk, top_neighbors(self.ids, scores, top_k, exclude=pk)
+            return
+
+        count = len(self.ids)
+        ids = numpy.array(self.ids)
+        keep = min(top_k, count - 1)
+        for start in range(0, count, batch_size):
+            block = self.matrix[start:start + batch_size] @ self.matrix.T
+            rows = numpy.arange(block.shape[0])
+            block[rows, start + rows] = -numpy.inf  # A character is not related to itself
+            if keep <= 0:
+                for pk in ids[start:start + batch_size].tolist():
+                    yield pk, []
+                continue
+            candidates = numpy.argpartition(-block, keep - 1, axis=1)[:, :keep]
+            for row, columns in enumerate(candidates):
+                yield int(ids[start + row]), top_neighbors(ids[columns].tolist(), block[row, columns].tolist(), top_k)
+
+
+def _sparse(vector):
+    return {index: value for index, value in enumerate(array('f', bytes(vector))) if value}
+
+
+def _dot(a, b):
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(value * b.get(index, 0.0) for index, value in a.items())
+
+
+def top_neighbors(ids, scores, top_k, exclude=None):
+    """``[[id, similarity], ...]`` for the top_k positive scores, best first"""
+    best = heapq.nlargest(
+        top_k,
+        ((score, pk) for pk, score in zip(ids, scores) if pk != exclude and score > 0),
+        key=lambda item: (item[0], -item[1]),
+    )
+    return [[pk, round(score, 4)] for score, pk in best]
+
+
+def get_top_k():
+    return getattr(settings, 'RELATED_CHARACTERS_TOP_K', 8)
+
+
+def build_vectors(batch_size=DEFAULT_BATCH_SIZE, force=False):
+    """Vectorize every character whose source fields changed since its vector was built; returns the count"""
+    fields = ('pk', 'birth_year', 'death_year', *VECTOR_SOURCE_FIELDS)
+    built = 0
+    last_id = 0
+    while True:
+        characters = list(Character.objects.filter(pk__gt=last_id).order_by('pk').only(*fields)[:batch_size])
+        if not characters:
+            return built
+        current = dict(
+            CharacterVector.objects.filter(pk__in=[c.pk for c in characters]).values_list('pk', 'source_hash')
+        )
+        stale = [c for c in characters if force or current.get(c.pk) != source_hash(c)]
+        for character in stale:
+            CharacterVector.objects.update_or_create(
+                character_id=character.pk, defaults={'source_hash': source_hash(character), 'vector': vectorize(character)}
+            )
+        built += len(stale)
+        last_id = characters[-1].pk
+
+
+def rebuild_neighbors(top_k=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Recompute the whole neighbour table from the stored vectors; returns rows written"""
+    top_k = top_k or get_top_k()
+    vectors = VectorSet.load()
+    updates = []
+    written = 0
+    for pk, neighbors in vectors.all_neighbors(top_k, batch_size):
+        updates.append(CharacterVector(pk=pk, neighbors=neighbors))
+        if len(updates) >= batch_size:
+            CharacterVector.objects.bulk_update(updates, ['neighbors'])
+            written += len(updates)
+            updates = []
+    CharacterVector.objects.bulk_update(updates, ['neighbors'])
+    return written + len(updates)
+
+
+def _refresh_others(changed_pk, scores, vectors, top_k):
+    """Patch other characters' lists after changed_pk was re-vectorized or deleted.
+
+    scores maps ids to their new similarity with changed_pk ({} after a
+    delete). Only a row that changed_pk drops out of while its list is full
+    is rescored against every vector, since whatever replaces it is unknown.
+    """
+    updates = []
+    for pk, neighbors in CharacterVector.objects.exclude(pk=changed_pk).values_list('pk', 'neighbors'):
+        score = scores.get(pk, 0.0)
+        kept = [pair for pair in neighbors if pair[0] != changed_pk]
+        dropped_out = (
+            len(kept) < len(neighbors) and len(neighbors) >= top_k
+            and not (score > 0 and score >= neighbors[-1][1])
+        )
+        if dropped_out:
+            new = top_neighbors(vectors.ids, vectors.scores(vectors.vector(pk)), top_k, exclude=pk)
+        else:
+            if score > 0:
+                kept.append([changed_pk, score])
+            new = top_neighbors([pair[0] for pair in kept], [pair[1] for pair in kept], top_k)
+        if new != neighbors:
+            updates.append(CharacterVector(pk=pk, neighbors=new))
+    CharacterVector.objects.bulk_update(updates, ['neighbors'], batch_size=DEFAULT_BATCH_SIZE)
+    return len(updates)
+
+
+def update_character(character, top_k=None):
+    """Re-vectorize one character and patch the neighbour table; False if its source fields are unchanged"""
+    top_k = top_k or get_top_k()
+    digest = source_hash(character)
+    if CharacterVector.objects.filter(pk=character.pk, source_hash=digest).exists():
+        return False
+    vector = vectorize(character)
+    with transaction.atomic():
+        CharacterVector.objects.update_or_create(
+            character_id=character.pk, defaults={'source_hash': digest, 'vector': vector}
+        )
+        vectors = VectorSet.load()
+        scores = vectors.scores(vector)
+        CharacterVector.objects.filter(pk=character.pk).update(
+            neighbors=top_neighbors(vectors.ids, scores, top_k, exclude=character.pk)
+        )
+        _refresh_others(character.pk, dict(zip(vectors.ids, scores)), vectors, top_k)
+    return True
+
+
+def remove_character(pk, top_k=None):
+    """Drop a deleted character from every list that mentions it"""
+    with transaction.atomic():
+        _refresh_others(pk, {}, VectorSet.load(exclude=pk), top_k or get_top_k())
+
+
+def get_related(character_id, limit=None):
+    """Most similar characters as dicts with id, name, era and score, read straight from the table"""
+    neighbors = CharacterVector.objects.filter(pk=character_id).values_list('neighbors', flat=True).first() or []
+    if limit:
+        neighbors = neighbors[:limit]
+    rows = {row['id']: row for row in Character.objects.filter(pk__in=[pk for pk, _ in neighbors]).values('id', 'name', 'era')}
+    return [{**rows[pk], 'score': score} for pk, score in neighbors if pk in rows]
+
+
+def related_on_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    """post_save hook; patches the neighbour table after the save commits, and only if the source fields changed"""
+    if raw or (update_fields is not None and not set(update_fields) & set(VECTOR_SOURCE_FIELDS)):
+        return
+    if CharacterVector.objects.filter(pk=instance.pk, source_hash=source_hash(instance)).exists():
+        return
+    transaction.on_commit(lambda: update_character(instance))
+
+
+def related_on_delete(sender, instance, **kwargs):
+    pk = instance.pk  # Django clears instance.pk once the delete finishes
+    transaction.on_commit(lambda: remove_character(pk))
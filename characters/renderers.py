@@ -0,0 +1,51 @@
+"""
+Faster API renderers, used when their optional packages are installed
+"""
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # Optional; falls back to DRF's json-based renderer
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # Optional; the msgpack renderer is only enabled when installed
+    msgpack = None
+
+
+def _default(obj):
+    """Encode the types DRF's JSON encoder handles that orjson/msgpack do not natively"""
+    if hasattr(obj, 'isoformat'):
+        return obj.isoformat()
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    return str(obj)  # Decimal, UUID, lazy translation strings
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer that encodes with orjson when it is installed.
+
+    Pretty-printed output (``indent`` in the Accept header or renderer
+    context) still goes through DRF's encoder.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        return orjson.dumps(data, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class MsgPackRenderer(BaseRenderer):
+    """Binary MessagePack responses for clients sending ``Accept: application/x-msgpack``"""
+    media_type = 'application/x-msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=_default, use_bin_type=True)
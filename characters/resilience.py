@@ -0,0 +1,202 @@
+"""
+Circuit breakers and request deadlines for calls to external services (Groq, Wikipedia)
+"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from . import metrics
+
+CLOSED = 'closed'
+HALF_OPEN = 'half_open'
+OPEN = 'open'
+# Reported by the breaker.<name>.state gauge
+STATE_CODES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+_deadline = contextvars.ContextVar('request_deadline', default=None)
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling a dependency whose breaker is open"""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f"{name} is temporarily unavailable; retry in {retry_after}s.")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class UpstreamError(Exception):
+    """A dependency answered, but with a server error that should count against its breaker"""
+
+
+class DeadlineExceeded(Exception):
+    """Raised when the current request has no time left for another upstream call"""
+
+    def __init__(self):
+        super().__init__("Request deadline exceeded.")
+
+
+class CircuitBreaker:
+    """Closed -> open after failure_threshold consecutive failures; open -> half-open after reset_timeout.
+
+    While half-open a single probe call is let through: success closes the
+    breaker, failure opens it again. Every other call fails fast with
+    CircuitOpen while the breaker is not closed.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    @property
+    def state(self):
+        with self.lock:
+            return self._state()
+
+    def _state(self):
+        if self.opened_at is None:
+            return CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return HALF_OPEN
+        return OPEN
+
+    def retry_after(self):
+        with self.lock:
+            if self.opened_at is None:
+                return 0
+            return max(1, round(self.reset_timeout - (time.monotonic() - self.opened_at)))
+
+    def before_call(self):
+        with self.lock:
+            state = self._state()
+            if state == CLOSED:
+                return
+            if state == HALF_OPEN and not self.probing:
+                self.probing = True
+                return
+        metrics.increment(f'breaker.{self.name}.rejected')
+        raise CircuitOpen(self.name, self.retry_after())
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.probing or self.failures >= self.failure_threshold:
+                if self.opened_at is None or self.probing:
+                    metrics.increment(f'breaker.{self.name}.opened')
+                self.opened_at = time.monotonic()
+            self.probing = False
+
+    def release(self):
+        """End a call that neither succeeded nor failed (cancelled, out of time)"""
+        with self.lock:
+            self.probing = False
+
+    @contextmanager
+    def guard(self, neutral=()):
+        """Run the block as one call through the breaker; exceptions in neutral are not failures"""
+        self.before_call()
+        try:
+            yield
+        except (DeadlineExceeded, *neutral):
+            self.release()
+            raise
+        except Exception:
+            self.record_failure()
+            raise
+        except BaseException:  # GeneratorExit from an abandoned stream
+            self.release()
+            raise
+        self.record_success()
+
+    def reset(self):
+        self.record_success()
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name):
+    """Process-wide breaker for a dependency, created (and its state gauge registered) on first use"""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(name)
+            if breaker is None:
+                breaker = _breakers[name] = CircuitBreaker(
+                    name,
+                    failure_threshold=getattr(settings, 'CIRCUIT_BREAKER_FAILURES', 5),
+                    reset_timeout=getattr(settings, 'CIRCUIT_BREAKER_RESET_SECONDS', 30),
+                )
+                metrics.register_gauge(f'breaker.{name}.state', lambda: STATE_CODES[breaker.state])
+    return breaker
+
+
+def reset_breakers():
+    """Forget every breaker so the next call recreates it from settings (used by tests)"""
+    with _breakers_lock:
+        _breakers.clear()
+
+
+@contextmanager
+def deadline(seconds):
+    """Bound the time left for upstream calls in this block; never extends an outer deadline"""
+    current = _deadline.get()
+    new = time.monotonic() + seconds
+    token = _deadline.set(new if current is None else min(current, new))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining():
+    """Seconds left before the current deadline, or None without one"""
+    current = _deadline.get()
+    return None if current is None else current - time.monotonic()
+
+
+def check_deadline():
+    left = remaining()
+    if left is not None and left <= 0:
+        metrics.increment('deadline.exceeded')
+        raise DeadlineExceeded()
+
+
+def timeout_for(default):
+    """Timeout for the next upstream call: default, shrunk to the time left before the deadline"""
+    check_deadline()
+    left = remaining()
+    return default if left is None else min(default, left)
+
+
+class DeadlineMiddleware:
+    """Give every API request REQUEST_DEADLINE_SECONDS in total for its upstream calls.
+
+    Streaming responses produce their body after the view returns, outside
+    the deadline; their upstream calls only get the per-call timeouts.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        seconds = getattr(settings, 'REQUEST_DEADLINE_SECONDS', 0)
+        if not seconds or not request.path.startswith('/api/'):
+            return self.get_response(request)
+        with deadline(seconds):
+            return self.get_response(request)
@@ -0,0 +1,179 @@
+"""
+In-memory prefix/trigram index over character names and aliases for autocomplete
+"""
+import re
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+
+from .models import Character
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+MIN_SCORE = 0.4
+# Saves in other processes are only seen after a rebuild, so the index is rebuilt this often
+INDEX_MAX_AGE = 5 * 60
+
+_WORD_RE = re.compile(r'[a-z0-9]+')
+
+
+def normalize(text):
+    """Lowercase ASCII words only, so "Chārles  Babbage" and "charles babbage" compare equal"""
+    text = unicodedata.normalize('NFKD', text or '').encode('ascii', 'ignore').decode('ascii').lower()
+    return ' '.join(_WORD_RE.findall(text))
+
+
+def trigrams(word):
+    """Trigrams of a word padded like pg_trgm, so short prefixes still share trigrams"""
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _dice(a, b):
+    return 2 * len(a & b) / (len(a) + len(b)) if a and b else 0.0
+
+
+class CharacterIndex:
+    """Trigram postings for every name/alias word, updated incrementally as characters change"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}  # pk -> {'id', 'name', 'era', 'terms': [(term, words, word_trigrams)]}
+        self.postings = defaultdict(set)  # trigram -> pks
+        self.exact = {}  # normalized name/alias -> pk
+        self.built_at = 0.0
+
+    def build(self, rows):
+        with self.lock:
+            self.entries.clear()
+            self.postings.clear()
+            self.exact.clear()
+            for row in rows:
+                self._add(row)
+            self.built_at = time.monotonic()
+
+    def update(self, row):
+        with self.lock:
+            self._remove(row['id'])
+            self._add(row)
+
+    def remove(self, pk):
+        with self.lock:
+            self._remove(pk)
+
+    def _add(self, row):
+        terms = []
+        for raw in [row['name'], *(alias for alias in (row.get('aliases') or '').split(','))]:
+            term = normalize(raw)
+            if not term:
+                continue
+            words = term.split()
+            word_trigrams = [trigrams(word) for word in words]
+            terms.append((term, words, word_trigrams))
+            self.exact.setdefault(term, row['id'])
+            for grams in word_trigrams:
+                for gram in grams:
+                    self.postings[gram].add(row['id'])
+        self.entries[row['id']] = {'id': row['id'], 'name': row['name'], 'era': row.get('era', ''), 'terms': terms}
+
+    def _remove(self, pk):
+        entry = self.entries.pop(pk, None)
+        if entry is None:
+            return
+        for term, _, word_trigrams in entry['terms']:
+            if self.exact.get(term) == pk:
+                del self.exact[term]
+            for grams in word_trigrams:
+                for gram in grams:
+                    postings = self.postings.get(gram)
+                    if postings is not None:
+                        postings.discard(pk)
+                        if not postings:
+                            del self.postings[gram]
+
+    @staticmethod
+    def score_term(query, query_words, query_trigrams, term, words, word_trigrams):
+        """1.0 for an exact match; otherwise the mean, over query words, of the best
+        per-word match (0.95 for a prefix, else trigram Dice similarity)."""
+        if term == query:
+            return 1.0
+        total = 0.0
+        for query_word, query_grams in zip(query_words, query_trigrams):
+            best = 0.0
+            for word, grams in zip(words, word_trigrams):
+                best = max(best, 0.95 if word.startswith(query_word) else _dice(query_grams, grams))
+            total += best
+        score = total / len(query_words)
+        return score * 0.99 if term.startswith(query) else score * 0.95
+
+    def search(self, query, limit=DEFAULT_LIMIT, min_score=MIN_SCORE):
+        """Best matches for query as dicts with id, name, era, score and the matched term"""
+        query = normalize(query)
+        if not query:
+            return []
+        query_words = query.split()
+        query_trigrams = [trigrams(word) for word in query_words]
+
+        with self.lock:
+            candidates = set()
+            for grams in query_trigrams:
+                for gram in grams:
+                    candidates |= self.postings.get(gram, set())
+
+            results = []
+            for pk in candidates:
+                entry = self.entries[pk]
+                best_score, best_term = 0.0, ''
+                for term, words, word_trigrams in entry['terms']:
+                    score = self.score_term(query, query_words, query_trigrams, term, words, word_trigrams)
+                    if score > best_score:
+                        best_score, best_term = score, term
+                if best_score >= min_score:
+                    results.append({
+                        'id': pk, 'name': entry['name'], 'era': entry['era'],
+                        'score': round(best_score, 3), 'matched': best_term,
+                    })
+
+        results.sort(key=lambda result: (-result['score'], result['name']))
+        return results[:limit]
+
+    def find_exact(self, name):
+        """pk of the character whose name or alias normalizes to name, if any"""
+        with self.lock:
+            return self.exact.get(normalize(name))
+
+
+_index = CharacterIndex()
+
+INDEX_FIELDS = ('id', 'name', 'aliases', 'era')
+
+
+def get_index():
+    """The process-wide index, (re)built from the database when missing or stale"""
+    if not _index.built_at or time.monotonic() - _index.built_at > INDEX_MAX_AGE:
+        _index.build(Character.objects.values(*INDEX_FIELDS))
+    return _index
+
+
+def reset_index():
+    """Forget the index so the next lookup rebuilds it (used by tests)"""
+    _index.built_at = 0.0
+
+
+def search_characters(query, limit=DEFAULT_LIMIT):
+    return get_index().search(query, limit=limit)
+
+
+def closest_character_names(name, limit=3):
+    return [result['name'] for result in search_characters(name, limit=limit)]
+
+
+def index_character_saved(sender, instance, **kwargs):
+    if _index.built_at:
+        _index.update({field: getattr(instance, field) for field in INDEX_FIELDS})
+
+
+def index_character_deleted(sender, instance, **kwargs):
+    if _index.built_at:
+        _index.remove(instance.pk)
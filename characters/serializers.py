@@ -7,7 +7,10 @@ class CharacterSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 class ChatHistorySerializer(serializers.ModelSerializer):
+    # Reads the reply from the blob store when the row has been compacted
+    bot_response = serializers.CharField(source='response_text')
+
     class Meta:
         model = ChatHistory
-        fields = '__all__'
+        exclude = ('response_blob',)
 
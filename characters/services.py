@@ -1,90 +1,367 @@
 """
 Services for fetching and generating character information
 """
-import requests
+import hashlib
+import importlib.util
 import json
 import re
 import os
-from groq import Groq
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from . import metrics, usage
+from .resilience import UpstreamError, check_deadline, get_breaker, timeout_for
+from .years import find_lifespan, format_year_range, parse_year, parse_year_range
+
+# The Groq and requests clients are imported on first use rather than at module
+# load, so worker boot and management commands that never call out stay fast.
+_client_lock = threading.Lock()
+_groq_clients = {}
+_http_session = None
+
+WIKIPEDIA_BATCH_SIZE = 50  # Most titles the MediaWiki query API accepts per request
+TITLE_CACHE_TIMEOUT = 24 * 60 * 60
+
+
+def _title_cache_key(title):
+    # Hashed so titles with spaces or non-ASCII characters are valid memcached keys
+    return "wikipedia:title:" + hashlib.sha1(title.lower().encode('utf-8')).hexdigest()
+
+
+def wikipedia_base_url():
+    return getattr(settings, 'WIKIPEDIA_BASE_URL', 'https://en.wikipedia.org').rstrip('/')
+
+
+def _resolve_title(title, aliases):
+    """Follow normalization/redirect hops from the query API, guarding against loops"""
+    for _ in range(len(aliases) + 1):
+        if title not in aliases:
+            break
+        title = aliases[title]
+    return title
+
+
+def _query_wikipedia(titles, **params):
+    """Run a MediaWiki query for up to WIKIPEDIA_BATCH_SIZE titles, following continuations.
+
+    Returns ``(aliases, pages)``: normalization/redirect hops and pages keyed by
+    their canonical title.
+    """
+    params = dict(params, action='query', titles='|'.join(titles), redirects=1, format='json', formatversion=2)
+    aliases, pages = {}, {}
+    while True:
+        with get_breaker('wikipedia').guard():
+            response = get_http_session().get(
+                f"{wikipedia_base_url()}/w/api.php", params=params, timeout=timeout_for(settings.WIKIPEDIA_TIMEOUT_SECONDS)
+            )
+            data = response.json()
+        query = data.get('query', {})
+        for entry in query.get('normalized', []) + query.get('redirects', []):
+            aliases[entry['from']] = entry['to']
+        for page in query.get('pages', []):
+            merged = pages.setdefault(page['title'], {})
+            merged.update({key: value for key, value in page.items() if value or key not in merged})
+        if 'continue' not in data:
+            return aliases, pages
+        params.update(data['continue'])
+
+
+def services_available():
+    """Whether the optional LLM/HTTP dependencies are installed (without importing them)"""
+    return all(importlib.util.find_spec(name) is not None for name in ('groq', 'requests'))
+
+
+def get_groq_client():
+    """Shared Groq client for the current GROQ_API_KEY, created on first use"""
+    api_key = os.getenv("GROQ_API_KEY")
+    client = _groq_clients.get(api_key)
+    if client is None:
+        with _client_lock:
+            client = _groq_clients.get(api_key)
+            if client is None:
+                from groq import Groq
+                client = _groq_clients[api_key] = Groq(api_key=api_key)
+    return client
+
+
+def get_http_session():
+    """Shared requests session (keeps connections alive), created on first use"""
+    global _http_session
+    if _http_session is None:
+        with _client_lock:
+            if _http_session is None:
+                import requests
+                _http_session = requests.Session()
+    return _http_session
+
+
+CHAT_MODEL = "llama3-70b-8192"
+
+
+class GenerationCancelled(Exception):
+    """Raised when a streamed generation is aborted because nobody is waiting for it"""
+
+    def __init__(self, tokens_generated=0):
+        super().__init__("Generation cancelled")
+        self.tokens_generated = tokens_generated
+
+
+def _length_limit(max_tokens):
+    # Omitted rather than sent as null so the provider applies its own default
+    return {'max_tokens': max_tokens} if max_tokens else {}
+
+
+class ChatService:
+    """Service for generating in-character chat replies"""
+
+    @staticmethod
+    def generate_reply(system_prompt, user_message, cancel_event=None, max_tokens=None):
+        """Ask the LLM for a reply to user_message using the given system prompt.
+
+        When cancel_event is given the reply is streamed so the upstream
+        request can be aborted as soon as the event is set. max_tokens caps
+        the reply length (the model's own limit when None).
+        """
+        if cancel_event is not None:
+            return ''.join(ChatService.stream_reply(system_prompt, user_message, cancel_event, max_tokens))
+
+        usage.check_budget(usage.estimate_tokens(system_prompt, user_message))
+        client = get_groq_client()
+        started = time.perf_counter()
+        with get_breaker('groq').guard():
+            chat_completion = client.chat.completions.create(
+                model=CHAT_MODEL,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_message}
+                ],
+                timeout=timeout_for(settings.LLM_TIMEOUT_SECONDS),
+                **_length_limit(max_tokens)
+            )
+        reply = chat_completion.choices[0].message.content
+        usage.record_call(CHAT_MODEL, started, chat_completion.usage, (system_prompt, user_message),
+                          usage.estimate_tokens(reply))
+        return reply
+
+    @staticmethod
+    def stream_reply(system_prompt, user_message, cancel_event=None, max_tokens=None):
+        """Yield the reply to user_message token by token as the LLM produces it.
+
+        Setting cancel_event closes the upstream stream, which stops generation
+        (and token billing) on the provider side, and raises GenerationCancelled.
+        Usage is recorded however the stream ends, since the tokens were billed.
+        """
+        usage.check_budget(usage.estimate_tokens(system_prompt, user_message))
+        client = get_groq_client()
+        with get_breaker('groq').guard(neutral=(GenerationCancelled,)):
+            started = time.perf_counter()
+            stream = client.chat.completions.create(
+                model=CHAT_MODEL,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_message}
+                ],
+                stream=True,
+                timeout=timeout_for(settings.LLM_TIMEOUT_SECONDS),
+                **_length_limit(max_tokens)
+            )
+            tokens = 0
+            reported = None
+            try:
+                for chunk in stream:
+                    if cancel_event is not None and cancel_event.is_set():
+                        raise GenerationCancelled(tokens)
+                    check_deadline()
+                    # Groq reports usage on the final chunk
+                    reported = getattr(getattr(chunk, 'x_groq', None), 'usage', None) or reported
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        tokens += 1
+                        yield chunk.choices[0].delta.content
+            finally:
+                stream.close()
+                usage.record_call(CHAT_MODEL, started, reported, (system_prompt, user_message), tokens)
+        metrics.increment('chat.generations_completed')
+        metrics.increment('chat.completion_chunks', tokens)
+
+
+def record_cancelled_generation(tokens_generated):
+    """Count a cancelled generation and estimate the completion tokens it saved"""
+    completed = metrics.get('chat.generations_completed')
+    average = metrics.get('chat.completion_chunks') / completed if completed else 0
+    metrics.increment('chat.generations_cancelled')
+    metrics.increment('chat.tokens_saved_estimate', max(0, round(average - tokens_generated)))
 
 
 class CharacterInfoService:
     """Service for fetching and generating character information"""
     
     @staticmethod
-    def fetch_wikipedia_info(character_name):
-        """Fetch character information from Wikipedia API"""
+    def fetch_wikipedia_summary(character_name):
+        """Fetch the raw page summary from the Wikipedia REST API, or None"""
         try:
             # Search for the character on Wikipedia
-            search_url = f"https://en.wikipedia.org/api/rest_v1/page/summary/{character_name.replace(' ', '_')}"
-            
-            response = requests.get(search_url, timeout=10)
+            search_url = f"{wikipedia_base_url()}/api/rest_v1/page/summary/{character_name.replace(' ', '_')}"
+
+            with get_breaker('wikipedia').guard():
+                response = get_http_session().get(search_url, timeout=timeout_for(settings.WIKIPEDIA_TIMEOUT_SECONDS))
+                if response.status_code >= 500:
+                    raise UpstreamError(f"Wikipedia returned HTTP {response.status_code}")
             if response.status_code == 200:
-                data = response.json()
-                
-                info = {}
-                
-                # Extract basic information
-                if 'extract' in data:
-                    info['description'] = data['extract'][:1500]  # Limit to 1500 chars
-                
-                # Try to extract birth/death dates from the extract
-                extract = data.get('extract', '')
-                if extract:
-                    # Simple regex extraction for dates
-                    date_pattern = r'(\d{1,2}\s+\w+\s+\d{4}|\d{4})'
-                    dates = re.findall(date_pattern, extract)
-                    if len(dates) >= 2:
-                        info['birth_date'] = dates[0]
-                        info['death_date'] = dates[1]
-                        info['era'] = f"{dates[0]}-{dates[1]}"
-                    elif len(dates) == 1:
-                        info['birth_date'] = dates[0]
-                        info['era'] = dates[0]
-                
-                # Extract additional info from the extract
-                if extract:
-                    # Try to identify nationality
-                    nationality_patterns = [
-                        r'(\w+)\s+(?:physicist|scientist|leader|politician|artist|writer|philosopher)',
-                        r'born\s+in\s+(\w+)',
-                        r'(\w+)\s+independence',
-                        r'(\w+)\s+revolutionary'
-                    ]
-                    
-                    for pattern in nationality_patterns:
-                        match = re.search(pattern, extract, re.IGNORECASE)
-                        if match:
-                            info['nationality'] = match.group(1)
-                            break
-                    
-                    # Try to identify occupation
-                    occupation_patterns = [
-                        r'was\s+an?\s+([^.]+?)(?:\s+who|\s+and|\.|,)',
-                        r'is\s+an?\s+([^.]+?)(?:\s+who|\s+and|\.|,)',
-                    ]
-                    
-                    for pattern in occupation_patterns:
-                        match = re.search(pattern, extract, re.IGNORECASE)
-                        if match:
-                            occupation = match.group(1).strip()
-                            if len(occupation) < 100:  # Reasonable length
-                                info['occupation'] = occupation
-                            break
-                
-                return info
-                
+                return response.json()
+
         except Exception as e:
             print(f"Error fetching Wikipedia info: {e}")
-            return {}
-        
-        return {}
+
+        return None
+
+    @staticmethod
+    def extract_wikipedia_info(data):
+        """Extract character fields from a Wikipedia page summary"""
+        info = {}
+
+        # Disambiguation pages list several people; nothing reliable to extract
+        if data.get('disambiguation') or data.get('type') == 'disambiguation':
+            return info
+
+        # Extract basic information
+        if 'extract' in data:
+            info['description'] = data['extract'][:1500]  # Limit to 1500 chars
+
+        # Birth/death dates, normally the "(2 October 1869 – 30 January 1948)" after the name
+        extract = data.get('extract', '')
+        if extract:
+            lifespan = find_lifespan(extract)
+            if lifespan:
+                birth_year, death_year = parse_year_range(' – '.join(lifespan))
+                if birth_year is not None and death_year is not None:
+                    birth_date, death_date = lifespan
+                    # "(384–322 BC)": the era suffix applies to the birth year as well
+                    if birth_year < 0 and parse_year(birth_date) != birth_year:
+                        birth_date = f"{birth_date} BC"
+                    info['birth_date'] = birth_date
+                    info['death_date'] = death_date
+                    info['era'] = format_year_range(birth_year, death_year)
+            else:
+                # No lifespan in parentheses; fall back to the first four-digit year mentioned
+                match = re.search(r'\b\d{4}\b', extract)
+                if match:
+                    info['birth_date'] = match.group(0)
+                    info['era'] = match.group(0)
+
+        # Extract additional info from the extract
+        if extract:
+            # Try to identify nationality
+            nationality_patterns = [
+                r'(\w+)\s+(?:physicist|scientist|leader|politician|artist|writer|philosopher)',
+                r'born\s+in\s+(\w+)',
+                r'(\w+)\s+independence',
+                r'(\w+)\s+revolutionary'
+            ]
+
+            for pattern in nationality_patterns:
+                match = re.search(pattern, extract, re.IGNORECASE)
+                if match:
+                    info['nationality'] = match.group(1)
+                    break
+
+            # Try to identify occupation
+            occupation_patterns = [
+                r'was\s+an?\s+([^.]+?)(?:\s+who|\s+and|\.|,)',
+                r'is\s+an?\s+([^.]+?)(?:\s+who|\s+and|\.|,)',
+            ]
+
+            for pattern in occupation_patterns:
+                match = re.search(pattern, extract, re.IGNORECASE)
+                if match:
+                    occupation = match.group(1).strip()
+                    if len(occupation) < 100:  # Reasonable length
+                        info['occupation'] = occupation
+                    break
+
+        return info
+
+    @staticmethod
+    def fetch_wikipedia_revisions(titles):
+        """Latest revision id for each title, WIKIPEDIA_BATCH_SIZE titles per query API request.
+
+        Titles are followed through normalization and redirects; missing
+        pages are left out of the result.
+        """
+        revisions = {}
+        for i in range(0, len(titles), WIKIPEDIA_BATCH_SIZE):
+            chunk = titles[i:i + WIKIPEDIA_BATCH_SIZE]
+            try:
+                aliases, pages = _query_wikipedia(chunk, prop='info')
+            except Exception as e:
+                print(f"Error fetching Wikipedia revisions: {e}")
+                continue
+
+            for title in chunk:
+                page = pages.get(_resolve_title(title, aliases))
+                if page and not page.get('missing') and 'lastrevid' in page:
+                    revisions[title] = str(page['lastrevid'])
+        return revisions
+
+    @staticmethod
+    def fetch_wikipedia_pages(titles):
+        """Fetch intro extracts for many titles, WIKIPEDIA_BATCH_SIZE per query API request.
+
+        Returns a dict mapping each requested title to a summary-shaped dict
+        (``title``, ``extract``, ``revision``, ``disambiguation``) that
+        extract_wikipedia_info accepts. Missing pages are left out. The
+        title -> canonical page mapping is cached, so aliases of an already
+        resolved page are requested under their canonical title.
+        """
+        canonical = {}
+        for title in titles:
+            canonical[title] = cache.get(_title_cache_key(title)) or title
+
+        pages_by_title = {}
+        unique_titles = list(dict.fromkeys(canonical.values()))
+        for i in range(0, len(unique_titles), WIKIPEDIA_BATCH_SIZE):
+            chunk = unique_titles[i:i + WIKIPEDIA_BATCH_SIZE]
+            try:
+                aliases, pages = _query_wikipedia(
+                    chunk, prop='extracts|pageprops|info', exintro=1, explaintext=1, exlimit='max',
+                )
+            except Exception as e:
+                print(f"Error fetching Wikipedia pages: {e}")
+                continue
+
+            for title in chunk:
+                page = pages.get(_resolve_title(title, aliases))
+                if page and not page.get('missing'):
+                    pages_by_title[title] = {
+                        'title': page['title'],
+                        'extract': page.get('extract', ''),
+                        'revision': str(page.get('lastrevid', '')),
+                        'disambiguation': 'disambiguation' in page.get('pageprops', {}),
+                    }
+
+        results = {}
+        for title, canonical_title in canonical.items():
+            page = pages_by_title.get(canonical_title)
+            if page is None:
+                continue
+            cache.set(_title_cache_key(title), page['title'], TITLE_CACHE_TIMEOUT)
+            results[title] = page
+        return results
+
+    @classmethod
+    def fetch_wikipedia_info(cls, character_name):
+        """Fetch character information from Wikipedia API"""
+        data = cls.fetch_wikipedia_summary(character_name)
+        return cls.extract_wikipedia_info(data) if data else {}
 
     @staticmethod
     def generate_persona_with_ai(character_info):
         """Generate an authentic persona using AI based on character information"""
         try:
-            client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+            client = get_groq_client()
             
             # Create a comprehensive prompt for persona generation
             prompt = f"""
@@ -112,17 +389,22 @@ class CharacterInfoService:
             Include specific historical details, speaking patterns, and personality traits that would make the character feel authentic.
             """
             
-            chat_completion = client.chat.completions.create(
-                model="llama3-70b-8192",
-                messages=[
-                    {"role": "system", "content": "You are an expert historian and character analyst. Create authentic personas for historical figures based on historical facts and documented personality traits."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                max_tokens=800
-            )
+            started = time.perf_counter()
+            with get_breaker('groq').guard():
+                chat_completion = client.chat.completions.create(
+                    model="llama3-70b-8192",
+                    messages=[
+                        {"role": "system", "content": "You are an expert historian and character analyst. Create authentic personas for historical figures based on historical facts and documented personality traits."},
+                        {"role": "user", "content": prompt}
+                    ],
+                    temperature=0.7,
+                    max_tokens=800,
+                    timeout=timeout_for(settings.LLM_TIMEOUT_SECONDS)
+                )
             
             generated_persona = chat_completion.choices[0].message.content
+            with usage.attribute(character=character_info.get('name'), purpose='persona'):
+                usage.record_call("llama3-70b-8192", started, chat_completion.usage, (prompt,), usage.estimate_tokens(generated_persona))
             return generated_persona
             
         except Exception as e:
@@ -133,7 +415,7 @@ class CharacterInfoService:
     def generate_additional_details(character_info):
         """Generate additional historical details using AI"""
         try:
-            client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+            client = get_groq_client()
             
             prompt = f"""
             Based on the historical figure {character_info.get('name', 'Unknown')}, provide the following information in a structured format:
@@ -156,17 +438,22 @@ class CharacterInfoService:
             Be historically accurate and only include verified information.
             """
             
-            chat_completion = client.chat.completions.create(
-                model="llama3-70b-8192",
-                messages=[
-                    {"role": "system", "content": "You are a professional historian. Provide accurate historical information."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3,
-                max_tokens=600
-            )
+            started = time.perf_counter()
+            with get_breaker('groq').guard():
+                chat_completion = client.chat.completions.create(
+                    model="llama3-70b-8192",
+                    messages=[
+                        {"role": "system", "content": "You are a professional historian. Provide accurate historical information."},
+                        {"role": "user", "content": prompt}
+                    ],
+                    temperature=0.3,
+                    max_tokens=600,
+                    timeout=timeout_for(settings.LLM_TIMEOUT_SECONDS)
+                )
             
             response = chat_completion.choices[0].message.content
+            with usage.attribute(character=character_info.get('name'), purpose='details'):
+                usage.record_call("llama3-70b-8192", started, chat_completion.usage, (prompt,), usage.estimate_tokens(response))
             
             # Parse the response
             details = {}
@@ -188,22 +475,61 @@ class CharacterInfoService:
             print(f"Error generating additional details: {e}")
             return {}
 
+    @staticmethod
+    def source_hash(summary):
+        """Hash of the Wikipedia text (title and intro extract) persona and details are generated from.
+
+        The revision id is left out, so edits outside the intro do not force a
+        regeneration, and so are fields the LLM writes back, like
+        major_achievements, so an enrichment does not change the hash of its
+        own inputs. Whitespace is normalized.
+        """
+        source = {
+            'title': ' '.join(str(summary.get('title') or '').replace('_', ' ').split()),
+            'extract': ' '.join(str(summary.get('extract') or '').split()),
+        }
+        encoded = json.dumps(source, sort_keys=True, ensure_ascii=False).encode('utf-8')
+        return hashlib.sha256(encoded).hexdigest()
+
+    @classmethod
+    def auto_populate_characters(cls, characters, force=True):
+        """Populate several characters, fetching their Wikipedia pages in batches.
+
+        Returns the characters that were successfully populated; saving them
+        is left to the caller.
+        """
+        pages = cls.fetch_wikipedia_pages([character.name for character in characters])
+        return [
+            character for character in characters
+            if cls.auto_populate_character(character, force=force, summary=pages.get(character.name, {}))
+        ]
+
     @classmethod
-    def auto_populate_character(cls, character):
-        """Automatically populate character information from various sources"""
-        from .models import Character
-        
+    def auto_populate_character(cls, character, force=True, summary=None):
+        """Automatically populate character information from various sources
+
+        With force=False the two LLM calls are skipped when the Wikipedia
+        intro is the same as last time. A page prefetched with
+        fetch_wikipedia_pages may be passed in (an empty dict means no page
+        was found); otherwise it is fetched the same way, so every path hashes
+        the same intro extract.
+        """
         success = False
-        
+
         # Fetch basic info from Wikipedia
-        wiki_info = cls.fetch_wikipedia_info(character.name)
+        if summary is None:
+            summary = cls.fetch_wikipedia_pages([character.name]).get(character.name, {})
+        wiki_info = cls.extract_wikipedia_info(summary) if summary else {}
+        if summary:
+            character.source_revision = str(summary.get('revision', ''))
         if wiki_info:
             # Update character with Wikipedia info
             for key, value in wiki_info.items():
                 if hasattr(character, key) and value:
                     setattr(character, key, value)
             success = True
-        
+        character.source_checked_at = timezone.now()
+
         # Generate additional details with AI
         character_info = {
             'name': character.name,
@@ -215,14 +541,20 @@ class CharacterInfoService:
             'description': character.description,
             'major_achievements': character.major_achievements,
         }
-        
+
+        source_hash = cls.source_hash(summary or {})
+        if not force and character.persona and source_hash == character.source_hash:
+            return success  # Inputs unchanged since the last generation
+
         # Generate AI persona
         persona = cls.generate_persona_with_ai(character_info)
         if persona:
             character.persona = persona
             character.auto_generated = True
+            character.source_hash = source_hash
+            character.enriched_at = timezone.now()
             success = True
-        
+
         # Generate additional details
         additional_details = cls.generate_additional_details(character_info)
         if additional_details:
@@ -230,5 +562,5 @@ class CharacterInfoService:
                 if hasattr(character, key) and value:
                     setattr(character, key, value)
             success = True
-        
+
         return success
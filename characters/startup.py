@@ -0,0 +1,73 @@
+"""
+Cold-start measurement for worker boot
+"""
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+
+# Modules that must not be imported while the project boots; they are loaded
+# lazily by the service layer on the first LLM call, or by the related-characters
+# scorer on first use. (requests is not listed: rest_framework.compat imports it
+# unconditionally.)
+LAZY_MODULES = ('groq', 'httpx', 'numpy')
+
+# Run in a fresh interpreter: set up Django, load the URLconf (which imports
+# every view) and optionally serve one request, reporting timings as JSON on stdout.
+_PROBE = r'''
+import json, sys, time
+start = time.perf_counter()
+import django
+django.setup()
+import {urlconf}
+ready = time.perf_counter()
+status = None
+if {path!r} is not None:
+    from django.test import Client
+    status = Client(HTTP_HOST='localhost', raise_request_exception=False).get({path!r}).status_code
+done = time.perf_counter()
+print(json.dumps({{
+    'setup_ms': (ready - start) * 1000,
+    'first_request_ms': (done - start) * 1000,
+    'status': status,
+    'eager_modules': [m for m in {lazy!r} if m in sys.modules],
+}}))
+'''
+
+
+def parse_importtime(stderr):
+    """Parse ``-X importtime`` output into (module, self_us, cumulative_us) tuples"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        try:
+            self_us, cumulative_us, module = line[len('import time:'):].split('|')
+            rows.append((module.rstrip(), int(self_us), int(cumulative_us)))
+        except ValueError:
+            continue
+    return rows
+
+
+def measure_startup(path='/api/characters/'):
+    """Boot the project in a subprocess with -X importtime and time the first request.
+
+    The request goes to the configured database; with path None the probe
+    only imports the project, which needs no database at all.
+    Returns a dict with ``setup_ms`` (Django setup plus URLconf import),
+    ``first_request_ms`` (process start to first response, or to the end of
+    the imports without a request), ``status`` (None without a request), ``eager_modules``
+    (LAZY_MODULES that were imported during boot) and ``imports``, the parsed
+    import-time rows.
+    """
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'backend.settings'))
+    probe = _PROBE.format(urlconf=settings.ROOT_URLCONF, path=path, lazy=LAZY_MODULES)
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', probe],
+        cwd=str(settings.BASE_DIR), env=env, capture_output=True, text=True, check=True,
+    )
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    report['imports'] = parse_importtime(result.stderr)
+    return report
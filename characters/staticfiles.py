@@ -0,0 +1,98 @@
+"""
+Fingerprinted, precompressed static files served with long-lived cache headers
+"""
+import gzip
+import mimetypes
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.contrib.staticfiles.views import serve as serve_source
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+from .compression import brotli
+
+PRECOMPRESS_EXTENSIONS = ('.css', '.js', '.svg', '.json', '.txt', '.html')
+MIN_PRECOMPRESS_BYTES = 256
+# ManifestStaticFilesStorage inserts the first 12 hex digits of the content hash
+FINGERPRINT_RE = re.compile(r'\.[0-9a-f]{12}\.[^/.]+$')
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+DEFAULT_CACHE_CONTROL = 'public, max-age=3600'
+
+
+class PrecompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Manifest storage that also writes .gz (and .br, if brotli is installed) next to text assets.
+
+    Names missing from the manifest fall back to the unhashed URL, so pages
+    still render when collectstatic has not been run (e.g. in tests).
+    """
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if not dry_run and not isinstance(processed, Exception) and hashed_name:
+                for path in {name, hashed_name}:
+                    self._precompress(path)
+            yield name, hashed_name, processed
+
+    def _precompress(self, name):
+        if not name.endswith(PRECOMPRESS_EXTENSIONS):
+            return
+        path = Path(self.path(name))
+        data = path.read_bytes()
+        if len(data) < MIN_PRECOMPRESS_BYTES:
+            return
+        path.with_name(path.name + '.gz').write_bytes(gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli is not None:
+            path.with_name(path.name + '.br').write_bytes(brotli.compress(data, quality=11))
+
+
+def serve_static(request, path):
+    """Serve collected static files, preferring precompressed variants.
+
+    Fingerprinted names never change content, so they are cacheable for a
+    year; anything else gets a short max-age. Under DEBUG the source files
+    are served as usual.
+    """
+    if settings.DEBUG:
+        return serve_source(request, path)
+    if not settings.STATIC_ROOT:
+        raise Http404("Static files have not been collected")
+    try:
+        full_path = Path(safe_join(settings.STATIC_ROOT, path))
+    except SuspiciousFileOperation:
+        raise Http404("Static file not found")
+    if not full_path.is_file():
+        raise Http404("Static file not found")
+
+    stat = full_path.stat()
+    if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'), stat.st_mtime):
+        return HttpResponseNotModified()
+
+    accept_encoding = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    serve_path, encoding = full_path, None
+    for candidate, suffix in (('br', '.br'), ('gzip', '.gz')):
+        variant = full_path.with_name(full_path.name + suffix)
+        if re.search(rf'\b{candidate}\b', accept_encoding) and variant.is_file():
+            serve_path, encoding = variant, candidate
+            break
+
+    content_type, _ = mimetypes.guess_type(full_path.name)
+    response = FileResponse(open(serve_path, 'rb'), content_type=content_type or 'application/octet-stream')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Last-Modified'] = http_date(stat.st_mtime)
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if FINGERPRINT_RE.search(path) else DEFAULT_CACHE_CONTROL
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
@@ -0,0 +1,25 @@
+"""
+Inline small static assets into pages
+"""
+from functools import lru_cache
+
+from django import template
+from django.contrib.staticfiles import finders
+from django.utils.safestring import mark_safe
+
+register = template.Library()
+
+
+@lru_cache(maxsize=None)
+def _read_static(path):
+    location = finders.find(path)
+    if location is None:
+        raise template.TemplateSyntaxError(f"Static file '{path}' not found")
+    with open(location, encoding='utf-8') as handle:
+        return handle.read()
+
+
+@register.simple_tag
+def inline_static(path):
+    """Contents of a static source file, read once per process"""
+    return mark_safe(_read_static(path))
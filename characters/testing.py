@@ -0,0 +1,174 @@
+"""
+Local stand-ins for external services, used by the test suite and benchmarks
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from urllib.parse import parse_qs, unquote, urlparse
+
+EXTRACTS_PER_REQUEST = 20  # Same limit the real query API applies to intro extracts
+
+
+class WikipediaFixtureServer:
+    """Minimal Wikipedia serving the REST summary endpoint and the query API.
+
+    ``pages`` maps canonical titles to dicts with ``extract``, ``revision`` and
+    optionally ``disambiguation``; ``redirects`` maps alias titles to canonical
+    ones. Use as a context manager and point WIKIPEDIA_BASE_URL at ``url``::
+
+        with WikipediaFixtureServer(pages) as wiki, override_settings(WIKIPEDIA_BASE_URL=wiki.url):
+            ...
+    """
+
+    def __init__(self, pages, redirects=None):
+        self.pages = pages
+        self.redirects = redirects or {}
+        self.requests = []
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler_class())
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+    @staticmethod
+    def normalize(title):
+        title = title.replace('_', ' ').strip()
+        return title[:1].upper() + title[1:]
+
+    def summary(self, title):
+        title = self.redirects.get(self.normalize(title), self.normalize(title))
+        page = self.pages.get(title)
+        if page is None:
+            return 404, {'type': 'https://mediawiki.org/wiki/HyperSwitch/errors/not_found'}
+        return 200, {
+            'type': 'disambiguation' if page.get('disambiguation') else 'standard',
+            'title': title,
+            'extract': page['extract'],
+            'revision': str(page['revision']),
+        }
+
+    def query(self, params):
+        titles = params['titles'][0].split('|')
+        props = params.get('prop', [''])[0].split('|')
+        offset = int(params.get('excontinue', ['0'])[0])
+        normalized, redirects, pages = [], [], []
+
+        for title in titles:
+            canonical = self.normalize(title)
+            if canonical != title:
+                normalized.append({'from': title, 'to': canonical})
+            if canonical in self.redirects:
+                redirects.append({'from': canonical, 'to': self.redirects[canonical]})
+                canonical = self.redirects[canonical]
+            page = self.pages.get(canonical)
+            if page is None:
+                pages.append({'title': canonical, 'missing': True})
+                continue
+            entry = {'title': canonical}
+            if 'info' in props:
+                entry['lastrevid'] = page['revision']
+            if 'pageprops' in props and page.get('disambiguation'):
+                entry['pageprops'] = {'disambiguation': ''}
+            pages.append(entry)
+
+        data = {'batchcomplete': True, 'query': {'normalized': normalized, 'redirects': redirects, 'pages': pages}}
+        if 'extracts' in props:
+            found = [entry for entry in pages if not entry.get('missing')]
+            for entry in found[offset:offset + EXTRACTS_PER_REQUEST]:
+                entry['extract'] = self.pages[entry['title']]['extract']
+            if len(found) > offset + EXTRACTS_PER_REQUEST:
+                data['continue'] = {'excontinue': offset + EXTRACTS_PER_REQUEST, 'continue': '||'}
+        return 200, data
+
+    def _handler_class(self):
+        fixture = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                fixture.requests.append(self.path)
+                if url.path.startswith('/api/rest_v1/page/summary/'):
+                    status, body = fixture.summary(unquote(url.path.rsplit('/', 1)[1]))
+                elif url.path == '/w/api.php':
+                    status, body = fixture.query(parse_qs(url.query))
+                else:
+                    status, body = 404, {}
+                payload = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                if status == 200 and 'revision' in body:
+                    self.send_header('ETag', f'W/"{body["revision"]}"')
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+class FakeGroqClient:
+    """Stand-in for the Groq client that answers every completion with canned text.
+
+    ``reply`` is a string or a callable taking the request's messages. Each
+    word of the reply is one token (so ``max_tokens`` truncates it) and one
+    chunk when streaming; usage is reported like Groq does. ``latency`` seconds
+    are slept before the response (or the first chunk) to mimic the upstream::
+
+        with mock.patch('characters.services.get_groq_client', return_value=FakeGroqClient('Hello')):
+            ...
+    """
+
+    def __init__(self, reply='I am here to help.', latency=0.0):
+        self.reply = reply
+        self.latency = latency
+        self.calls = 0
+        self.lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, messages, stream=False, max_tokens=None, **kwargs):
+        with self.lock:
+            self.calls += 1
+        text = self.reply(messages) if callable(self.reply) else self.reply
+        words = text.split(' ')[:max_tokens] if max_tokens else text.split(' ')
+        usage = SimpleNamespace(
+            prompt_tokens=sum(len(message['content']) for message in messages) // 4,
+            completion_tokens=len(words),
+        )
+        if self.latency:
+            time.sleep(self.latency)
+        if not stream:
+            message = SimpleNamespace(content=' '.join(words))
+            return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+        return FakeCompletionStream([f"{word} " for word in words[:-1]] + words[-1:], usage)
+
+
+class FakeCompletionStream:
+    """Streamed completion: one chunk per piece, then a final chunk carrying usage in ``x_groq``"""
+
+    def __init__(self, pieces, usage):
+        self.chunks = [
+            SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))], x_groq=None)
+            for piece in pieces
+        ]
+        self.chunks.append(SimpleNamespace(choices=[], x_groq=SimpleNamespace(usage=usage)))
+        self.closed = False
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+    def close(self):
+        self.closed = True
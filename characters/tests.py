@@ -1,3 +1,1137 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import importlib.util
+import json
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .analytics import get_top_questions, get_usage_series, normalize_question, question_hash, update_rollups
+from .archive import archive_chats, iter_archived_chats
+from .batch import build_pairs, pair_key, run_batch
+from .benchmarks import BenchmarkEnv, compare_results, run_benchmarks
+from .blobs import compact_responses, delete_orphans, store_text
+from .export import filter_chat_history, iter_export
+from . import metrics
+from .length_policy import classify, evaluate_classifier, estimate_savings, load_eval_set
+from .models import Character, ChatHistory, LLMUsage, ResponseBlob, WarmAnswer
+from .profiling import list_profiles, load_profile
+from .related import VectorSet, build_vectors, rebuild_neighbors, get_related
+from .resilience import CircuitBreaker, CircuitOpen, DeadlineExceeded, deadline, get_breaker, reset_breakers, timeout_for
+from .search import reset_index, search_characters
+from .prompts import compile_system_prefix
+from .services import CharacterInfoService, ChatService, GenerationCancelled, record_cancelled_generation
+from .startup import measure_startup
+from . import usage
+from .testing import FakeGroqClient, WikipediaFixtureServer
+from .years import lifespan_years, parse_year_range
+from .warm_cache import get_suggested_questions, plan_warmup, warm_answers
+from .websocket import WEBSOCKET_PATH, chat_websocket
+
+
+def tearDownModule():
+    usage.reset()  # Buffered rows would otherwise be flushed at exit, after the test database is gone
+
+
+class SystemPrefixTests(TestCase):
+    def test_prefix_is_compiled_on_save(self):
+        character = Character.objects.create(
+            name='Ada Lovelace',
+            persona='You are Ada Lovelace.\r\n',
+            famous_quotes='"That brain of mine is something more than merely mortal."',
+        )
+        self.assertTrue(character.system_prefix.startswith('You are Ada Lovelace.\n\n## Famous quotes'))
+        self.assertTrue(character.prompt_version.startswith('v'))
+
+    def test_version_is_stable_and_tracks_content(self):
+        character = Character(name='Ada Lovelace', persona='You are Ada Lovelace.')
+        _, first = compile_system_prefix(character)
+        _, again = compile_system_prefix(character)
+        character.persona = 'You are Ada Lovelace, Countess of Lovelace.'
+        _, changed = compile_system_prefix(character)
+        self.assertEqual(first, again)
+        self.assertNotEqual(first, changed)
+
+    def test_update_fields_includes_prefix(self):
+        character = Character.objects.create(name='Ada Lovelace', persona='You are Ada.')
+        character.persona = 'You are Ada Lovelace.'
+        character.save(update_fields=['persona'])
+        character.refresh_from_db()
+        self.assertEqual(character.system_prefix, 'You are Ada Lovelace.')
+
+
+class BatchChatTests(TestCase):
+    def test_run_batch_skips_completed_and_persists(self):
+        Character.objects.create(name='Ada Lovelace', persona='You are Ada.')
+        pairs = build_pairs(characters=['Ada Lovelace', 'Nobody'], questions=['Hi?', 'Why?'])
+        done = {pair_key('Ada Lovelace', 'Hi?')}
+        with mock.patch('characters.batch.ChatService.generate_reply', return_value='Hello'):
+            records = list(run_batch(pairs, concurrency=2, persist=True, completed_keys=done))
+
+        self.assertEqual(len(records), 3)
+        self.assertEqual(sum('reply' in r for r in records), 1)
+        self.assertEqual(ChatHistory.objects.count(), 1)
+
+    def test_endpoint_rejects_bad_pairs_and_parses_persist_strictly(self):
+        from django.contrib.auth.models import User
+
+        Character.objects.create(name='Ada Lovelace', persona='You are Ada.')
+        self.client.force_login(User.objects.create_superuser('admin', password='pw'))
+
+        def post(**data):
+            return self.client.post('/api/chat/batch/', data, content_type='application/json')
+
+        response = post(pairs=[{'character': 'Ada Lovelace', 'question': 'Hi?'}, {'character': 'Ada Lovelace'}])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Pair 1', response.json()['error'])
+        self.assertEqual(post(pairs=[{'character': 'Ada Lovelace', 'question': 'Hi?'}], persist='maybe').status_code, 400)
+
+        with mock.patch('characters.batch.ChatService.generate_reply', return_value='Hello'):
+            response = post(pairs=[{'character': 'Ada Lovelace', 'question': 'Hi?'}], persist='false')
+            self.assertEqual(response.status_code, 200)
+            b''.join(response.streaming_content)
+        self.assertEqual(ChatHistory.objects.count(), 0)
+
+    def test_endpoint_rejects_malformed_matrix_and_completed_keys(self):
+        from django.contrib.auth.models import User
+
+        self.client.force_login(User.objects.create_superuser('admin', password='pw'))
+
+        def post(**data):
+            return self.client.post('/api/chat/batch/', data, content_type='application/json')
+
+        for data in (
+            {'characters': 'Ada Lovelace', 'questions': ['Hi?']},
+            {'characters': ['Ada Lovelace'], 'questions': 'Hi?'},
+            {'characters': [1], 'questions': ['Hi?']},
+            {'characters': ['Ada Lovelace'], 'questions': ['  ']},
+            {'pairs': {'character': 'Ada Lovelace', 'question': 'Hi?'}},
+            {'characters': ['Ada Lovelace'], 'questions': ['Hi?'], 'completed_keys': [{'key': 'x'}]},
+            {'characters': ['Ada Lovelace'], 'questions': ['Hi?'], 'completed_keys': 'abc'},
+        ):
+            with self.subTest(data=data):
+                self.assertEqual(post(**data).status_code, 400)
+
+
+class ArchiveTests(TestCase):
+    def test_old_chats_are_archived_and_readable(self):
+        old = ChatHistory.objects.create(character_name='Ada Lovelace', user_question='Q1', bot_response='A1')
+        ChatHistory.objects.filter(pk=old.pk).update(timestamp=timezone.now() - timedelta(days=100))
+        ChatHistory.objects.create(character_name='Ada Lovelace', user_question='Q2', bot_response='A2')
+
+        with tempfile.TemporaryDirectory() as archive_dir:
+            self.assertEqual(archive_chats(90, archive_dir=archive_dir, batch_size=1), 1)
+            archived = list(iter_archived_chats(character='ada', archive_dir=archive_dir))
+
+        self.assertEqual([r['user_question'] for r in archived], ['Q1'])
+        self.assertEqual(list(ChatHistory.objects.values_list('user_question', flat=True)), ['Q2'])
+
+    def test_archived_chats_stay_in_analytics(self):
+        from django.contrib.auth.models import User
+
+        for question in ('Q1', 'Q2'):
+            chat = ChatHistory.objects.create(character_name='Ada Lovelace', user_question=question, bot_response='A')
+            ChatHistory.objects.filter(pk=chat.pk).update(timestamp=timezone.now() - timedelta(days=100))
+
+        with tempfile.TemporaryDirectory() as archive_dir:
+            self.assertEqual(archive_chats(90, archive_dir=archive_dir), 2)
+
+        self.client.force_login(User.objects.create_superuser('admin', password='pw'))
+        series = self.client.get('/api/analytics/', {'granularity': 'day'}).json()['series']
+        self.assertEqual(sum(row['messages'] for row in series), 2)
+
+
+class ExportTests(TestCase):
+    def test_csv_and_gzip_jsonl_export(self):
+        ChatHistory.objects.create(character_name='Ada Lovelace', user_question='Q, "1"', bot_response='A1')
+        ChatHistory.objects.create(character_name='Albert Einstein', user_question='Q2', bot_response='A2')
+
+        csv_text = b''.join(iter_export(filter_chat_history(character='ada'), 'csv')).decode()
+        self.assertIn('"Q, ""1"""', csv_text)
+        self.assertNotIn('Einstein', csv_text)
+
+        data = gzip.decompress(b''.join(iter_export(filter_chat_history(), 'jsonl', compress=True)))
+        self.assertEqual([json.loads(line)['bot_response'] for line in data.splitlines()], ['A1', 'A2'])
+
+    def test_malformed_dates_are_rejected(self):
+        from django.contrib.auth.models import User
+        from django.core.management import CommandError, call_command
+
+        self.client.force_login(User.objects.create_superuser('admin', password='pw'))
+        response = self.client.get('/api/chat-history/export/', {'from': 'garbage'})
+        self.assertEqual((response.status_code, response.json()['error']), (400, "'from' must be a date (YYYY-MM-DD)."))
+        self.assertEqual(self.client.get('/api/chat-history/export/', {'to': '2025-02-30'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/chat-history/export/', {'from': '2025-01-01'}).status_code, 200)
+        with self.assertRaisesMessage(CommandError, "'to' must be a date"):
+            call_command('export_chat_history', until='garbage')
+
+
+class AsgiStreamingTests(TestCase):
+    """Streaming endpoints driven through backend.asgi, which buffers sync iterators"""
+
+    def setUp(self):
+        from django.contrib.auth.models import User
+
+        self.client.force_login(User.objects.create_superuser('admin', password='pw'))
+        self.cookie = f"sessionid={self.client.cookies['sessionid'].value}"
+
+    async def start(self, method, path, body=b'', logged_in=True):
+        from backend.asgi import application
+
+        incoming, outgoing = asyncio.Queue(), asyncio.Queue()
+        headers = [(b'host', b'testserver'), (b'content-type', b'application/json'),
+                   (b'content-length', str(len(body)).encode())]
+        if logged_in:  # A session cookie would make DRF enforce CSRF on POSTs
+            headers.append((b'cookie', self.cookie.encode()))
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': method,
+            'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'',
+            'headers': headers, 'client': ('127.0.0.1', 40000), 'server': ('testserver', 80),
+        }
+        await incoming.put({'type': 'http.request', 'body': body})
+        return asyncio.create_task(application(scope, incoming.get, outgoing.put)), outgoing
+
+    async def test_export_chunks_arrive_as_they_are_produced(self):
+        produced = []
+        first_received = threading.Event()
+
+        def slow_export(*args, **kwargs):
+            produced.append('first')
+            yield 'id,character_name\n'
+            first_received.wait(5)
+            produced.append('second')
+            yield '1,Ada Lovelace\n'
+
+        with mock.patch('characters.views.iter_export', slow_export):
+            task, outgoing = await self.start('GET', '/api/chat-history/export/')
+            self.assertEqual((await outgoing.get())['status'], 200)
+            self.assertEqual((await outgoing.get())['body'], b'id,character_name\n')
+            self.assertEqual(produced, ['first'])
+            first_received.set()
+            self.assertEqual((await outgoing.get())['body'], b'1,Ada Lovelace\n')
+            await task
+
+    async def test_panel_sends_each_reply_before_the_slowest_finishes(self):
+        await Character.objects.acreate(name='Mahatma Gandhi', persona='You are Mahatma Gandhi.')
+        await Character.objects.acreate(name='Nelson Mandela', persona='You are Nelson Mandela.')
+        first_received = threading.Event()
+        finished = []
+
+        def reply(system_prompt, user_message, cancel_event=None):
+            if 'Mandela' in system_prompt:
+                first_received.wait(5)
+            finished.append(system_prompt)
+            return f'{system_prompt[len("You are "):-1]} replies'
+
+        body = json.dumps({'characters': ['Mahatma Gandhi', 'Nelson Mandela'], 'message': 'What is peace?'})
+        with mock.patch('characters.panel.ChatService.generate_reply', side_effect=reply):
+            task, outgoing = await self.start('POST', '/api/chat/panel/', body.encode(), logged_in=False)
+            self.assertEqual((await outgoing.get())['status'], 200)
+            event = json.loads((await outgoing.get())['body'])
+            self.assertEqual((event['character'], event['reply']), ('Mahatma Gandhi', 'Mahatma Gandhi replies'))
+            self.assertEqual(finished, ['You are Mahatma Gandhi.'])
+            first_received.set()
+            event = json.loads((await outgoing.get())['body'])
+            self.assertEqual(event['character'], 'Nelson Mandela')
+            await task
+
+
+class RollupTests(TestCase):
+    def test_rollups_are_incremental(self):
+        ChatHistory.objects.create(character_name='Ada Lovelace', user_question='Who are you?', bot_response='Ada')
+        ChatHistory.objects.create(character_name='Ada Lovelace', user_question='who are  you', bot_response='Ada L.')
+        self.assertEqual(update_rollups(), 2)
+        self.assertEqual(update_rollups(), 0)
+        ChatHistory.objects.create(character_name='Ada Lovelace', user_question='Why?', bot_response='Because')
+        self.assertEqual(update_rollups(), 1)
+
+        daily = get_usage_series('ada lovelace', granularity='day')
+        self.assertEqual(daily[0]['messages'], 3)
+        self.assertEqual(daily[0]['average_response_length'], 5)
+        top = get_top_questions('Ada Lovelace')
+        self.assertEqual((top[0]['question'], top[0]['count']), ('who are you', 2))
+
+    def test_chats_committed_out_of_order_are_counted(self):
+        from .models import RollupState
+
+        chats = [ChatHistory.objects.create(character_name='Ada Lovelace', user_question=f'Q{i}', bot_response='A')
+                 for i in range(3)]
+        late_pk = chats[1].pk
+        chats[1].delete()  # Stands in for a lower id whose transaction has not committed yet
+        self.assertEqual(update_rollups(), 2)
+        self.assertEqual([pk for pk, _ in RollupState.objects.get().pending_ids], [late_pk])
+
+        ChatHistory.objects.create(pk=late_pk, character_name='Ada Lovelace', user_question='Q1', bot_response='A')
+        self.assertEqual(update_rollups(), 1)
+        self.assertEqual(update_rollups(), 0)
+        self.assertEqual(get_usage_series('Ada Lovelace', granularity='day')[0]['messages'], 3)
+        self.assertEqual(RollupState.objects.get().pending_ids, [])
+
+        # Ids that never show up (rolled back) are forgotten after the window
+        ChatHistory.objects.create(character_name='Ada Lovelace', user_question='Q3', bot_response='A').delete()
+        ChatHistory.objects.create(character_name='Ada Lovelace', user_question='Q4', bot_response='A')
+        update_rollups()
+        self.assertEqual(len(RollupState.objects.get().pending_ids), 1)
+        with override_settings(CHAT_ROLLUP_PENDING_SECONDS=0):
+            self.assertEqual(update_rollups(), 0)
+        self.assertEqual(RollupState.objects.get().pending_ids, [])
+
+    def test_analytics_rejects_bad_dates_and_clamps_top(self):
+        from django.contrib.auth.models import User
+
+        self.client.force_login(User.objects.create_superuser('admin', password='pw'))
+        ChatHistory.objects.create(character_name='Ada Lovelace', user_question='Hi', bot_response='Hello')
+        update_rollups()
+        self.assertEqual(self.client.get('/api/analytics/', {'from': 'garbage'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/analytics/', {'to': '2025-13-01'}).status_code, 400)
+        response = self.client.get('/api/analytics/', {'top': -5, 'from': '2000-01-01'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['top_questions']), 1)
+
+
+class ChatWebSocketTests(TestCase):
+    async def open_socket(self, query=b''):
+        incoming, outgoing = asyncio.Queue(), asyncio.Queue()
+        scope = {'type': 'websocket', 'path': WEBSOCKET_PATH, 'query_string': query}
+        session = asyncio.create_task(chat_websocket(scope, incoming.get, outgoing.put))
+        await incoming.put({'type': 'websocket.connect'})
+        return session, incoming, outgoing
+
+    async def test_streams_tokens_and_caches_character(self):
+        await Character.objects.acreate(name='Ada Lovelace', persona='You are Ada.')
+        session, incoming, outgoing = await self.open_socket(b'character=ada%20lovelace')
+        self.assertEqual((await outgoing.get())['type'], 'websocket.accept')
+        self.assertEqual(json.loads((await outgoing.get())['text'])['type'], 'ready')
+
+        with mock.patch('characters.websocket.ChatService.stream_reply', return_value=iter(['Hel', 'lo'])):
+            await incoming.put({'type': 'websocket.receive', 'text': json.dumps({'message': 'Hi'})})
+            frames = [json.loads((await outgoing.get())['text']) for _ in range(3)]
+
+        self.assertEqual([f['type'] for f in frames], ['token', 'token', 'done'])
+        self.assertEqual(frames[-1]['reply'], 'Hello')
+        await incoming.put({'type': 'websocket.disconnect', 'code': 1000})
+        await session
+        self.assertEqual(await ChatHistory.objects.acount(), 1)
+
+    @override_settings(CHAT_WS_MAX_CONNECTIONS=0)
+    async def test_connection_cap(self):
+        session, _, outgoing = await self.open_socket()
+        await session
+        self.assertEqual(await outgoing.get(), {'type': 'websocket.close', 'code': 1013})
+
+
+class FakeStream:
+    def __init__(self, tokens):
+        self.chunks = [mock.Mock(choices=[mock.Mock(delta=mock.Mock(content=t))]) for t in tokens]
+        self.closed = False
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+    def close(self):
+        self.closed = True
+
+
+class CancellationTests(TestCase):
+    def setUp(self):
+        metrics.reset()
+
+    def test_cancel_event_closes_upstream_stream(self):
+        stream = FakeStream(['a', 'b', 'c', 'd'])
+        cancel_event = threading.Event()
+        with mock.patch('characters.services.get_groq_client') as get_client:
+            get_client.return_value.chat.completions.create.return_value = stream
+            tokens = ChatService.stream_reply('system', 'hi', cancel_event)
+            self.assertEqual(next(tokens), 'a')
+            cancel_event.set()
+            with self.assertRaises(GenerationCancelled) as ctx:
+                next(tokens)
+
+        self.assertTrue(stream.closed)
+        self.assertEqual(ctx.exception.tokens_generated, 1)
+
+    def test_cancelled_generations_are_counted(self):
+        metrics.increment('chat.generations_completed', 2)
+        metrics.increment('chat.completion_chunks', 200)
+        record_cancelled_generation(30)
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot['chat.generations_cancelled'], 1)
+        self.assertEqual(snapshot['chat.tokens_saved_estimate'], 70)
+
+
+class StartupBudgetTests(SimpleTestCase):
+    def test_boot_stays_lazy_and_within_budget(self):
+        # Import-only probe, so no request runs against the developer's database. The budget is
+        # several times a typical boot, so only a real regression (an eager heavy import) trips it.
+        report = measure_startup(path=None)
+        self.assertEqual(report['eager_modules'], [])
+        self.assertIsNone(report['status'])
+        self.assertLess(report['setup_ms'], settings.STARTUP_BUDGET_MS)
+
+
+class RequestProfilingTests(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+
+        self.profile_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.profile_dir.cleanup)
+        self.staff = User.objects.create_user('staff', password='pw', is_staff=True)
+
+    def test_staff_request_is_profiled_into_ring_buffer(self):
+        self.client.force_login(self.staff)
+        with self.settings(REQUEST_PROFILING_ENABLED=True, REQUEST_PROFILE_DIR=self.profile_dir.name,
+                           REQUEST_PROFILE_LIMIT=2):
+            for _ in range(3):
+                response = self.client.get('/api/chat-history/?profile=1')
+            profiles = list_profiles()
+            detail = load_profile(response['X-Profile-Id'])
+
+        self.assertEqual(len(profiles), 2)
+        self.assertEqual(profiles[0]['id'], response['X-Profile-Id'])
+        self.assertGreaterEqual(detail['sql_count'], 1)
+        self.assertIn('cumulative', detail['stats'])
+
+    def test_anonymous_request_is_not_profiled(self):
+        with self.settings(REQUEST_PROFILING_ENABLED=True, REQUEST_PROFILE_DIR=self.profile_dir.name):
+            response = self.client.get('/api/characters/?profile=1')
+        self.assertNotIn('X-Profile-Id', response)
+
+
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        Character.objects.create(name='Ada Lovelace', persona='You are Ada.')
+
+    def post(self, key, message='Hi'):
+        return self.client.post('/api/chat/', {'character': 'Ada Lovelace', 'message': message},
+                                content_type='application/json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_stored_response(self):
+        with mock.patch('characters.views.ChatService.generate_reply', return_value='Hello') as generate:
+            first = self.post('abc')
+            retry = self.post('abc')
+
+        self.assertEqual(generate.call_count, 1)
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(ChatHistory.objects.count(), 1)
+
+    def test_key_reuse_with_different_payload_is_rejected(self):
+        with mock.patch('characters.views.ChatService.generate_reply', return_value='Hello'):
+            self.post('abc')
+            response = self.post('abc', message='Something else')
+        self.assertEqual(response.status_code, 422)
+
+    def test_keys_are_scoped_to_the_client(self):
+        with mock.patch('characters.views.ChatService.generate_reply', return_value='Hello') as generate:
+            self.post('abc')
+            other = self.client.post('/api/chat/', {'character': 'Ada Lovelace', 'message': 'Hi'},
+                                     content_type='application/json', HTTP_IDEMPOTENCY_KEY='abc', REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(generate.call_count, 2)
+        self.assertNotIn('Idempotent-Replayed', other)
+
+    def test_failed_generation_releases_key(self):
+        with mock.patch('characters.views.ChatService.generate_reply', side_effect=RuntimeError('boom')):
+            self.assertEqual(self.post('abc').status_code, 500)
+        with mock.patch('characters.views.ChatService.generate_reply', return_value='Hello'):
+            self.assertEqual(self.post('abc').json()['reply'], 'Hello')
+
+
+class RefreshTests(TestCase):
+    def test_unchanged_inputs_skip_llm_calls(self):
+        character = Character.objects.create(name='Ada Lovelace')
+        page = {'title': 'Ada Lovelace', 'extract': 'Ada Lovelace was an English mathematician.', 'revision': '42'}
+        edited = {**page, 'extract': 'Ada Lovelace was an English  mathematician.\n', 'revision': '43'}
+        with mock.patch.object(CharacterInfoService, 'fetch_wikipedia_pages', return_value={'Ada Lovelace': page}), \
+                mock.patch.object(CharacterInfoService, 'generate_persona_with_ai', return_value='You are Ada.') as persona, \
+                mock.patch.object(CharacterInfoService, 'generate_additional_details', return_value={}):
+            CharacterInfoService.auto_populate_character(character, force=False)
+            CharacterInfoService.auto_populate_character(character, force=False)
+            # A refresh passes the same query-API page; an edit outside the intro only bumps the revision
+            CharacterInfoService.auto_populate_character(character, force=False, summary=edited)
+
+        self.assertEqual(persona.call_count, 1)
+        self.assertEqual(character.source_revision, '43')
+
+    def test_generated_details_do_not_change_the_source_hash(self):
+        character = Character.objects.create(name='Ada Lovelace')
+        summary = {'title': 'Ada Lovelace', 'extract': 'Ada Lovelace was an English mathematician.', 'revision': '42'}
+
+        def reply(messages):
+            if 'MAJOR_ACHIEVEMENTS' in messages[-1]['content']:
+                return 'MAJOR_ACHIEVEMENTS: First algorithm HISTORICAL_CONTEXT: Victorian England FAMOUS_QUOTES: None'
+            return 'You are Ada Lovelace.'
+
+        llm = FakeGroqClient(reply)
+        with mock.patch.object(CharacterInfoService, 'fetch_wikipedia_pages', return_value={'Ada Lovelace': summary}), \
+                mock.patch('characters.services.get_groq_client', return_value=llm):
+            CharacterInfoService.auto_populate_character(character, force=False)
+            self.assertEqual(llm.calls, 2)
+            self.assertEqual(character.major_achievements, 'First algorithm')
+            character.save()
+            character.refresh_from_db()
+            CharacterInfoService.auto_populate_character(character, force=False)
+        self.assertEqual(llm.calls, 2)
+
+    def test_revisions_follow_redirects(self):
+        payload = {'query': {
+            'normalized': [{'from': 'gandhi', 'to': 'Gandhi'}],
+            'redirects': [{'from': 'Gandhi', 'to': 'Mahatma Gandhi'}],
+            'pages': [{'title': 'Mahatma Gandhi', 'lastrevid': 7}, {'title': 'Nobody', 'missing': True}],
+        }}
+        with mock.patch('characters.services.get_http_session') as session:
+            session.return_value.get.return_value.json.return_value = payload
+            revisions = CharacterInfoService.fetch_wikipedia_revisions(['gandhi', 'Nobody'])
+        self.assertEqual(revisions, {'gandhi': '7'})
+
+
+WIKIPEDIA_PAGES = {
+    'Mahatma Gandhi': {'extract': 'Mohandas Karamchand Gandhi (2 October 1869 - 30 January 1948) was an Indian lawyer and anti-colonial nationalist.', 'revision': 101},
+    'Albert Einstein': {'extract': 'Albert Einstein (14 March 1879 - 18 April 1955) was a German-born theoretical physicist.', 'revision': 202},
+    'Mercury': {'extract': 'Mercury may refer to several things.', 'revision': 303, 'disambiguation': True},
+}
+
+
+class WikipediaBatchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_batch_fetch_resolves_redirects_and_disambiguation(self):
+        with WikipediaFixtureServer(WIKIPEDIA_PAGES, redirects={'Gandhi': 'Mahatma Gandhi'}) as wiki, \
+                self.settings(WIKIPEDIA_BASE_URL=wiki.url):
+            pages = CharacterInfoService.fetch_wikipedia_pages(['gandhi', 'Albert Einstein', 'Mercury', 'Nobody'])
+            self.assertEqual(len(wiki.requests), 1)
+
+        self.assertEqual(pages['gandhi']['title'], 'Mahatma Gandhi')
+        self.assertEqual(pages['gandhi']['revision'], '101')
+        self.assertNotIn('Nobody', pages)
+        self.assertEqual(CharacterInfoService.extract_wikipedia_info(pages['Mercury']), {})
+        info = CharacterInfoService.extract_wikipedia_info(pages['Albert Einstein'])
+        self.assertEqual(info['birth_date'], '14 March 1879')
+
+    def test_extract_continuation_and_title_cache(self):
+        pages = {f'Person {i}': {'extract': f'Person {i} was a writer.', 'revision': i} for i in range(45)}
+        titles = [f'person {i}' for i in range(45)]
+        with WikipediaFixtureServer(pages) as wiki, self.settings(WIKIPEDIA_BASE_URL=wiki.url):
+            first = CharacterInfoService.fetch_wikipedia_pages(titles)
+            self.assertEqual(len(wiki.requests), 3)  # Extracts come 20 per response
+            CharacterInfoService.fetch_wikipedia_pages(titles)
+            self.assertIn('titles=Person+0%7C', wiki.requests[-1])  # Canonical titles from the cache
+
+        self.assertEqual(len(first), 45)
+        self.assertTrue(all(page['extract'] for page in first.values()))
+
+
+class WarmAnswerCacheTests(TestCase):
+    def test_popular_questions_are_served_without_llm(self):
+        ada = Character.objects.create(name='Ada Lovelace', persona='You are Ada.')
+        for question in ('Who are you?', 'who are you', 'WHO ARE YOU?', 'Why?'):
+            ChatHistory.objects.create(character_name='Ada Lovelace', user_question=question, bot_response='...')
+
+        todo, _ = plan_warmup(top=1)
+        self.assertEqual(todo, {ada: [('who are you', 3)]})
+        with mock.patch('characters.batch.ChatService.generate_reply', return_value='I am Ada.'):
+            list(warm_answers(todo))
+        self.assertEqual(get_suggested_questions(ada), ['Who are you?'])
+
+        with mock.patch('characters.views.ChatService.generate_reply') as generate:
+            response = self.client.post('/api/chat/', {'character': 'Ada Lovelace', 'message': 'Who are  you?'},
+                                        content_type='application/json')
+        generate.assert_not_called()
+        self.assertEqual(response.json()['reply'], 'I am Ada.')
+        self.assertTrue(response.json()['cached'])
+
+        # A persona change makes the warmed answer stale until it is regenerated
+        ada.persona = 'You are Ada Lovelace.'
+        ada.save()
+        self.assertEqual(get_suggested_questions(ada), [])
+        todo, _ = plan_warmup(top=1)
+        self.assertIn(ada, todo)
+
+
+class ResponseBlobTests(TestCase):
+    def test_responses_are_deduplicated_and_readable_everywhere(self):
+        long_reply = 'I am Ada Lovelace, and I wrote the first published algorithm. ' * 20
+        ChatHistory.objects.create(character_name='Ada Lovelace', user_question='Q1', bot_response=long_reply)
+        ChatHistory.objects.create(character_name='Ada Lovelace', user_question='Q2', bot_response=long_reply)
+
+        rows, text_bytes, stored_bytes = compact_responses(batch_size=1)
+        self.assertEqual(rows, 2)
+        self.assertEqual(ResponseBlob.objects.count(), 1)
+        self.assertLess(stored_bytes, text_bytes / 10)
+        self.assertFalse(ChatHistory.objects.exclude(bot_response='').exists())
+
+        with override_settings(RESPONSE_BLOB_STORAGE=True):
+            ChatHistory.objects.create(character_name='Ada Lovelace', user_question='Q3', bot_response=long_reply)
+        self.assertEqual(ResponseBlob.objects.count(), 1)
+
+        data = b''.join(iter_export(filter_chat_history(), 'jsonl'))
+        self.assertEqual({json.loads(line)['bot_response'] for line in data.splitlines()}, {long_reply})
+        history = self.client.get('/api/chat-history/').json()
+        self.assertEqual(history['chat_history'][0]['bot_response'], long_reply)
+        update_rollups()
+        self.assertEqual(get_usage_series('Ada Lovelace')[0]['average_response_length'], len(long_reply))
+
+        ChatHistory.objects.all().delete()
+        self.assertEqual(delete_orphans(), 1)
+
+
+@override_settings(ADMIN_ESTIMATED_COUNT_THRESHOLD=0)
+class AdminChangelistTests(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+
+        Character.objects.create(name='Ada Lovelace')
+        self.client.force_login(User.objects.create_superuser('admin', password='pw'))
+
+    def add_chats(self, count):
+        ChatHistory.objects.bulk_create([
+            ChatHistory(character_name='Ada Lovelace', user_question=f'Question {i}', bot_response='A' * 500)
+            for i in range(count)
+        ])
+
+    def get_changelist(self, url='/admin/characters/chathistory/'):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, [query['sql'] for query in queries]
+
+    def test_query_count_does_not_grow_with_rows(self):
+        self.add_chats(3)
+        self.get_changelist()  # Fills the cached filter choices
+        _, small = self.get_changelist()
+        self.add_chats(200)
+        response, large = self.get_changelist()
+
+        self.assertEqual(len(small), len(large))
+        self.assertFalse([sql for sql in large if 'COUNT(' in sql])
+        self.assertFalse([sql for sql in large if 'DISTINCT' in sql])  # Neither the facet list nor the date hierarchy
+        self.assertContains(response, 'Ada Lovelace')
+        self.assertContains(response, 'A' * 50 + '...')
+
+    def test_character_filter_uses_cached_character_names(self):
+        self.add_chats(2)
+        self.get_changelist()
+        _, queries = self.get_changelist('/admin/characters/chathistory/?character_name=Ada+Lovelace')
+        self.assertFalse([sql for sql in queries if 'FROM "characters_character"' in sql])
+
+        Character.objects.create(name='Albert Einstein')
+        response, _ = self.get_changelist()
+        self.assertContains(response, 'Albert Einstein')
+
+    def test_change_form_does_not_list_every_blob(self):
+        blobs = [store_text(f'Reply {i}') for i in range(20)]
+        chat = ChatHistory.objects.create(character_name='Ada Lovelace', user_question='Q', response_blob=blobs[0])
+        response, queries = self.get_changelist(f'/admin/characters/chathistory/{chat.pk}/change/')
+        self.assertNotContains(response, '<select name="response_blob"')
+        self.assertNotContains(response, '<select name="panel"')
+        self.assertFalse([sql for sql in queries if 'FROM "characters_responseblob"' in sql and 'WHERE' not in sql])
+
+
+class PanelTests(TestCase):
+    def setUp(self):
+        for name in ('Mahatma Gandhi', 'Nelson Mandela', 'Albert Einstein'):
+            Character.objects.create(name=name, persona=f'You are {name}.')
+
+    def post_panel(self, **data):
+        response = self.client.post('/api/chat/panel/', data, content_type='application/json')
+        return response, [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+
+    def test_replies_are_generated_concurrently_and_rebut_each_other(self):
+        prompts = []
+
+        def slow_reply(system_prompt, user_message, cancel_event=None):
+            name = system_prompt[len('You are '):-1]
+            prompts.append((name, user_message))
+            time.sleep(0.3)
+            return f'{name} says hello'
+
+        with mock.patch('characters.panel.ChatService.generate_reply', side_effect=slow_reply):
+            start = time.perf_counter()
+            response, events = self.post_panel(
+                characters=['Mahatma Gandhi', 'Nelson Mandela', 'Albert Einstein'], message='What is peace?', rounds=2
+            )
+            elapsed = time.perf_counter() - start
+
+        self.assertEqual(response.status_code, 200)
+        self.assertLess(elapsed, 1.2)  # Two rounds of three 0.3s calls, not six in a row
+        turns = [event for event in events if event['type'] == 'turn']
+        self.assertEqual([event['round'] for event in turns], [1, 1, 1, 2, 2, 2])
+        self.assertEqual(events[-1]['type'], 'done')
+
+        # In the rebuttal round each character sees the others' replies but not its own
+        for name, user_message in prompts[3:]:
+            self.assertIn('What is peace?', user_message)
+            self.assertNotIn(f'{name} says hello', user_message)
+            self.assertEqual(user_message.count('says hello'), 2)
+        self.assertEqual(ChatHistory.objects.filter(panel_id=events[-1]['panel_id']).count(), 6)
+
+    def test_panel_needs_known_distinct_characters(self):
+        response = self.client.post('/api/chat/panel/', {'characters': ['Mahatma Gandhi', 'Nobody'], 'message': 'Hi'},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post('/api/chat/panel/', {'characters': ['Mahatma Gandhi', 'mahatma gandhi'], 'message': 'Hi'},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class RenderingTests(TestCase):
+    def test_fast_renderer_matches_drf_output(self):
+        from rest_framework.renderers import JSONRenderer
+        from .renderers import FastJSONRenderer
+
+        data = {'chat_history': [{'id': 1, 'timestamp': timezone.now().isoformat(), 'reply': 'Ünïcode "quoted"'}]}
+        self.assertEqual(json.loads(FastJSONRenderer().render(data)), json.loads(JSONRenderer().render(data)))
+
+    @override_settings(RESPONSE_COMPRESSION_MIN_BYTES=1024)
+    def test_large_api_responses_are_compressed(self):
+        ChatHistory.objects.bulk_create([
+            ChatHistory(character_name='Ada Lovelace', user_question=f'Q{i}', bot_response='Analytical engines. ' * 10)
+            for i in range(100)
+        ])
+        response = self.client.get('/api/chat-history/?limit=100', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(json.loads(gzip.decompress(response.content))['total_count'], 100)
+
+        small = self.client.get('/api/chat-history/?limit=1', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(small.has_header('Content-Encoding'))
+
+
+class IndexPageTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_character_list_is_rendered_inline(self):
+        Character.objects.create(name='Ada Lovelace', era='19th century')
+        response = self.client.get('/')
+        self.assertContains(response, '<option value="Ada Lovelace">Ada Lovelace (19th century)</option>', html=True)
+        self.assertNotContains(response, 'cdn.tailwindcss.com')
+        self.assertContains(response, '.min-h-screen{')  # Prebuilt CSS is inlined
+
+        # Saving a character refreshes the cached catalog
+        Character.objects.create(name='Albert Einstein', era='20th century')
+        self.assertContains(self.client.get('/'), 'Albert Einstein')
+
+    def test_fingerprinted_static_files_are_precompressed_and_cached(self):
+        from django.core.management import call_command
+
+        with tempfile.TemporaryDirectory() as static_root, override_settings(STATIC_ROOT=static_root):
+            call_command('collectstatic', interactive=False, verbosity=0)
+            with open(f'{static_root}/staticfiles.json') as handle:
+                hashed = json.load(handle)['paths']['css/histomind.css']
+
+            response = self.client.get(f'/static/{hashed}', HTTP_ACCEPT_ENCODING='gzip')
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertIn('immutable', response['Cache-Control'])
+            self.assertIn(b'.min-h-screen{', gzip.decompress(b''.join(response.streaming_content)))
+
+            plain = self.client.get('/static/css/histomind.css')
+            self.assertNotIn('immutable', plain['Cache-Control'])
+            plain.close()
+            response.close()
+
+
+class TimelineTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_free_text_dates_are_parsed(self):
+        self.assertEqual(parse_year_range('1869-1948'), (1869, 1948))
+        self.assertEqual(parse_year_range('26 December 1791 – 18 October 1871'), (1791, 1871))
+        self.assertEqual(parse_year_range('384–322 BC'), (-384, -322))
+        self.assertEqual(lifespan_years('30 November 1874', '', '1874-1965'), (1874, 1965))
+        self.assertEqual(lifespan_years('', '', 'Renaissance'), (None, None))
+
+        info = CharacterInfoService.extract_wikipedia_info(
+            {'extract': 'Aristotle (384–322 BC) was an Ancient Greek philosopher and polymath.'}
+        )
+        self.assertEqual((info['birth_date'], info['death_date'], info['era']), ('384 BC', '322 BC', '384-322 BC'))
+
+    def test_alive_in_and_period_queries(self):
+        Character.objects.create(name='Mahatma Gandhi', era='1869-1948')
+        Character.objects.create(name='Nelson Mandela', birth_date='18 July 1918', death_date='5 December 2013')
+        Character.objects.create(name='Aristotle', era='384–322 BC')
+        Character.objects.create(name='Unknown Poet', era='Antiquity')
+
+        def names(query):
+            response = self.client.get(f'/api/characters/?{query}')
+            self.assertEqual(response.status_code, 200)
+            return [c['name'] for c in response.json()['characters']]
+
+        self.assertEqual(names('alive_in=1930'), ['Mahatma Gandhi', 'Nelson Mandela'])
+        self.assertEqual(names('alive_in=-350'), ['Aristotle'])
+        self.assertEqual(names('from=1950&to=2000'), ['Nelson Mandela'])
+        self.assertEqual(names('to=0'), ['Aristotle'])
+        self.assertEqual(len(names('')), 4)
+        self.assertEqual(self.client.get('/api/characters/?alive_in=soon').status_code, 400)
+
+        gandhi = Character.objects.get(name='Mahatma Gandhi')
+        gandhi.era = '1869-1950'
+        gandhi.save(update_fields=['era'])
+        gandhi.refresh_from_db()
+        self.assertEqual(gandhi.death_year, 1950)
+
+
+class CharacterSearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_index()
+        Character.objects.create(name='Albert Einstein', era='1879-1955')
+        Character.objects.create(name='Mahatma Gandhi', aliases='Gandhi, Bapu', era='1869-1948')
+        Character.objects.create(name='Ada Lovelace', era='1815-1852')
+
+    def names(self, query):
+        response = self.client.get('/api/characters/search/', {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return [result['name'] for result in response.json()['results']]
+
+    def test_typos_prefixes_and_aliases(self):
+        self.assertEqual(self.names('Einstien')[0], 'Albert Einstein')
+        self.assertEqual(self.names('ein'), ['Albert Einstein'])
+        self.assertEqual(self.names('bapu'), ['Mahatma Gandhi'])
+        self.assertEqual(self.names(''), [])
+        self.assertEqual(self.client.get('/api/characters/search/?q=a&limit=x').status_code, 400)
+
+    def test_index_follows_saves_and_deletes(self):
+        self.assertEqual(search_characters('lovelace')[0]['name'], 'Ada Lovelace')
+        Character.objects.create(name='Marie Curie', aliases='Maria Sklodowska')
+        self.assertEqual(search_characters('sklodowska')[0]['name'], 'Marie Curie')
+        Character.objects.filter(name='Ada Lovelace').get().delete()
+        self.assertEqual(search_characters('lovelace'), [])
+
+    @mock.patch.object(ChatService, 'generate_reply', return_value='Hello.')
+    def test_chat_resolves_aliases_and_suggests_names(self, generate_reply):
+        response = self.client.post('/api/chat/', {'character': 'Einstien', 'message': 'Hi'}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['suggestions'][0], 'Albert Einstein')
+        self.assertIn("Did you mean 'Albert Einstein'?", response.json()['error'])
+
+        response = self.client.post('/api/chat/', {'character': 'Gandhi', 'message': 'Hi'}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+
+class RelatedCharactersTests(TestCase):
+    def setUp(self):
+        def create(name, occupation, description, era):
+            with self.captureOnCommitCallbacks(execute=True):
+                return Character.objects.create(name=name, occupation=occupation, description=description, era=era)
+
+        self.einstein = create('Albert Einstein', 'Theoretical physicist', 'Developed the theory of relativity and quantum physics.', '1879-1955')
+        self.curie = create('Marie Curie', 'Physicist and chemist', 'Pioneering research on radioactivity and physics.', '1867-1934')
+        self.keats = create('John Keats', 'Romantic poet', 'English poet of odes and sonnets.', '1795-1821')
+        self.byron = create('Lord Byron', 'Romantic poet', 'Poet and leading figure of the Romantic movement.', '1788-1824')
+
+    def related_names(self, character):
+        return [row['name'] for row in get_related(character.pk)]
+
+    def test_endpoint_serves_precomputed_neighbors(self):
+        response = self.client.get(f'/api/characters/{self.einstein.pk}/related/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['related'][0]['name'], 'Marie Curie')
+        self.assertEqual(self.related_names(self.keats)[0], 'Lord Byron')
+        self.assertEqual(self.client.get('/api/characters/999999/related/').status_code, 404)
+        self.assertEqual(len(self.client.get(f'/api/characters/{self.keats.pk}/related/?limit=1').json()['related']), 1)
+
+    def test_incremental_updates_match_a_full_rebuild(self):
+        self.byron.occupation = 'Experimental physicist'
+        self.byron.description = 'Research on radioactivity and quantum physics.'
+        self.byron.era = '1870-1940'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.byron.save()
+        self.assertIn('Lord Byron', self.related_names(self.curie)[:2])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.einstein.delete()
+        self.assertNotIn('Albert Einstein', self.related_names(self.curie))
+
+        incremental = {c.pk: get_related(c.pk) for c in Character.objects.all()}
+        self.assertEqual(build_vectors(), 0)
+        rebuild_neighbors()
+        self.assertEqual({c.pk: get_related(c.pk) for c in Character.objects.all()}, incremental)
+
+    def test_updates_run_after_commit_and_only_when_sources_change(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.keats.persona = 'You are John Keats.'
+            self.keats.save()
+        self.assertEqual(callbacks, [])
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.keats.occupation = 'Physicist'
+            self.keats.description = 'Research on radioactivity and physics.'
+            self.keats.save()
+        self.assertEqual(self.related_names(self.keats)[0], 'Lord Byron')  # Not patched until the commit
+        self.assertEqual(len(callbacks), 1)
+        callbacks[0]()
+        self.assertEqual(self.related_names(self.keats)[0], 'Marie Curie')
+
+    def test_pure_python_path_without_numpy(self):
+        with mock.patch.dict(sys.modules, {'numpy': None}):  # Makes "import numpy" raise ImportError
+            self.assertIsNone(VectorSet.load().numpy)
+            self.assertEqual(rebuild_neighbors(), 4)
+        self.assertEqual(self.related_names(self.einstein)[0], 'Marie Curie')
+        self.assertEqual(self.related_names(self.keats)[0], 'Lord Byron')
+
+    @skipUnless(importlib.util.find_spec('numpy'), 'numpy is not installed')
+    def test_numpy_path_matches_pure_python(self):
+        vectors = VectorSet.load()
+        self.assertIsNotNone(vectors.numpy)
+        with mock.patch.dict(sys.modules, {'numpy': None}):
+            expected = dict(VectorSet.load().all_neighbors(top_k=3))
+        for pk, neighbors in vectors.all_neighbors(top_k=3, batch_size=2):
+            self.assertEqual([pair[0] for pair in neighbors], [pair[0] for pair in expected[pk]])
+            for (_, score), (_, expected_score) in zip(neighbors, expected[pk]):
+                self.assertAlmostEqual(score, expected_score, places=3)
+
+
+class TokenUsageTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        usage.reset()
+        metrics.reset()
+        Character.objects.create(name='Ada Lovelace', persona='You are Ada Lovelace.')
+
+    def chat(self, message='Hello'):
+        return self.client.post('/api/chat/', {'character': 'Ada Lovelace', 'message': message},
+                                content_type='application/json', REMOTE_ADDR='10.0.0.7')
+
+    def completion(self, *args, **kwargs):
+        # Groq reports usage on the last chunk of a stream
+        stream = FakeStream(['Greet', 'ings.'])
+        stream.chunks.append(mock.Mock(choices=[], x_groq=mock.Mock(usage=mock.Mock(prompt_tokens=40, completion_tokens=10))))
+        return stream
+
+    def test_calls_are_logged_and_rolled_up(self):
+        with mock.patch('characters.services.get_groq_client') as get_client:
+            get_client.return_value.chat.completions.create.side_effect = self.completion
+            self.assertEqual(self.chat().status_code, 200)
+            self.assertEqual(self.chat('And now?').status_code, 200)
+
+        self.assertEqual(usage.flush(), 2)
+        row = LLMUsage.objects.first()
+        self.assertEqual((row.client, row.character_name, row.purpose), ('ip:10.0.0.7', 'Ada Lovelace', 'chat'))
+        self.assertEqual((row.prompt_tokens, row.completion_tokens, row.estimated), (40, 10, False))
+
+        totals = usage.rollups()
+        self.assertEqual(totals['clients']['ip:10.0.0.7']['prompt_tokens'], 80)
+        self.assertEqual(totals['characters']['Ada Lovelace']['calls'], 2)
+        self.assertEqual(usage.tokens_used_today('ip:10.0.0.7'), 100)
+
+    def test_streamed_usage_is_estimated_without_a_report(self):
+        with mock.patch('characters.services.get_groq_client') as get_client:
+            get_client.return_value.chat.completions.create.return_value = FakeStream(['a', 'b', 'c'])
+            with usage.attribute(client='user:1'):
+                self.assertEqual(''.join(ChatService.stream_reply('x' * 40, 'hi')), 'abc')
+        usage.flush()
+        row = LLMUsage.objects.get()
+        self.assertEqual((row.client, row.completion_tokens, row.estimated), ('user:1', 3, True))
+
+    @override_settings(LLM_USAGE_FLUSH_SIZE=1)
+    def test_worker_threads_only_buffer_and_requests_flush(self):
+        worker = threading.Thread(target=usage.record, args=('model', 10, 5, 100))
+        worker.start()
+        worker.join()
+        self.assertEqual(LLMUsage.objects.count(), 0)
+        self.assertEqual(usage.flush_if_due(), 1)
+
+        with mock.patch('characters.services.get_groq_client') as get_client:
+            get_client.return_value.chat.completions.create.side_effect = self.completion
+            self.assertEqual(self.chat().status_code, 200)
+        self.assertEqual(LLMUsage.objects.count(), 2)  # Flushed when the request finished
+
+    def test_commands_save_their_usage_before_exiting(self):
+        from django.core.management import call_command
+
+        with tempfile.TemporaryDirectory() as directory:
+            with open(f'{directory}/questions.txt', 'w', encoding='utf-8') as handle:
+                handle.write('Hello?\nWhy?\n')
+            with mock.patch('characters.services.get_groq_client', return_value=FakeGroqClient('Greetings.')):
+                call_command('batch_chat', questions=f'{directory}/questions.txt', characters='Ada Lovelace',
+                             output=f'{directory}/out.ndjson', stderr=mock.Mock())
+        self.assertEqual(LLMUsage.objects.filter(character_name='Ada Lovelace', purpose='batch').count(), 2)
+
+    @override_settings(TOKEN_BUDGET_PER_DAY=100, TOKEN_BUDGET_OVERRIDES={'ip:10.0.0.8': 0})
+    def test_budget_is_enforced_before_the_upstream_call(self):
+        with mock.patch('characters.services.get_groq_client') as get_client:
+            create = get_client.return_value.chat.completions.create
+            create.side_effect = self.completion
+            self.assertEqual(self.chat().status_code, 200)
+            self.assertEqual(self.chat().status_code, 200)
+            response = self.chat()
+            self.assertEqual(response.status_code, 429)
+            self.assertIn('Retry-After', response)
+            self.assertEqual(create.call_count, 2)
+
+            # Clients with an override of 0 are unlimited
+            response = self.client.post('/api/chat/', {'character': 'Ada Lovelace', 'message': 'Hi'},
+                                        content_type='application/json', REMOTE_ADDR='10.0.0.8')
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(metrics.get('llm.budget_rejections'), 1)
+
+
+class ResilienceTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+        reset_breakers()
+        self.addCleanup(reset_breakers)
+        Character.objects.create(name='Ada Lovelace', persona='You are Ada Lovelace.')
+
+    def test_breaker_opens_then_probes_half_open(self):
+        breaker = CircuitBreaker('test', failure_threshold=2, reset_timeout=0.05)
+        for _ in range(2):
+            with self.assertRaises(ValueError), breaker.guard():
+                raise ValueError('upstream down')
+        self.assertEqual(breaker.state, 'open')
+        with self.assertRaises(CircuitOpen), breaker.guard():
+            self.fail('An open breaker must not call through')
+
+        time.sleep(0.06)
+        self.assertEqual(breaker.state, 'half_open')
+        with breaker.guard():
+            # Only the probe is let through while half-open
+            with self.assertRaises(CircuitOpen), breaker.guard():
+                pass
+        self.assertEqual(breaker.state, 'closed')
+
+    def test_deadline_shrinks_timeouts(self):
+        self.assertEqual(timeout_for(10), 10)
+        with deadline(0.5):
+            self.assertLessEqual(timeout_for(10), 0.5)
+            with deadline(60):
+                self.assertLessEqual(timeout_for(10), 0.5)
+        with deadline(0), self.assertRaises(DeadlineExceeded):
+            timeout_for(10)
+
+    @override_settings(CIRCUIT_BREAKER_FAILURES=1)
+    def test_open_breaker_falls_back_without_calling_upstream(self):
+        def chat():
+            return self.client.post('/api/chat/', {'character': 'Ada Lovelace', 'message': 'What is an engine?'},
+                                    content_type='application/json')
+
+        with mock.patch('characters.services.get_groq_client') as get_client:
+            create = get_client.return_value.chat.completions.create
+            create.side_effect = ConnectionError('Groq is down')
+            self.assertEqual(chat().status_code, 500)
+            self.assertEqual(metrics.snapshot()['breaker.groq.state'], 2)
+
+            response = chat()
+            self.assertEqual(response.status_code, 503)
+            self.assertIn('Retry-After', response)
+
+            # Only warmed answers are served, even one written for an older persona
+            ChatHistory.objects.create(character_name='Ada Lovelace', user_question='What is an engine?',
+                                       bot_response='An unwarmed reply.')
+            self.assertEqual(chat().status_code, 503)
+            WarmAnswer.objects.create(
+                character=Character.objects.get(name='Ada Lovelace'), question='what is an engine',
+                question_hash=question_hash(normalize_question('What is an engine?')),
+                answer='A machine for calculation.', prompt_version='v0',
+            )
+            response = chat()
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['reply'], 'A machine for calculation.')
+            self.assertTrue(response.json()['fallback'])
+            self.assertEqual(create.call_count, 1)
+        self.assertEqual(get_breaker('groq').state, 'open')
+
+
+class LengthPolicyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        Character.objects.create(name='Ada Lovelace', persona='You are Ada Lovelace.')
+
+    def chat(self, message, **extra):
+        return self.client.post('/api/chat/', {'character': 'Ada Lovelace', 'message': message, **extra},
+                                content_type='application/json')
+
+    def test_classifier_on_the_bundled_eval_set(self):
+        self.assertEqual(classify('When were you born?'), 'fact')
+        self.assertEqual(classify('Why did you study mathematics?'), 'explanation')
+        self.assertEqual(classify('Tell me a story about your father.'), 'story')
+        self.assertGreaterEqual(evaluate_classifier(load_eval_set())['accuracy'], 0.85)
+
+        savings = estimate_savings([('When were you born?', 'x' * 4000)], tokens_per_second=100)
+        self.assertEqual(savings['capped_tokens'], 150)
+        self.assertGreater(savings['tokens_saved_pct'], 80)
+
+    @mock.patch.object(ChatService, 'generate_reply', return_value='In 1815.')
+    def test_chat_caps_replies_by_question_type(self, generate_reply):
+        response = self.chat('When were you born?')
+        self.assertEqual(response.json()['length'], 'fact')
+        system_prompt, _, _, max_tokens = generate_reply.call_args.args
+        self.assertEqual(max_tokens, 150)
+        self.assertTrue(system_prompt.startswith('You are Ada Lovelace.'))
+        self.assertIn('one to three sentences', system_prompt)
+
+        self.assertEqual(self.chat('When were you born?', length='story').json()['length'], 'story')
+        self.assertEqual(generate_reply.call_args.args[3], 800)
+        self.chat('When were you born?', max_tokens=42)
+        self.assertEqual(generate_reply.call_args.args[3], 42)
+        self.assertEqual(self.chat('Hi', length='epic').status_code, 400)
+        self.assertEqual(self.chat('Hi', max_tokens=0).status_code, 400)
+
+        with override_settings(CHAT_LENGTH_POLICY=False):
+            self.assertIsNone(self.chat('When were you born?').json()['length'])
+            self.assertEqual(generate_reply.call_args.args[:1], ('You are Ada Lovelace.',))
+            self.assertIsNone(generate_reply.call_args.args[3])
+
+    @mock.patch.object(ChatService, 'generate_reply', return_value='In 1815.')
+    def test_explicit_overrides_skip_the_warm_cache(self, generate_reply):
+        ada = Character.objects.get(name='Ada Lovelace')
+        WarmAnswer.objects.create(
+            character=ada, question='when were you born', question_hash=question_hash('when were you born'),
+            answer='I was born in London in 1815, the only legitimate child of Lord Byron.', prompt_version=ada.prompt_version,
+        )
+        data = self.chat('When were you born?').json()
+        self.assertEqual((data['cached'], data['length']), (True, None))
+        self.assertEqual(self.chat('When were you born?', length='auto').json()['cached'], True)
+        generate_reply.assert_not_called()
+
+        for overrides in ({'length': 'fact'}, {'max_tokens': 20}):
+            data = self.chat('When were you born?', **overrides).json()
+            self.assertEqual((data['reply'], data['cached'], data['length']), ('In 1815.', False, 'fact'))
+        self.assertEqual(generate_reply.call_count, 2)
+
+
+class BenchmarkSuiteTests(TestCase):
+    def test_fake_llm_streams_capped_reply_with_usage(self):
+        usage.reset()
+        client = FakeGroqClient('one two three four')
+        with mock.patch('characters.services.get_groq_client', return_value=client):
+            self.assertEqual(''.join(ChatService.stream_reply('system', 'hi', max_tokens=3)), 'one two three')
+        usage.flush()
+        self.assertEqual(LLMUsage.objects.get().completion_tokens, 3)
+
+    def test_suite_runs_offline_and_reports_timings(self):
+        names = ['get_character_by_name_alias', 'extract_wikipedia_info', 'generate_additional_details', 'chat_history_view']
+        report = run_benchmarks(names, repeat=2, env=BenchmarkEnv(characters=6, chats=30))
+        self.assertEqual(list(report['results']), names)
+        for result in report['results'].values():
+            self.assertEqual(len(result['timings_ms']), 2)
+            self.assertGreater(result['median_ms'], 0)
+        self.assertEqual(report['parameters']['characters'], 6)
+
+    def test_compare_flags_changes_beyond_threshold(self):
+        baseline = {'results': {
+            'lookup': {'median_ms': 1.0}, 'chat': {'median_ms': 30.0, 'throughput_rps': 100.0}, 'gone': {'median_ms': 1.0},
+        }}
+        current = {'results': {
+            'lookup': {'median_ms': 1.05}, 'chat': {'median_ms': 20.0, 'throughput_rps': 80.0}, 'new': {'median_ms': 1.0},
+        }}
+        statuses = {(row['name'], row['metric']): row['status'] for row in compare_results(baseline, current, 0.10)}
+        self.assertEqual(statuses, {
+            ('lookup', 'median_ms'): 'ok',
+            ('chat', 'median_ms'): 'improvement',
+            ('chat', 'throughput_rps'): 'regression',
+            ('new', ''): 'added',
+            ('gone', ''): 'removed',
+        })
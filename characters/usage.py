@@ -0,0 +1,220 @@
+"""
+LLM token accounting: a buffered per-call usage log, in-memory daily rollups and per-client budgets
+
+record() runs on whatever thread made the LLM call (batch and panel workers
+included) and never touches the database; the buffer is written by
+flush_if_due() on request, command and event-loop threads. Budgets are
+counted in the default cache, so they are only enforced across processes
+when CACHES points at a shared backend such as Redis or Memcached.
+"""
+import atexit
+import contextvars
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, time as dt_time, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from . import metrics
+from .models import LLMUsage
+
+# Rollups older than this many days are dropped from memory; the usage table keeps everything
+ROLLUP_DAYS = 2
+BUDGET_KEY_TIMEOUT = 2 * 24 * 60 * 60
+CHARS_PER_TOKEN = 4  # Rough estimate used when the provider reports no usage
+
+_attribution = contextvars.ContextVar('llm_usage_attribution', default={})
+_lock = threading.Lock()
+_rollups = defaultdict(lambda: {'calls': 0, 'prompt_tokens': 0, 'completion_tokens': 0, 'latency_ms': 0})
+_buffer = []
+_last_flush = time.monotonic()
+
+
+class BudgetExceeded(Exception):
+    """Raised before an upstream call that would take a client over its daily token budget"""
+
+    def __init__(self, client, used, budget):
+        super().__init__(f"Daily token budget exceeded ({used} of {budget} tokens used).")
+        self.client = client
+        self.used = used
+        self.budget = budget
+
+
+@contextmanager
+def attribute(**tags):
+    """Attribute LLM calls made inside the block to a client, character and/or purpose"""
+    token = _attribution.set({**_attribution.get(), **{key: value for key, value in tags.items() if value}})
+    try:
+        yield
+    finally:
+        _attribution.reset(token)
+
+
+def client_id(user=None, address=None):
+    """Who tokens are billed to: the logged-in user, otherwise the remote address"""
+    if user is not None and user.is_authenticated:
+        return f"user:{user.pk}"
+    return f"ip:{address or 'unknown'}"
+
+
+def request_client_id(request):
+    return client_id(getattr(request, 'user', None), request.META.get('REMOTE_ADDR'))
+
+
+def estimate_tokens(*texts):
+    return sum(len(text or '') for text in texts) // CHARS_PER_TOKEN + 1
+
+
+def _today():
+    return timezone.now().date()
+
+
+def _budget_key(client, day):
+    return f"usage:tokens:{day:%Y%m%d}:{client}"
+
+
+def get_budget(client):
+    """Daily token budget for client; 0 means unlimited"""
+    overrides = getattr(settings, 'TOKEN_BUDGET_OVERRIDES', {})
+    return overrides.get(client, getattr(settings, 'TOKEN_BUDGET_PER_DAY', 0))
+
+
+def tokens_used_today(client):
+    return cache.get(_budget_key(client, _today()), 0)
+
+
+def seconds_until_reset():
+    now = timezone.now()
+    midnight = datetime.combine(now.date() + timedelta(days=1), dt_time.min, tzinfo=now.tzinfo)
+    return max(1, int((midnight - now).total_seconds()))
+
+
+def check_budget(estimated_tokens=0):
+    """Raise BudgetExceeded if the attributed client cannot afford estimated_tokens more today"""
+    client = _attribution.get().get('client')
+    budget = get_budget(client) if client else 0
+    if not budget:
+        return
+    used = tokens_used_today(client)
+    if used + estimated_tokens > budget:
+        metrics.increment('llm.budget_rejections')
+        raise BudgetExceeded(client, used, budget)
+
+
+def reported_tokens(usage):
+    """(prompt, completion) from a provider usage object, or None if it has no usable counts"""
+    prompt = getattr(usage, 'prompt_tokens', None)
+    completion = getattr(usage, 'completion_tokens', None)
+    if isinstance(prompt, int) and isinstance(completion, int):
+        return prompt, completion
+    return None
+
+
+def record_call(model, started, usage=None, prompt_texts=(), completion_tokens=0):
+    """Account one upstream call that began at perf_counter() time started.
+
+    Uses the provider's usage object when it has counts; otherwise the
+    prompt is estimated from prompt_texts and completion_tokens is taken as is.
+    """
+    counts = reported_tokens(usage)
+    estimated = counts is None
+    prompt, completion = (estimate_tokens(*prompt_texts), completion_tokens) if estimated else counts
+    record(model, prompt, completion, round((time.perf_counter() - started) * 1000), estimated)
+
+
+def record(model, prompt_tokens, completion_tokens, latency_ms, estimated=False):
+    """Buffer a usage row, add it to today's rollups and charge the client's budget"""
+    tags = _attribution.get()
+    client = tags.get('client', '')
+    character = tags.get('character', '')
+    day = _today()
+    total = prompt_tokens + completion_tokens
+
+    with _lock:
+        for dimension, key in (('client', client), ('character', character)):
+            if not key:
+                continue
+            rollup = _rollups[(day, dimension, key)]
+            rollup['calls'] += 1
+            rollup['prompt_tokens'] += prompt_tokens
+            rollup['completion_tokens'] += completion_tokens
+            rollup['latency_ms'] += latency_ms
+        _buffer.append(LLMUsage(
+            timestamp=timezone.now(), client=client, character_name=character,
+            purpose=tags.get('purpose', 'chat'), model=model, prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens, latency_ms=latency_ms, estimated=estimated,
+        ))
+
+    metrics.increment('llm.calls')
+    metrics.increment('llm.prompt_tokens', prompt_tokens)
+    metrics.increment('llm.completion_tokens', completion_tokens)
+    if client:
+        key = _budget_key(client, day)
+        cache.add(key, 0, BUDGET_KEY_TIMEOUT)
+        try:
+            cache.incr(key, total)
+        except ValueError:  # Evicted between add and incr
+            cache.set(key, total, BUDGET_KEY_TIMEOUT)
+
+
+def flush_if_due():
+    """Flush once LLM_USAGE_FLUSH_SIZE rows are buffered or LLM_USAGE_FLUSH_SECONDS have passed"""
+    with _lock:
+        due = _buffer and (
+            len(_buffer) >= getattr(settings, 'LLM_USAGE_FLUSH_SIZE', 50)
+            or time.monotonic() - _last_flush >= getattr(settings, 'LLM_USAGE_FLUSH_SECONDS', 10)
+        )
+    return flush() if due else 0
+
+
+def flush_on_request_finished(sender, **kwargs):
+    flush_if_due()
+
+
+def flush():
+    """Write buffered usage rows in one INSERT; returns how many were written"""
+    global _last_flush
+    with _lock:
+        rows, _buffer[:] = list(_buffer), []
+        _last_flush = time.monotonic()
+        cutoff = _today() - timedelta(days=ROLLUP_DAYS)
+        for key in [key for key in _rollups if key[0] < cutoff]:
+            del _rollups[key]
+    if not rows:
+        return 0
+    try:
+        with transaction.atomic():
+            LLMUsage.objects.bulk_create(rows)
+    except DatabaseError:
+        metrics.increment('llm.usage_rows_dropped', len(rows))  # Never fail a reply over bookkeeping
+        return 0
+    return len(rows)
+
+
+# Write whatever is still buffered when a short-lived process (a management command, a worker) exits
+atexit.register(flush)
+
+
+def rollups(day=None):
+    """In-memory totals for day (default today) keyed by client and by character"""
+    day = day or _today()
+    with _lock:
+        data = {'client': {}, 'character': {}}
+        for (rollup_day, dimension, key), totals in _rollups.items():
+            if rollup_day == day:
+                data[dimension][key] = dict(totals)
+    return {'day': day.isoformat(), 'clients': data['client'], 'characters': data['character']}
+
+
+def reset():
+    """Forget buffered rows and rollups (used by tests)"""
+    global _last_flush
+    with _lock:
+        _buffer.clear()
+        _rollups.clear()
+        _last_flush = time.monotonic()
@@ -1,21 +1,103 @@
+from datetime import date
+
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from groq import Groq
-import os
+from rest_framework.permissions import IsAdminUser
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import FileResponse, Http404, StreamingHttpResponse
 from django.shortcuts import render
-from .models import ChatHistory, Character
+from .analytics import get_top_questions, get_usage_series
+from .blobs import BLOB_VALUE_FIELDS, resolve_text
+from .catalog import CATALOG_FIELDS, get_catalog
+from .batch import DEFAULT_CONCURRENCY, build_pairs, iter_ndjson, parse_completed_keys, parse_flag, run_batch
+from .export import EXPORT_FORMATS, filter_chat_history, iter_export
+from .models import ChatHistory, ChatRollup, Character
+from .panel import MAX_PANEL_SIZE, MAX_ROUNDS, MIN_PANEL_SIZE, run_panel
+from .disconnect import get_disconnect_event, stream_content
+from .profiling import get_profile_dir, list_profiles, load_profile
+from .length_policy import apply_instruction, choose as choose_length, has_overrides, parse_overrides as parse_length_overrides
+from .related import get_related, get_top_k
+from .resilience import CircuitOpen, DeadlineExceeded
+from .search import DEFAULT_LIMIT, MAX_LIMIT, closest_character_names, get_index, search_characters
+from .services import ChatService, GenerationCancelled, record_cancelled_generation
+from .usage import BudgetExceeded, request_client_id
+from .warm_cache import get_fallback_answer, get_suggested_questions, get_warm_answer
+from .years import lifespan_overlaps
+from . import idempotency, metrics, usage
 
 def index(request):
-    return render(request, 'index.html')
+    # The character list is rendered into the page so the dropdown works without a second request
+    return render(request, 'index.html', {'characters': get_catalog()})
+
+@staff_member_required
+def request_profiles(request):
+    """Admin page listing the captured request profiles"""
+    return render(request, 'admin/request_profiles.html', {
+        'title': 'Request profiles',
+        'profiles': list_profiles(),
+        'enabled': getattr(settings, 'REQUEST_PROFILING_ENABLED', False),
+    })
+
+
+@staff_member_required
+def request_profile_detail(request, profile_id):
+    profile = load_profile(profile_id)
+    if profile is None:
+        raise Http404("Profile not found")
+    return render(request, 'admin/request_profile_detail.html', {'title': f'Profile {profile_id}', 'profile': profile})
+
+
+@staff_member_required
+def request_profile_download(request, profile_id, kind):
+    path = get_profile_dir() / f"{profile_id}.{kind}"
+    if kind not in ('prof', 'collapsed') or '/' in profile_id or not path.exists():
+        raise Http404("Profile not found")
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=path.name)
 
 # Helper function to get character from database
 def get_character_by_name(name):
-    """Get character from database by name (case-insensitive)"""
+    """Get character from database by name (case-insensitive) or one of its aliases"""
     try:
         return Character.objects.get(name__iexact=name)
     except Character.DoesNotExist:
-        return None
+        pk = get_index().find_exact(name)
+        return Character.objects.filter(pk=pk).first() if pk is not None else None
+
+def character_not_found(name):
+    """400 response suggesting the closest names instead of listing every character"""
+    suggestions = closest_character_names(name)
+    message = f"Character '{name}' not found."
+    if suggestions:
+        message += f" Did you mean '{suggestions[0]}'?"
+    return Response({"error": message, "suggestions": suggestions}, status=status.HTTP_400_BAD_REQUEST)
+
+def budget_exceeded(error):
+    """429 telling the client when its daily token budget resets"""
+    response = Response({"error": str(error)}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+    response["Retry-After"] = str(usage.seconds_until_reset())
+    return response
+
+def unavailable_fallback(character, user_message, error):
+    """Fast answer while the LLM is unreachable: the warmed answer to the same question, else a 503"""
+    reply = get_fallback_answer(character, user_message)
+    if reply is not None:
+        metrics.increment('chat.fallback_answers')
+        return Response({
+            "character": character.name,
+            "reply": reply,
+            "prompt_version": character.prompt_version,
+            "cached": True,
+            "fallback": True,
+        })
+    metrics.increment('chat.fallback_unavailable')
+    response = Response({
+        "error": f"{character.name} can't answer right now. Please try again in a moment.",
+        "fallback": True,
+    }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    response["Retry-After"] = str(getattr(error, 'retry_after', 0) or 5)
+    return response
 
 def get_available_characters():
     """Get all available characters from database"""
@@ -32,24 +114,67 @@ class ChatWithCharacterView(APIView):
         if not character_name:
             return Response({"error": "No character specified."}, status=status.HTTP_400_BAD_REQUEST)
 
+        try:
+            length, max_tokens = parse_length_overrides(request.data.get("length"), request.data.get("max_tokens"))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
         # Get character from database
         character = get_character_by_name(character_name)
         if not character:
-            return Response({"error": f"Character '{character_name}' not found. Available characters: {[c.name for c in get_available_characters()]}"}, status=status.HTTP_400_BAD_REQUEST)
+            return character_not_found(character_name)
 
-        # Use the character's persona as the system prompt
-        system_prompt = character.persona
+        idempotency_key = request.headers.get("Idempotency-Key")
+        if not idempotency_key:
+            return self.generate(request, character, user_message, length, max_tokens)
+        if len(idempotency_key) > idempotency.MAX_KEY_LENGTH:
+            return Response({"error": "Idempotency-Key is too long."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Retries carrying the same key wait for or replay the original instead of calling the LLM again
+        payload = {"character": character.name, "message": user_message}
+        payload.update({key: value for key, value in (("length", length), ("max_tokens", max_tokens)) if value})
+        fingerprint = idempotency.request_fingerprint(payload)
+        idempotency_key = idempotency.scoped_key(request_client_id(request), idempotency_key)
+        record, created = idempotency.begin(idempotency_key, fingerprint)
+        if not created:
+            if record.fingerprint != fingerprint:
+                return Response({"error": "Idempotency-Key was already used for a different request."}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            record = idempotency.wait_for_completion(idempotency_key)
+            if record is None:
+                return Response({"error": "A request with this Idempotency-Key is still in progress."}, status=status.HTTP_409_CONFLICT)
+            response = Response(record.response_body, status=record.status_code)
+            response["Idempotent-Replayed"] = "true"
+            if record.response_body.get("prompt_version"):
+                response["X-Prompt-Version"] = record.response_body["prompt_version"]
+            return response
+
+        response = self.generate(request, character, user_message, length, max_tokens)
+        if response.status_code < 500 and response.status_code not in (429, 499) and not response.data.get("fallback"):
+            idempotency.complete(record, response.status_code, response.data)
+        else:
+            idempotency.abandon(record)
+        return response
+
+    def generate(self, request, character, user_message, length=None, max_tokens=None):
+        # Warmed answers were generated without a cap, so requests asking for one always go to the LLM
+        warm = not has_overrides(length, max_tokens)
+        # Quick facts get a short cap and instruction, stories a long one
+        category, max_tokens, instruction = choose_length(user_message, length, max_tokens)
+        # The precompiled persona prefix goes first, verbatim, so upstream prompt caches can reuse it
+        system_prompt = apply_instruction(character.get_system_prefix(), instruction)
 
         try:
-            client = Groq(api_key=os.getenv("GROQ_API_KEY"))
-            chat_completion = client.chat.completions.create(
-                model="llama3-70b-8192",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_message}
-                ]
-            )
-            reply = chat_completion.choices[0].message.content
+            # Popular questions are answered from the pre-warmed cache without an LLM call
+            reply = get_warm_answer(character, user_message) if warm else None
+            cached = reply is not None
+            if cached:
+                category = None  # The policy did not shape this reply
+            else:
+                # Aborts the upstream stream if the client disconnects (ASGI only)
+                with usage.attribute(client=request_client_id(request), character=character.name, purpose='chat'):
+                    reply = ChatService.generate_reply(system_prompt, user_message, get_disconnect_event(request), max_tokens)
+                if category:
+                    metrics.increment(f'chat.length.{category}')
 
             # Save chat history to database
             ChatHistory.objects.create(
@@ -58,15 +183,110 @@ class ChatWithCharacterView(APIView):
                 bot_response=reply
             )
 
-            return Response({
+            response = Response({
                 "character": character.name,
-                "reply": reply
+                "reply": reply,
+                "prompt_version": character.prompt_version,
+                "cached": cached,
+                "length": category
             })
+            response["X-Prompt-Version"] = character.prompt_version
+            return response
+
+        except GenerationCancelled as e:
+            record_cancelled_generation(e.tokens_generated)
+            return Response({"error": "Client disconnected."}, status=499)
+
+        except BudgetExceeded as e:
+            return budget_exceeded(e)
+
+        except (CircuitOpen, DeadlineExceeded) as e:
+            return unavailable_fallback(character, user_message, e)
 
         except Exception as e:
             return Response({"error": str(e)}, status=500)
 
 
+class BatchChatView(APIView):
+    """Run many (character, question) pairs and stream the results back as NDJSON"""
+    permission_classes = [IsAdminUser]
+
+    def post(self, request, *args, **kwargs):
+        try:
+            pairs = build_pairs(
+                characters=request.data.get("characters"),
+                questions=request.data.get("questions"),
+                pairs=request.data.get("pairs"),
+            )
+            completed_keys = parse_completed_keys(request.data.get("completed_keys"))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if not pairs:
+            return Response({"error": "Provide 'pairs' or both 'characters' and 'questions'."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            concurrency = int(request.data.get("concurrency", DEFAULT_CONCURRENCY))
+        except (TypeError, ValueError):
+            return Response({"error": "'concurrency' must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            persist = parse_flag(request.data.get("persist", False))
+        except ValueError:
+            return Response({"error": "'persist' must be true or false."}, status=status.HTTP_400_BAD_REQUEST)
+
+        records = run_batch(
+            pairs,
+            concurrency=concurrency,
+            persist=persist,
+            completed_keys=completed_keys,
+        )
+        return StreamingHttpResponse(stream_content(request, iter_ndjson(records)), content_type="application/x-ndjson")
+
+
+class PanelChatView(APIView):
+    """Put one message to several characters at once and stream each reply as NDJSON when it is ready"""
+
+    def post(self, request, *args, **kwargs):
+        user_message = request.data.get("message")
+        names = request.data.get("characters")
+
+        if not user_message:
+            return Response({"error": "No message provided."}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not isinstance(names, list) or not MIN_PANEL_SIZE <= len(names) <= MAX_PANEL_SIZE:
+            return Response({"error": f"'characters' must list {MIN_PANEL_SIZE} to {MAX_PANEL_SIZE} character names."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            rounds = int(request.data.get("rounds", 1))
+        except (TypeError, ValueError):
+            return Response({"error": "'rounds' must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= rounds <= MAX_ROUNDS:
+            return Response({"error": f"'rounds' must be between 1 and {MAX_ROUNDS}."}, status=status.HTTP_400_BAD_REQUEST)
+
+        characters = []
+        for name in names:
+            character = get_character_by_name(str(name).strip())
+            if not character:
+                return character_not_found(name)
+            if character not in characters:
+                characters.append(character)
+        if len(characters) < MIN_PANEL_SIZE:
+            return Response({"error": f"A panel needs at least {MIN_PANEL_SIZE} different characters."}, status=status.HTTP_400_BAD_REQUEST)
+
+        client = request_client_id(request)
+        try:
+            with usage.attribute(client=client):
+                usage.check_budget(usage.estimate_tokens(user_message) * len(characters) * rounds)
+        except BudgetExceeded as e:
+            return budget_exceeded(e)
+
+        events = run_panel(characters, user_message, rounds=rounds, cancel_event=get_disconnect_event(request), client=client)
+        return StreamingHttpResponse(stream_content(request, iter_ndjson(events)), content_type="application/x-ndjson")
+
+
+CHAT_HISTORY_MAX_LIMIT = 1000
+
+
 class ChatHistoryView(APIView):
     def get(self, request, *args, **kwargs):
         """Get chat history, optionally filtered by character"""
@@ -79,18 +299,26 @@ class ChatHistoryView(APIView):
         else:
             chat_history = ChatHistory.objects.all().order_by('-timestamp')
 
-        # Limit to last 50 conversations to avoid overwhelming response
-        chat_history = chat_history[:50]
-
-        history_data = []
-        for chat in chat_history:
-            history_data.append({
-                'id': chat.id,
-                'character_name': chat.character_name,
-                'user_question': chat.user_question,
-                'bot_response': chat.bot_response,
-                'timestamp': chat.timestamp.isoformat()
-            })
+        # Last 50 conversations by default; larger pages are capped to avoid overwhelming responses
+        try:
+            limit = min(max(int(request.query_params.get('limit', 50)), 1), CHAT_HISTORY_MAX_LIMIT)
+        except ValueError:
+            return Response({"error": "'limit' must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Plain values rows skip model instantiation
+        rows = chat_history.values(
+            'id', 'character_name', 'user_question', 'bot_response', 'timestamp', *BLOB_VALUE_FIELDS
+        )[:limit]
+        history_data = [
+            {
+                'id': row['id'],
+                'character_name': row['character_name'],
+                'user_question': row['user_question'],
+                'bot_response': resolve_text(row['bot_response'], row['response_blob__codec'], row['response_blob__data']),
+                'timestamp': row['timestamp'].isoformat()
+            }
+            for row in rows
+        ]
 
         return Response({
             'chat_history': history_data,
@@ -98,19 +326,146 @@ class ChatHistoryView(APIView):
         })
 
 
+class ChatHistoryExportView(APIView):
+    """Stream the full filtered chat history as CSV or JSONL, optionally gzipped"""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        # 'format' is reserved by DRF for renderer negotiation, hence 'fmt'
+        export_format = request.query_params.get('fmt', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            return Response({"error": f"Unsupported format '{export_format}'. Use one of: {', '.join(EXPORT_FORMATS)}"}, status=status.HTTP_400_BAD_REQUEST)
+        compress = request.query_params.get('gzip') in ('1', 'true', 'yes')
+
+        try:
+            queryset = filter_chat_history(
+                character=request.query_params.get('character'),
+                since=request.query_params.get('from'),
+                until=request.query_params.get('to'),
+            )
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        content_type = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+        filename = f"chat_history.{export_format}"
+        if compress:
+            content_type = 'application/gzip'
+            filename += '.gz'
+
+        response = StreamingHttpResponse(stream_content(request, iter_export(queryset, export_format, compress)), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
+ANALYTICS_MAX_TOP = 100
+
+
+class AnalyticsView(APIView):
+    """Per-character usage dashboards answered from the pre-aggregated rollups"""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        granularity = request.query_params.get('granularity', ChatRollup.HOUR)
+        if granularity not in (ChatRollup.HOUR, ChatRollup.DAY):
+            return Response({"error": "granularity must be 'hour' or 'day'."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            top = min(max(int(request.query_params.get('top', 10)), 1), ANALYTICS_MAX_TOP)
+        except ValueError:
+            return Response({"error": "'top' must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+
+        bounds = {}
+        for param in ('from', 'to'):
+            value = request.query_params.get(param)
+            try:
+                bounds[param] = date.fromisoformat(value) if value else None
+            except ValueError:
+                return Response({"error": f"'{param}' must be a date (YYYY-MM-DD)."}, status=status.HTTP_400_BAD_REQUEST)
+
+        character = request.query_params.get('character')
+        since, until = bounds['from'], bounds['to']
+        return Response({
+            'granularity': granularity,
+            'series': get_usage_series(character, granularity, since, until),
+            'top_questions': get_top_questions(character, since, until, limit=top),
+        })
+
+
+class MetricsView(APIView):
+    """In-process counters such as cancelled generations and estimated tokens saved"""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(metrics.snapshot())
+
+
+class UsageView(APIView):
+    """Today's LLM token totals per client and per character, from this process's in-memory rollups"""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(usage.rollups())
+
+
+class SuggestedQuestionsView(APIView):
+    """Popular questions for a character that are answered instantly from the warm cache"""
+
+    def get(self, request, *args, **kwargs):
+        character = get_character_by_name(request.query_params.get('character', '').strip())
+        if not character:
+            return Response({"error": "Character not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response({
+            'character': character.name,
+            'questions': get_suggested_questions(character),
+        })
+
+
+class CharacterSearchView(APIView):
+    """Ranked, typo-tolerant autocomplete over character names and aliases"""
+
+    def get(self, request, *args, **kwargs):
+        query = request.query_params.get('q', '').strip()
+        try:
+            limit = min(max(int(request.query_params.get('limit', DEFAULT_LIMIT)), 1), MAX_LIMIT)
+        except ValueError:
+            return Response({"error": "'limit' must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'query': query, 'results': search_characters(query, limit=limit)})
+
+
+class RelatedCharactersView(APIView):
+    """Precomputed "you might also talk to" characters for one character"""
+
+    def get(self, request, character_id, *args, **kwargs):
+        if not Character.objects.filter(pk=character_id).exists():
+            return Response({"error": "Character not found."}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            limit = min(max(int(request.query_params.get('limit', get_top_k())), 1), get_top_k())
+        except ValueError:
+            return Response({"error": "'limit' must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'character_id': character_id, 'related': get_related(character_id, limit=limit)})
+
+
 class CharactersListView(APIView):
     def get(self, request, *args, **kwargs):
-        """Get list of all available characters"""
-        characters = Character.objects.all().order_by('name')
-
-        characters_data = []
-        for character in characters:
-            characters_data.append({
-                'id': character.id,
-                'name': character.name,
-                'era': character.era,
-                'description': character.description
-            })
+        """Get list of all available characters, optionally only those alive in a year or period
+
+        ``?alive_in=1900`` or ``?from=1800&to=1850``; BC years are negative.
+        """
+        bounds = {}
+        for param in ('alive_in', 'from', 'to'):
+            value = request.query_params.get(param)
+            if value:
+                try:
+                    bounds[param] = int(value)
+                except ValueError:
+                    return Response({"error": f"'{param}' must be a year (negative for BC)."}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not bounds:
+            characters_data = get_catalog()
+        else:
+            start = bounds.get('alive_in', bounds.get('from'))
+            end = bounds.get('alive_in', bounds.get('to'))
+            characters_data = list(
+                Character.objects.filter(lifespan_overlaps(start, end)).order_by('name').values(*CATALOG_FIELDS)
+            )
 
         return Response({
             'characters': characters_data,
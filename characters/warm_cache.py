@@ -0,0 +1,104 @@
+"""
+Pre-warmed answers for each character's most frequently asked questions
+"""
+from datetime import timedelta
+
+from django.utils import timezone
+
+from . import metrics
+from .analytics import get_top_questions, normalize_question, question_hash, update_rollups
+from .batch import DEFAULT_CONCURRENCY, run_batch
+from .models import Character, WarmAnswer
+
+
+def _warm_answers(character, message):
+    """Warmed answers to message for character (at most one row; indexed by the unique constraint)"""
+    normalized = normalize_question(message)
+    if not normalized:
+        return None
+    return WarmAnswer.objects.filter(character=character, question_hash=question_hash(normalized))
+
+
+def get_warm_answer(character, message):
+    """Cached answer for message if it is a warmed question for the character's current persona"""
+    answers = _warm_answers(character, message)
+    if answers is None:
+        return None
+    answer = answers.filter(prompt_version=character.prompt_version).values_list('answer', flat=True).first()
+    metrics.increment('chat.warm_cache_hits' if answer is not None else 'chat.warm_cache_misses')
+    return answer
+
+
+def get_fallback_answer(character, message):
+    """Warmed answer for message even if an older persona wrote it; served while the LLM is unreachable"""
+    answers = _warm_answers(character, message)
+    return answers.values_list('answer', flat=True).first() if answers is not None else None
+
+
+def get_suggested_questions(character, limit=5):
+    """Most popular warmed questions for a character, answerable without an LLM call"""
+    answers = WarmAnswer.objects.filter(
+        character=character, prompt_version=character.prompt_version
+    ).order_by('-ask_count', 'question')[:limit]
+    return [answer.display_question for answer in answers]
+
+
+def plan_warmup(top=20, days=30, characters=None, force=False):
+    """Work out which questions need (re)generating.
+
+    Returns ``(todo, prune)``: ``todo`` maps each character to a list of
+    ``(normalized_question, ask_count)`` missing or stale for its current
+    persona; ``prune`` is a queryset of warm answers that fell out of the top N.
+    """
+    update_rollups()
+    since = (timezone.now() - timedelta(days=days)).date()
+    characters = characters if characters is not None else Character.objects.order_by('name')
+
+    todo = {}
+    keep_ids = []
+    for character in characters:
+        popular = get_top_questions(character.name, since=since, limit=top)
+        current = {
+            answer.question_hash: answer
+            for answer in WarmAnswer.objects.filter(character=character)
+        }
+        for row in popular:
+            digest = question_hash(row['question'])
+            existing = current.get(digest)
+            if existing is not None:
+                keep_ids.append(existing.pk)
+            if force or existing is None or existing.prompt_version != character.prompt_version:
+                todo.setdefault(character, []).append((row['question'], row['count']))
+            elif existing.ask_count != row['count']:
+                WarmAnswer.objects.filter(pk=existing.pk).update(ask_count=row['count'])
+
+    prune = WarmAnswer.objects.filter(character__in=list(characters)).exclude(pk__in=keep_ids)
+    return todo, prune
+
+
+def warm_answers(todo, concurrency=DEFAULT_CONCURRENCY):
+    """Generate answers for the planned questions with bounded concurrency.
+
+    Yields each batch result record after storing it.
+    """
+    characters = {character.name: character for character in todo}
+    counts = {
+        (character.name, question): count
+        for character, questions in todo.items()
+        for question, count in questions
+    }
+    pairs = list(counts)
+    for record in run_batch(pairs, concurrency=concurrency):
+        character = characters.get(record['character'])
+        if 'reply' in record and character is not None:
+            WarmAnswer.objects.update_or_create(
+                character=character,
+                question_hash=question_hash(record['question']),
+                defaults={
+                    'question': record['question'],
+                    'answer': record['reply'],
+                    'prompt_version': record['prompt_version'],
+                    'ask_count': counts.get((character.name, record['question']), 0),
+                },
+            )
+        yield record
@@ -0,0 +1,239 @@
+"""
+WebSocket chat channel served directly by the ASGI application
+
+Protocol (JSON text frames):
+    client -> server: {"type": "message", "message": "...", "character": "...",
+                       "length": "fact|explanation|story" (optional), "max_tokens": N (optional)}
+                      {"type": "cancel"}
+                      {"type": "pong"}
+    server -> client: {"type": "ready", "character": ..., "prompt_version": ...}
+                      {"type": "token", "content": "..."}
+                      {"type": "done", "character": ..., "reply": "..."}
+                      {"type": "error", "error": "..."}
+                      {"type": "ping"}
+
+The character can also be chosen when connecting with ``?character=<name>``.
+A new message supersedes (and cancels) a reply that is still being generated.
+"""
+import asyncio
+import json
+import threading
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from . import usage
+from .length_policy import apply_instruction, choose as choose_length, has_overrides, parse_overrides as parse_length_overrides
+from .models import ChatHistory
+from .services import ChatService, GenerationCancelled, record_cancelled_generation
+from .warm_cache import get_warm_answer
+
+WEBSOCKET_PATH = '/ws/chat/'
+
+# Close codes
+CLOSE_NORMAL = 1000
+CLOSE_POLICY = 1008
+CLOSE_TRY_AGAIN_LATER = 1013
+CLOSE_NOT_FOUND = 4404
+
+_active_connections = 0
+
+
+def get_active_connections():
+    return _active_connections
+
+
+class SlowClient(Exception):
+    """Raised when a client does not drain its outgoing messages in time"""
+
+
+class ClientGone(Exception):
+    """Raised when the client disconnected while we were still producing output"""
+
+
+class ChatSocket:
+    """One WebSocket chat session; the selected Character is resolved once and cached"""
+
+    def __init__(self, scope, receive, send):
+        self.scope = scope
+        self.receive = receive
+        self.send = send
+        self.loop = asyncio.get_running_loop()
+        self.outbox = asyncio.Queue(maxsize=getattr(settings, 'CHAT_WS_SEND_QUEUE_SIZE', 256))
+        self.send_timeout = getattr(settings, 'CHAT_WS_SEND_TIMEOUT', 10)
+        self.heartbeat_interval = getattr(settings, 'CHAT_WS_HEARTBEAT_SECONDS', 20)
+        self.character = None
+        self.generation = None
+        self.cancel_event = None
+        self.closed = False
+        self.last_seen = self.loop.time()
+
+    async def push(self, payload):
+        """Queue a message for the client, failing if it stays backed up too long"""
+        if self.closed:
+            raise ClientGone()
+        try:
+            await asyncio.wait_for(self.outbox.put(payload), timeout=self.send_timeout)
+        except asyncio.TimeoutError:
+            raise SlowClient()
+
+    async def close(self, code=CLOSE_NORMAL):
+        if not self.closed:
+            self.closed = True
+            await self.send({'type': 'websocket.close', 'code': code})
+
+    async def writer(self):
+        while True:
+            payload = await self.outbox.get()
+            await self.send({'type': 'websocket.send', 'text': json.dumps(payload, ensure_ascii=False)})
+
+    async def heartbeat(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            if self.loop.time() - self.last_seen > 2 * self.heartbeat_interval:
+                await self.close(CLOSE_POLICY)
+                return
+            await self.push({'type': 'ping'})
+
+    async def select_character(self, name):
+        from .views import get_character_by_name
+
+        name = (name or '').strip()
+        if self.character is not None and (not name or name.lower() == self.character.name.lower()):
+            return self.character
+        if not name:
+            await self.push({'type': 'error', 'error': 'No character specified.'})
+            return None
+
+        character = await sync_to_async(get_character_by_name)(name)
+        if character is None:
+            await self.push({'type': 'error', 'error': f"Character '{name}' not found."})
+            return None
+        self.character = character
+        await self.push({'type': 'ready', 'character': character.name, 'prompt_version': character.prompt_version})
+        return character
+
+    def _produce(self, system_prompt, message, cancel_event, max_tokens=None):
+        """Run the blocking LLM stream in a worker thread, forwarding tokens with backpressure"""
+        parts = []
+        for token in ChatService.stream_reply(system_prompt, message, cancel_event, max_tokens):
+            if cancel_event.is_set():
+                continue  # Superseded; stream_reply raises GenerationCancelled on the next chunk
+            parts.append(token)
+            try:
+                asyncio.run_coroutine_threadsafe(self.push({'type': 'token', 'content': token}), self.loop).result()
+            except (SlowClient, ClientGone):
+                cancel_event.set()
+                raise
+        return ''.join(parts)
+
+    def cancel_generation(self):
+        """Abort the reply in flight, if any; its upstream stream is closed on the next token"""
+        if self.cancel_event is not None:
+            self.cancel_event.set()
+
+    async def answer(self, character, message, cancel_event, length=None, max_tokens=None):
+        try:
+            reply = None
+            if not has_overrides(length, max_tokens):
+                reply = await sync_to_async(get_warm_answer)(character, message)
+            if reply is not None:
+                await self.push({'type': 'token', 'content': reply})
+            else:
+                client = usage.client_id(address=(self.scope.get('client') or [None])[0])
+                with usage.attribute(client=client, character=character.name, purpose='chat'):
+                    _, max_tokens, instruction = choose_length(message, length, max_tokens)
+                    system_prompt = apply_instruction(character.get_system_prefix(), instruction)
+                    reply = await asyncio.to_thread(self._produce, system_prompt, message, cancel_event, max_tokens)
+            if cancel_event.is_set():
+                return  # Superseded after the last token; nothing left to cancel
+            await sync_to_async(ChatHistory.objects.create)(
+                character_name=character.name,
+                user_question=message,
+                bot_response=reply
+            )
+            await sync_to_async(usage.flush_if_due)()  # No request_finished signal on a long-lived socket
+            await self.push({'type': 'done', 'character': character.name, 'reply': reply})
+        except GenerationCancelled as e:
+            record_cancelled_generation(e.tokens_generated)
+        except (SlowClient, ClientGone):
+            await self.close(CLOSE_POLICY)
+        except Exception as e:
+            if not self.closed:
+                await self.push({'type': 'error', 'error': str(e)})
+
+    async def handle_text(self, text):
+        try:
+            data = json.loads(text)
+        except ValueError:
+            await self.push({'type': 'error', 'error': 'Invalid JSON.'})
+            return
+
+        if data.get('type') == 'pong':
+            return
+        if data.get('type') == 'cancel':
+            self.cancel_generation()
+            return
+        if data.get('type', 'message') != 'message':
+            await self.push({'type': 'error', 'error': f"Unknown message type '{data.get('type')}'."})
+            return
+
+        message = data.get('message')
+        if not message:
+            await self.push({'type': 'error', 'error': 'No message provided.'})
+            return
+        try:
+            length, max_tokens = parse_length_overrides(data.get('length'), data.get('max_tokens'))
+        except ValueError as e:
+            await self.push({'type': 'error', 'error': str(e)})
+            return
+        self.cancel_generation()
+        character = await self.select_character(data.get('character'))
+        if character is not None:
+            self.cancel_event = threading.Event()
+            self.generation = asyncio.create_task(self.answer(character, message, self.cancel_event, length, max_tokens))
+
+    async def run(self):
+        global _active_connections
+
+        event = await self.receive()
+        if event['type'] != 'websocket.connect':
+            return
+        if _active_connections >= getattr(settings, 'CHAT_WS_MAX_CONNECTIONS', 500):
+            await self.close(CLOSE_TRY_AGAIN_LATER)
+            return
+
+        await self.send({'type': 'websocket.accept'})
+        _active_connections += 1
+        tasks = [asyncio.create_task(self.writer()), asyncio.create_task(self.heartbeat())]
+        try:
+            query = parse_qs(self.scope.get('query_string', b'').decode())
+            if query.get('character'):
+                await self.select_character(query['character'][0])
+
+            while not self.closed:
+                event = await self.receive()
+                self.last_seen = self.loop.time()
+                if event['type'] == 'websocket.disconnect':
+                    self.closed = True
+                    break
+                if event['type'] == 'websocket.receive' and event.get('text'):
+                    await self.handle_text(event['text'])
+        except SlowClient:
+            await self.close(CLOSE_POLICY)
+        finally:
+            self.closed = True
+            _active_connections -= 1
+            self.cancel_generation()
+            for task in tasks:
+                task.cancel()
+
+
+async def chat_websocket(scope, receive, send):
+    """ASGI entry point for WebSocket connections"""
+    if scope['path'] != WEBSOCKET_PATH:
+        await receive()
+        await send({'type': 'websocket.close', 'code': CLOSE_NOT_FOUND})
+        return
+    await ChatSocket(scope, receive, send).run()
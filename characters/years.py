@@ -0,0 +1,122 @@
+"""
+Parsing of free-text dates and eras into integer years (BC years are negative)
+"""
+import re
+
+from django.db.models import Q
+
+# Upper bound used when a death year is unknown, so "alive in" queries stay index range scans
+MAX_LIFESPAN = 110
+
+_ERA = r'(?:BCE|BC|CE|AD)'
+_YEAR_RE = re.compile(rf'(?<!\d)(\d{{1,4}})(?!\d)\s*({_ERA})?\b', re.IGNORECASE)
+_RANGE_SEPARATOR_RE = re.compile(r'\s*(?:-|–|—|\bto\b|\buntil\b)\s*', re.IGNORECASE)
+_MONTHS = r'(?:January|February|March|April|May|June|July|August|September|October|November|December)'
+# Day-of-month numbers ("30 November", "November 30,") that must not be mistaken for years
+_DAY_MONTH_RE = re.compile(rf'\b\d{{1,2}}\s+{_MONTHS}\b|\b{_MONTHS}\s+\d{{1,2}}(?:st|nd|rd|th)?\b,?', re.IGNORECASE)
+# "(14 March 1879 – 18 April 1955)" or "(c. 570 – 632 CE)" right after a name in a Wikipedia extract
+_LIFESPAN_RE = re.compile(r'\(([^()]*?\d{3,4}[^()]*?(?:-|–|—)[^()]*?\d{1,4}[^()]*?)\)')
+
+
+def _signed(year, era):
+    year = int(year)
+    return -year if era and era.upper() in ('BC', 'BCE') else year
+
+
+def _find_year(text):
+    return _YEAR_RE.search(_DAY_MONTH_RE.sub(' ', text or ''))
+
+
+def parse_year(text):
+    """Year in a date like "30 November 1874", "1869", "c. 500 BC"; None if there is none"""
+    match = _find_year(text)
+    return _signed(*match.groups()) if match else None
+
+
+def parse_year_range(text):
+    """``(start, end)`` years from an era like "1869-1948", "384–322 BC" or "26 December 1791 – 18 October 1871".
+
+    A single year gives ``(year, None)``. An era suffix on the end year only
+    (as in "384–322 BC") applies to both ends.
+    """
+    if not text:
+        return None, None
+    parts = _RANGE_SEPARATOR_RE.split(text.strip(), maxsplit=1)
+    start_match = _find_year(parts[0])
+    end_match = _find_year(parts[1]) if len(parts) > 1 else None
+    start = _signed(*start_match.groups()) if start_match else None
+    end = _signed(*end_match.groups()) if end_match else None
+    if start_match and end_match and end_match.group(2) and not start_match.group(2):
+        start = _signed(start_match.group(1), end_match.group(2))
+    return start, end
+
+
+def lifespan_years(birth_date='', death_date='', era=''):
+    """Birth and death years from a character's free-text fields, preferring the explicit dates"""
+    era_start, era_end = parse_year_range(era)
+    birth = parse_year(birth_date)
+    death = parse_year(death_date)
+    return (birth if birth is not None else era_start), (death if death is not None else era_end)
+
+
+def format_year(year):
+    return f"{-year} BC" if year < 0 else str(year)
+
+
+def format_year_range(start, end):
+    if end is None:
+        return format_year(start)
+    if start < 0 and end < 0:
+        return f"{-start}-{-end} BC"
+    return f"{format_year(start)}-{format_year(end)}"
+
+
+def find_lifespan(text):
+    """``(birth_text, death_text)`` from the first parenthesized date range in text, or None"""
+    match = _LIFESPAN_RE.search(text or '')
+    if match is None:
+        return None
+    parts = _RANGE_SEPARATOR_RE.split(match.group(1).split(';')[-1].strip(), maxsplit=1)
+    if len(parts) != 2:
+        return None
+    birth_text, death_text = (part.strip(' ,') for part in parts)
+    return birth_text, death_text
+
+
+def lifespan_overlaps(start=None, end=None):
+    """Q matching characters alive at some point in [start, end] (either bound may be None).
+
+    A missing death year counts as at most MAX_LIFESPAN years after birth, so
+    every branch is a range condition on the indexed year columns.
+    """
+    condition = Q(birth_year__isnull=False)
+    if end is not None:
+        condition &= Q(birth_year__lte=end)
+    if start is not None:
+        condition &= Q(death_year__gte=start) | Q(death_year__isnull=True, birth_year__gte=start - MAX_LIFESPAN)
+    return condition
+
+
+def backfill_years(model, batch_size=500):
+    """Recompute birth_year/death_year for every character a batch at a time; returns rows changed.
+
+    Takes the model class so data migrations can pass their historical model.
+    """
+    changed = 0
+    last_id = 0
+    while True:
+        characters = list(
+            model.objects.filter(pk__gt=last_id).order_by('pk')
+            .only('pk', 'birth_date', 'death_date', 'era', 'birth_year', 'death_year')[:batch_size]
+        )
+        if not characters:
+            return changed
+        stale = []
+        for character in characters:
+            years = lifespan_years(character.birth_date, character.death_date, character.era)
+            if years != (character.birth_year, character.death_year):
+                character.birth_year, character.death_year = years
+                stale.append(character)
+        model.objects.bulk_update(stale, ['birth_year', 'death_year'])
+        changed += len(stale)
+        last_id = characters[-1].pk